@@ -1,47 +1,208 @@
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, Request, current_app, render_template, request, jsonify, send_file, send_from_directory, abort
 import os
+import io
+import sys
+import base64
+import binascii
 import cv2
+import numpy as np
 import json
+import math
+import shutil
 import tempfile
+import hashlib
+import threading
+import time
+import uuid
+import zipfile
 from werkzeug.utils import secure_filename
-from utils.depth_estimation import PotholeDepthEstimator
-from utils.cost_estimation import CostEstimator
-from cloudinary_config import configure_cloudinary, upload_to_cloudinary, upload_annotated_image
-from models import Location, MediaFile, PotholeAnalysis, PotholeDetails, CostAnalysis, TimeEstimation
+from utils.depth_estimation import PotholeDepthEstimator, validate_tiling
+from utils.cost_estimation import CostEstimator, CostParameters
+from utils.frame_sampling import FrameSampler
+from utils.inference_pool import InferencePool
+from utils.micro_batcher import MicroBatcher
+from utils.box_dedupe import deduplicate_boxes
+from utils.pothole_columns import PotholeColumns
+from utils.pothole_tracker import PotholeTracker
+from utils.video_pipeline import VideoPipeline, SummaryFrameKeeper
+from utils.batch_ingest import extract_archive, manifest_entry, read_manifest
+from cloudinary_config import (upload_to_cloudinary_async, upload_bytes_to_cloudinary_async,
+                               upload_annotated_image, get_storage_backend, LocalStorageBackend)
+from models import AnalysisBatch, AnalysisReport, AnalysisUnitOfWork, AnalyticsRollup, CostBasis, DetectionCache, LocationSearch
 from database import db
-from datetime import datetime
-import io  # For in-memory PDF buffer
+from jobs import job_queue
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait as futures_wait
 
-# ReportLab imports for PDF generation
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib import colors
-from reportlab.lib.units import inch
-db.get_connection()
+class UploadRequest(Request):
+    """Request whose body limit is BATCH_MAX_UPLOAD_BYTES on /upload/batch and MAX_CONTENT_LENGTH elsewhere"""
+
+    @property
+    def max_content_length(self):
+        if self.path == '/upload/batch':
+            return current_app.config['BATCH_MAX_UPLOAD_BYTES']
+        return current_app.config['MAX_CONTENT_LENGTH']
 
 app = Flask(__name__)
+app.request_class = UploadRequest
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'pothole-detection-secret-key')
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['RESULTS_FOLDER'] = 'results'
 # NOTE: Render default upload limit may be ~25MB. Keep uploads smaller or configure server.
 app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB max (Flask-side)
+# Number of decoded video frames sent to the model in one predict call
+app.config['VIDEO_BATCH_SIZE'] = int(os.environ.get('VIDEO_BATCH_SIZE', 8))
+# Threads running inference batches for one video, and how many decoded batches may wait for them
+app.config['VIDEO_INFERENCE_CONSUMERS'] = int(os.environ.get('VIDEO_INFERENCE_CONSUMERS', 1))
+app.config['VIDEO_QUEUE_BATCHES'] = int(os.environ.get('VIDEO_QUEUE_BATCHES', 4))
+# Content-addressed cache of detections for re-uploaded media
+app.config['RESULT_CACHE_ENABLED'] = os.environ.get('RESULT_CACHE_ENABLED', '1') == '1'
+app.config['RESULT_CACHE_MAX_AGE_DAYS'] = int(os.environ.get('RESULT_CACHE_MAX_AGE_DAYS', 30))
+app.config['RESULT_CACHE_MAX_BYTES'] = int(os.environ.get('RESULT_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+# A tracked pothole must be detected in this many inferred frames to be counted
+app.config['TRACK_MIN_HITS'] = int(os.environ.get('TRACK_MIN_HITS', 2))
+# Default sliced inference for images: tile edge in pixels (0 = whole image only) and tile overlap
+app.config['TILE_SIZE'] = int(os.environ.get('TILE_SIZE', 0))
+app.config['TILE_OVERLAP'] = float(os.environ.get('TILE_OVERLAP', 0.2))
+# Detections below MIN_CONFIDENCE are dropped in the model, and at most MAX_DETECTIONS kept per image/frame
+app.config['MIN_CONFIDENCE'] = float(os.environ.get('MIN_CONFIDENCE', 0.25))
+app.config['MAX_DETECTIONS'] = int(os.environ.get('MAX_DETECTIONS', 100))
+# How long browsers/proxies may reuse /map responses
+app.config['MAP_CACHE_SECONDS'] = int(os.environ.get('MAP_CACHE_SECONDS', 30))
+# Largest what-if grid /scenarios evaluates, and the largest it returns in full
+app.config['SCENARIO_MAX'] = int(os.environ.get('SCENARIO_MAX', 1000000))
+app.config['SCENARIO_GRID_LIMIT'] = int(os.environ.get('SCENARIO_GRID_LIMIT', 10000))
+# /upload/batch: files analysed in parallel, analyses written per bulk commit, and archive limits
+app.config['BATCH_WORKERS'] = int(os.environ.get('BATCH_WORKERS', 4))
+app.config['BATCH_COMMIT_SIZE'] = int(os.environ.get('BATCH_COMMIT_SIZE', 50))
+app.config['BATCH_MAX_FILES'] = int(os.environ.get('BATCH_MAX_FILES', 1000))
+app.config['BATCH_MAX_BYTES'] = int(os.environ.get('BATCH_MAX_BYTES', 4 * 1024 * 1024 * 1024))
+# Request body limit for /upload/batch only; every other route keeps MAX_CONTENT_LENGTH
+app.config['BATCH_MAX_UPLOAD_BYTES'] = int(os.environ.get('BATCH_MAX_UPLOAD_BYTES', app.config['BATCH_MAX_BYTES']))
 
 # Allowed extensions
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'mp4', 'avi', 'mov', 'mkv'}
 
-# Initialize estimators and services
-depth_estimator = PotholeDepthEstimator()
+# Estimators and services are created on first use (or by warm_up_services),
+# so importing the app stays fast and /healthz answers during model load.
+# INFERENCE_WORKERS > 0 runs detection in that many processes, each with its own model;
+# 0 keeps a single in-process estimator.
+INFERENCE_WORKERS = int(os.environ.get('INFERENCE_WORKERS', 0))
+# Concurrent image requests are coalesced into one predict call of up to
+# MICRO_BATCH_SIZE images, waiting at most MICRO_BATCH_WAIT_MS for the batch to fill (1 = off)
+MICRO_BATCH_SIZE = int(os.environ.get('MICRO_BATCH_SIZE', 8))
+MICRO_BATCH_WAIT_MS = float(os.environ.get('MICRO_BATCH_WAIT_MS', 5))
+_depth_estimator = None
+_depth_estimator_lock = threading.Lock()
+# Stateless: prices come in as a CostParameters per call, never set on the shared instance
 cost_estimator = CostEstimator()
-configure_cloudinary()
+
+def get_depth_estimator():
+    global _depth_estimator
+    if _depth_estimator is None:
+        with _depth_estimator_lock:
+            if _depth_estimator is None:
+                if INFERENCE_WORKERS > 0:
+                    estimator = InferencePool(
+                        INFERENCE_WORKERS,
+                        torch_threads=int(os.environ.get('TORCH_THREADS_PER_WORKER', 0)) or None
+                    )
+                else:
+                    estimator = PotholeDepthEstimator()
+                if MICRO_BATCH_SIZE > 1:
+                    estimator = MicroBatcher(estimator, MICRO_BATCH_SIZE, MICRO_BATCH_WAIT_MS)
+                _depth_estimator = estimator
+    return _depth_estimator
+
+# Filled in by warm_up_services; /readyz reports it
+startup_state = {'ready': False, 'error': None, 'timings': {}}
+
+def warm_up_services():
+    """
+    Load the model and run one dummy inference, create the DB pool and schema,
+    and configure storage. Safe to call more than once.
+    """
+    def timed(name, fn):
+        start = time.perf_counter()
+        fn()
+        startup_state['timings'][name] = round(time.perf_counter() - start, 3)
+
+    try:
+        timed('model_load', get_depth_estimator)
+        timed('model_warm_up', lambda: get_depth_estimator().warm_up())
+        timed('database', db.migrate)
+        timed('storage', get_storage_backend)
+        # ReportLab and the shared report styles
+        timed('report', lambda: __import__('report'))
+        startup_state['ready'] = True
+        startup_state['error'] = None
+        print(f"✅ Services warm: {startup_state['timings']}")
+    except Exception as e:
+        startup_state['error'] = str(e)
+        print("❌ Warm-up failed:", e)
+    return startup_state['ready']
+
+# A failed warm-up is retried after WARM_UP_RETRY_SECONDS, doubling up to WARM_UP_RETRY_MAX_SECONDS
+WARM_UP_RETRY_SECONDS = float(os.environ.get('WARM_UP_RETRY_SECONDS', 2))
+WARM_UP_RETRY_MAX_SECONDS = float(os.environ.get('WARM_UP_RETRY_MAX_SECONDS', 60))
+_warm_up_lock = threading.Lock()
+_warm_up_thread = None
+
+def _warm_up_until_ready():
+    delay = WARM_UP_RETRY_SECONDS
+    while not warm_up_services():
+        print(f"🔄 Retrying warm-up in {delay:.0f}s")
+        time.sleep(delay)
+        delay = min(delay * 2, WARM_UP_RETRY_MAX_SECONDS)
+
+def start_warm_up():
+    """Warm up on a background thread, retrying until ready; no-op when ready or already running"""
+    global _warm_up_thread
+    with _warm_up_lock:
+        if startup_state['ready'] or (_warm_up_thread is not None and _warm_up_thread.is_alive()):
+            return
+        _warm_up_thread = threading.Thread(target=_warm_up_until_ready, name='warm-up', daemon=True)
+        _warm_up_thread.start()
+
+# WARM_UP_ON_START=1 (default) warms up as soon as the app is imported; otherwise the first /readyz starts it
+if os.environ.get('WARM_UP_ON_START', '1') == '1':
+    start_warm_up()
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def get_file_type(filename):
+    file_ext = filename.lower().split('.')[-1]
+    return 'image' if file_ext in ['png', 'jpg', 'jpeg'] else 'video'
+
 def get_temp_file_path(filename):
-    secure_name = secure_filename(filename)
+    # Unique prefix so concurrent jobs uploading the same filename never share a temp file
+    secure_name = f"{uuid.uuid4().hex}_{secure_filename(filename)}"
     return os.path.join(tempfile.gettempdir(), secure_name)
 
+def file_content_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# Upload parameters that change what gets detected in a video (cost params do not)
+VIDEO_DETECTION_PARAMS = ('frame_stride', 'target_fps', 'scene_threshold', 'dedupe_mode')
+DEDUPE_MODES = ('track', 'iou')
+
+def cost_parameters_from(params):
+    return CostParameters(params['material_cost'], params['labor_cost'], params['team_size'], params['overhead'])
+
+def detection_params_key(file_type, params):
+    key = {'min_confidence': params.get('min_confidence'), 'max_detections': params.get('max_detections')}
+    if file_type == 'image':
+        key.update(tile_size=params.get('tile_size'), tile_overlap=params.get('tile_overlap'))
+    if file_type == 'video':
+        key.update({name: params.get(name) for name in VIDEO_DETECTION_PARAMS})
+        key['track_min_hits'] = app.config['TRACK_MIN_HITS']
+    return json.dumps(key, sort_keys=True)
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -52,64 +213,82 @@ def analytics():
 
 @app.route('/analytics-data')
 def analytics_data():
-    """Return arrays for charts: dates, potholes_detected, avg_depth, material_used"""
+    """
+    Chart series from the daily rollup: dates, potholes_detected, avg_depth, material_used.
+    Query params: start / end (YYYY-MM-DD, default the last 365 days), granularity
+    (day, week or month) and an optional city.
+    """
     try:
-        cursor = db.get_cursor()
-        cursor.execute("""
-            SELECT pa.analysis_date AS date,
-                   pa.total_potholes AS potholes,
-                   pa.average_depth_cm AS avg_depth,
-                   ca.material_cost AS material_cost,
-                   pa.total_volume_liters AS total_volume
-            FROM pothole_analysis pa
-            LEFT JOIN cost_analysis ca ON pa.analysis_id = ca.analysis_id
-            ORDER BY pa.analysis_date ASC
-            LIMIT 200
-        """)
-        rows = cursor.fetchall()
-        cursor.close()
-
-        dates = []
-        potholes = []
-        avg_depth = []
-        material_used = []
-
-        for r in rows:
-            # r may be sqlite.Row or tuple/dict depending on db implementation
-            # Use key access when available
-            try:
-                date = r['date'] if isinstance(r, dict) else r[0]
-                p = r['potholes'] if isinstance(r, dict) else r[1]
-                d = r['avg_depth'] if isinstance(r, dict) else r[2]
-                m = r['total_volume'] if isinstance(r, dict) else r[4]
-            except Exception:
-                # fallback index-based
-                date = r[0]
-                p = r[1]
-                d = r[2]
-                m = r[4] if len(r) > 4 else 0
-
-            # Normalize date string
-            if isinstance(date, (int, float)):
-                date_str = datetime.fromtimestamp(date).strftime('%Y-%m-%d')
-            else:
-                date_str = str(date)[:10]
-            dates.append(date_str)
-            potholes.append(int(p or 0))
-            avg_depth.append(float(d or 0.0))
-            material_used.append(float(m or 0.0))
+        end = datetime.strptime(request.args['end'], '%Y-%m-%d').date() if request.args.get('end') else datetime.now().date()
+        start = datetime.strptime(request.args['start'], '%Y-%m-%d').date() if request.args.get('start') else end - timedelta(days=365)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'start and end must be YYYY-MM-DD dates'}), 400
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in AnalyticsRollup.GRANULARITIES:
+        return jsonify({'success': False, 'error': f'granularity must be one of {", ".join(AnalyticsRollup.GRANULARITIES)}'}), 400
+    city = request.args.get('city') or None
 
+    try:
+        rows = AnalyticsRollup.series(start, end, granularity, city)
         return jsonify({
             'success': True,
-            'dates': dates,
-            'potholes_detected': potholes,
-            'avg_depth': avg_depth,
-            'material_used': material_used
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'granularity': granularity,
+            'dates': [r[0].isoformat() for r in rows],
+            'analyses': [int(r[1]) for r in rows],
+            'potholes_detected': [int(r[2]) for r in rows],
+            'avg_depth': [round(float(r[3] or 0.0), 2) for r in rows],
+            'material_used': [round(float(r[4]), 2) for r in rows],
+            'material_cost': [round(float(r[5]), 2) for r in rows],
+            'total_cost': [round(float(r[6]), 2) for r in rows]
         })
     except Exception as e:
         print("Analytics data error:", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def upload_params_from(form):
+    """Cost, sampling and detection parameters of an upload form (with defaults); ValueError if invalid"""
+    params = {
+        'material_cost': float(form.get('material_cost', 40.0)),
+        'labor_cost': float(form.get('labor_cost', 300.0)),
+        'team_size': int(form.get('team_size', 2)),
+        'overhead': float(form.get('overhead', 15.0)),
+
+        # Video sampling options (defaults analyze every frame)
+        'frame_stride': int(form.get('frame_stride') or 1),
+        'target_fps': float(form.get('target_fps') or 0) or None,
+        'scene_threshold': float(form.get('scene_threshold') or 0.0),
+        # 'track' follows potholes across frames; 'iou' is the old frame-agnostic dedupe
+        'dedupe_mode': form.get('dedupe_mode', 'track'),
+
+        # Sliced inference for high-resolution images
+        # An explicit 0 turns tiling off / means no overlap, so only a blank field takes the default
+        'tile_size': int(form.get('tile_size') if form.get('tile_size') not in (None, '')
+                         else app.config['TILE_SIZE']),
+        'tile_overlap': float(form.get('tile_overlap') if form.get('tile_overlap') not in (None, '')
+                              else app.config['TILE_OVERLAP']),
+
+        # Early cutoffs for low-confidence boxes, before dedupe, annotation and costing
+        'min_confidence': float(form.get('min_confidence') or app.config['MIN_CONFIDENCE']),
+        'max_detections': int(form.get('max_detections') or app.config['MAX_DETECTIONS'])
+    }
+    if params['dedupe_mode'] not in DEDUPE_MODES:
+        raise ValueError(f"dedupe_mode must be one of {', '.join(DEDUPE_MODES)}")
+    validate_tiling(params['tile_size'], params['tile_overlap'])
+    return params
+
+def location_data_from(form, defaults=None):
+    """Location fields of an upload form, falling back to defaults (e.g. a batch-wide location)"""
+    defaults = defaults or {}
+    return {
+        'location_name': form.get('location_name', defaults.get('location_name', '')),
+        'latitude': form.get('latitude', defaults.get('latitude', '')),
+        'longitude': form.get('longitude', defaults.get('longitude', '')),
+        'city': form.get('city', defaults.get('city', '')),
+        'additional_notes': form.get('additional_notes', defaults.get('additional_notes', ''))
+    }
+
 @app.route('/upload', methods=['POST'])
 def upload_file():
     temp_path = None
@@ -125,77 +304,132 @@ def upload_file():
         if not allowed_file(file.filename):
             return jsonify({'success': False, 'error': 'Invalid file type. Please upload images (PNG, JPG) or videos (MP4, AVI, MOV)'}), 400
 
-        # Save uploaded file to OS temp directory
-        temp_path = get_temp_file_path(file.filename)
-        file.save(temp_path)
-        print(f"File saved to temporary location: {temp_path}")
+        # Images stay in memory; videos go to the OS temp directory because
+        # VideoCapture needs a path
+        file_bytes = None
+        if get_file_type(file.filename) == 'image':
+            file_bytes = file.read()
+        else:
+            temp_path = get_temp_file_path(file.filename)
+            file.save(temp_path)
+            print(f"File saved to temporary location: {temp_path}")
 
         # Read cost params and location data from form (with defaults)
-        material_cost = float(request.form.get('material_cost', 40.0))
-        labor_cost = float(request.form.get('labor_cost', 300.0))
-        team_size = int(request.form.get('team_size', 2))
-        overhead = float(request.form.get('overhead', 15.0))
-
-        location_data = {
-            'location_name': request.form.get('location_name', ''),
-            'latitude': request.form.get('latitude', ''),
-            'longitude': request.form.get('longitude', ''),
-            'city': request.form.get('city', ''),
-            'additional_notes': request.form.get('additional_notes', '')
-        }
+        try:
+            params = upload_params_from(request.form)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': f'Invalid upload parameters: {str(e)}'}), 400
+        location_data = location_data_from(request.form)
+
+        # async=0 keeps the old blocking behaviour for API clients
+        if request.form.get('async', '1') == '0':
+            result = run_upload_job(None, temp_path, file.filename, params, location_data, file_bytes=file_bytes)
+            temp_path = None  # cleaned up by the job
+            if not isinstance(result, dict):
+                return jsonify({'success': False, 'error': 'Unexpected processing result type'}), 500
+            return jsonify(result)
+
+        job = job_queue.submit(run_upload_job, temp_path, file.filename, params, location_data,
+                               file_bytes=file_bytes, description=file.filename)
+        temp_path = None  # ownership passed to the job
+        print(f"Queued analysis job {job.job_id} for {file.filename}")
+
+        return jsonify({
+            'success': True,
+            'job_id': job.job_id,
+            'status': job.status,
+            'status_url': f'/jobs/{job.job_id}',
+            'progress_url': f'/jobs/{job.job_id}/progress'
+        }), 202
 
-        # Upload original file to Cloudinary (defensive)
-        file_ext = file.filename.lower().split('.')[-1]
-        file_type = 'image' if file_ext in ['png', 'jpg', 'jpeg'] else 'video'
+    except Exception as e:
+        # Catch-all: always return JSON on errors
+        print("Upload error:", e)
+        return jsonify({'success': False, 'error': f'Upload failed: {str(e)}'}), 500
 
-        print("Uploading to Cloudinary...")
+    finally:
+        # Cleanup temporary file if it was never handed to a job
         try:
-            upload_result = upload_to_cloudinary(temp_path, 'uploads', file_type)
+            if temp_path and os.path.exists(temp_path):
+                os.unlink(temp_path)
+                print(f"Cleaned up temporary file: {temp_path}")
         except Exception as e:
-            print("Cloudinary upload exception:", e)
-            return jsonify({'success': False, 'error': 'Cloudinary upload failed — check API keys or network'}), 500
+            print("Temp file cleanup failed:", e)
+
+def run_upload_job(job, temp_path, filename, params, location_data, file_bytes=None, analysis_batch=None):
+    """
+    Upload, detect and persist one file: an image held in file_bytes or a video saved at temp_path.
+    Runs on a job_queue worker (job may be None when run inline).
+    """
+    def set_stage(stage):
+        if job:
+            job.set_stage(stage)
 
-        if not upload_result or not upload_result.get('success'):
-            print("Cloudinary returned failure:", upload_result)
-            return jsonify({'success': False, 'error': f'Cloudinary upload failed: {upload_result.get("error", "Unknown")}'}), 500
+    progress_callback = job.update_progress if job else None
+    upload_future = None
 
-        print("Cloudinary upload successful:", upload_result.get('url'))
+    try:
+        file_type = get_file_type(filename)
+
+        # Same bytes + same model + same detection settings → reuse the earlier detections
+        cache_key = None
+        if app.config['RESULT_CACHE_ENABLED']:
+            content_hash = hashlib.sha256(file_bytes).hexdigest() if file_bytes is not None else file_content_hash(temp_path)
+            cache_key = (content_hash, get_depth_estimator().model_version,
+                         detection_params_key(file_type, params))
+            cached = DetectionCache.lookup(*cache_key)
+            if cached:
+                print(f"Detection cache hit for {filename}")
+                set_stage('cached')
+                return process_cached_result(cached, params, location_data, filename, analysis_batch)
+
+        # Upload the original in the background; detection runs meanwhile and
+        # join_original_upload waits for it only when the URL is persisted
+        print("Uploading to Cloudinary in the background...")
+        if file_bytes is not None:
+            upload_future = upload_bytes_to_cloudinary_async(file_bytes, filename, 'uploads', file_type)
+        else:
+            upload_future = upload_to_cloudinary_async(temp_path, 'uploads', file_type)
 
-        # Store media file and location in DB
+        # Media row is written together with the analysis in store_analysis_data
         media_data = {
-            'original_filename': file.filename,
+            'original_filename': filename,
             'file_type': file_type,
-            'original_file_url': upload_result['url'],
+            'original_file_url': None,
             'processed_file_url': None,
-            'file_size': upload_result.get('bytes', 0)
+            'file_size': 0,
+            'original_upload': upload_future
         }
-        media_id = MediaFile.create(media_data)
-        if not media_id:
-            return jsonify({'success': False, 'error': 'Failed to store media file in database'}), 500
-
-        location_id = Location.create(location_data)
-        if not location_id:
-            return jsonify({'success': False, 'error': 'Failed to store location in database'}), 500
 
         # Process based on file type
+        set_stage('detecting')
         print("Processing file for pothole detection...")
+        cost_params = cost_parameters_from(params)
         if file_type == 'image':
-            result = process_image(temp_path, material_cost, labor_cost, team_size, overhead, location_id, media_id, file.filename)
+            result = process_image(file_bytes, cost_params, location_data, media_data, filename,
+                                   tile_size=params['tile_size'], tile_overlap=params['tile_overlap'],
+                                   min_confidence=params['min_confidence'], max_detections=params['max_detections'],
+                                   cache_key=cache_key, progress_callback=progress_callback,
+                                   analysis_batch=analysis_batch)
         else:
-            result = process_video(temp_path, material_cost, labor_cost, team_size, overhead, location_id, media_id, file.filename)
+            result = process_video(temp_path, cost_params, location_data, media_data, filename,
+                                   frame_stride=params['frame_stride'], target_fps=params['target_fps'],
+                                   scene_threshold=params['scene_threshold'], dedupe_mode=params['dedupe_mode'],
+                                   min_confidence=params['min_confidence'], max_detections=params['max_detections'],
+                                   cache_key=cache_key, progress_callback=progress_callback,
+                                   analysis_batch=analysis_batch)
 
-        # Ensure result is JSON-serializable and always return JSON
-        if not isinstance(result, dict):
-            return jsonify({'success': False, 'error': 'Unexpected processing result type'}), 500
+        return result
 
-        return jsonify(result)
+    finally:
+        # The temp file is still being read by an unfinished upload
+        if upload_future is not None:
+            futures_wait([upload_future])
 
-    except Exception as e:
-        # Catch-all: always return JSON on errors
-        print("Upload error:", e)
-        return jsonify({'success': False, 'error': f'Upload failed: {str(e)}'}), 500
+        # Job threads have no request teardown, so hand the DB connection back here
+        if job:
+            db.close()
 
-    finally:
         # Cleanup temporary file
         try:
             if temp_path and os.path.exists(temp_path):
@@ -204,10 +438,294 @@ def upload_file():
         except Exception as e:
             print("Temp file cleanup failed:", e)
 
-def process_image(image_path, material_cost, labor_cost, team_size, overhead, location_id, media_id, filename):
+@app.route('/upload/batch', methods=['POST'])
+def upload_batch():
+    """
+    Analyse many files in one call: several 'files' parts and/or ZIP archives.
+    Per-file locations come from an optional manifest (a 'manifest' file or
+    JSON form field, or manifest.json/.csv inside an archive); the form's
+    location and cost fields apply to every file without an entry. The request
+    only saves the uploads (up to BATCH_MAX_UPLOAD_BYTES, see UploadRequest);
+    archives are extracted by the batch job.
+    """
+    batch_dir = tempfile.mkdtemp(prefix='pothole_batch_')
+    try:
+        uploads = [f for f in request.files.getlist('files') + request.files.getlist('file') if f.filename]
+        if not uploads:
+            return jsonify({'success': False, 'error': 'No files selected'}), 400
+
+        manifest = {}
+        items, archives, skipped = [], [], []
+        # One byte budget for the whole batch: plain files here, archive contents as the job extracts them
+        total_bytes = 0
+        for index, upload in enumerate(uploads):
+            if upload.filename.lower().endswith('.zip'):
+                archive_path = os.path.join(batch_dir, f"archive_{index}.zip")
+                upload.save(archive_path)
+                archives.append((upload.filename, archive_path, f"{index}_"))
+            elif allowed_file(upload.filename):
+                path = os.path.join(batch_dir, f"{index}_{secure_filename(upload.filename)}")
+                upload.save(path)
+                total_bytes += os.path.getsize(path)
+                if total_bytes > app.config['BATCH_MAX_BYTES']:
+                    raise ValueError(f"batch is larger than {app.config['BATCH_MAX_BYTES']} bytes")
+                items.append((upload.filename, path))
+            else:
+                skipped.append(upload.filename)
+
+        # An explicitly uploaded manifest wins over one found in an archive (merged by the job)
+        if 'manifest' in request.files and request.files['manifest'].filename:
+            manifest.update(read_manifest(request.files['manifest'].read(), request.files['manifest'].filename))
+        elif request.form.get('manifest'):
+            manifest.update(read_manifest(request.form['manifest'], 'manifest.json'))
+
+        if not items and not archives:
+            return jsonify({'success': False, 'error': 'No supported images or videos in the upload', 'skipped': skipped}), 400
+        if len(items) > app.config['BATCH_MAX_FILES']:
+            return jsonify({'success': False, 'error': f"At most {app.config['BATCH_MAX_FILES']} files per batch"}), 400
+
+        params = upload_params_from(request.form)
+        default_location = location_data_from(request.form)
+
+        if request.form.get('async', '1') == '0':
+            result = run_batch_job(None, batch_dir, items, params, default_location, manifest, skipped,
+                                   archives=archives, total_bytes=total_bytes)
+            batch_dir = None  # cleaned up by the job
+            return jsonify(result)
+
+        job = job_queue.submit(run_batch_job, batch_dir, items, params, default_location, manifest, skipped,
+                               archives=archives, total_bytes=total_bytes,
+                               description=f"Batch of {len(items)} files and {len(archives)} archives")
+        batch_dir = None  # ownership passed to the job
+        print(f"Queued batch job {job.job_id} for {len(items)} files and {len(archives)} archives")
+
+        return jsonify({
+            'success': True,
+            'job_id': job.job_id,
+            'files': len(items),
+            'archives': len(archives),
+            'skipped': skipped,
+            'status': job.status,
+            'status_url': f'/jobs/{job.job_id}',
+            'progress_url': f'/jobs/{job.job_id}/progress'
+        }), 202
+
+    except ValueError as e:
+        return jsonify({'success': False, 'error': f'Invalid batch upload: {str(e)}'}), 400
+    except Exception as e:
+        print("Batch upload error:", e)
+        return jsonify({'success': False, 'error': f'Batch upload failed: {str(e)}'}), 500
+    finally:
+        if batch_dir:
+            shutil.rmtree(batch_dir, ignore_errors=True)
+
+def extract_batch_archives(batch_dir, items, archives, manifest, total_bytes):
+    """
+    Extract each (name, path, prefix) archive into batch_dir against what is left of
+    the BATCH_MAX_FILES/BATCH_MAX_BYTES budget. Returns (items with the archives' media
+    appended, merged manifest, [{'filename', 'error'}] for archives that were rejected).
+    Entries of the request's own manifest win over those found in an archive.
+    """
+    items = list(items)
+    archive_manifest = {}
+    errors = []
+    for name, archive_path, prefix in archives:
+        try:
+            entries, found_manifest, extracted = extract_archive(
+                archive_path, batch_dir, ALLOWED_EXTENSIONS,
+                app.config['BATCH_MAX_FILES'] - len(items), app.config['BATCH_MAX_BYTES'] - total_bytes,
+                prefix=prefix)
+        except (ValueError, zipfile.BadZipFile) as e:
+            print(f"❌ Batch archive {name} rejected:", e)
+            errors.append({'filename': name, 'error': str(e)})
+            continue
+        finally:
+            os.unlink(archive_path)
+        total_bytes += extracted
+        items.extend(entries)
+        archive_manifest.update(found_manifest)
+    return items, {**archive_manifest, **manifest}, errors
+
+def run_batch_job(job, batch_dir, items, params, default_location, manifest, skipped=(),
+                  archives=(), total_bytes=0):
+    """
+    Extract any uploaded archives, then analyse every (name, path) on BATCH_WORKERS
+    threads (their single-image inference calls meet in the micro-batcher) and write
+    the analyses in bulk, BATCH_COMMIT_SIZE per transaction. Returns a batch summary
+    with per-file results.
+    """
+    started = time.perf_counter()
+    analysis_batch = AnalysisBatch()
+
+    def analyse(name, path):
+        try:
+            location_data = location_data_from(manifest_entry(manifest, name), default_location)
+            file_bytes = None
+            if get_file_type(name) == 'image':
+                with open(path, 'rb') as f:
+                    file_bytes = f.read()
+            return run_upload_job(None, path, name, params, location_data,
+                                  file_bytes=file_bytes, analysis_batch=analysis_batch)
+        except Exception as e:
+            print(f"❌ Batch file {name} failed:", e)
+            return {'success': False, 'error': str(e)}
+        finally:
+            db.close()
+
+    results = {}
+    try:
+        items, manifest, archive_errors = extract_batch_archives(batch_dir, items, archives, manifest, total_bytes)
+        with ThreadPoolExecutor(max_workers=app.config['BATCH_WORKERS'], thread_name_prefix='batch') as executor:
+            futures = {executor.submit(analyse, name, path): index for index, (name, path) in enumerate(items)}
+            for done, future in enumerate(as_completed(futures), 1):
+                results[futures[future]] = future.result()
+                if job:
+                    job.update_progress(done, len(items))
+                if len(analysis_batch) >= app.config['BATCH_COMMIT_SIZE']:
+                    analysis_batch.flush()
+        analysis_batch.flush()
+    finally:
+        if job:
+            db.close()
+        shutil.rmtree(batch_dir, ignore_errors=True)
+
+    files = []
+    for index, (name, _) in enumerate(items):
+        result = results[index]
+        # Analyses queued on the batch carry their unit of work until the flush assigns an id
+        unit = result.get('analysis_id')
+        if isinstance(unit, AnalysisUnitOfWork):
+            if unit.analysis_id:
+                result['analysis_id'] = unit.analysis_id
+            else:
+                result = {'success': False, 'error': 'Failed to store analysis data'}
+        cost = result.get('cost_breakdown') or {}
+        files.append({
+            'filename': name,
+            'success': bool(result.get('success')),
+            'analysis_id': result.get('analysis_id'),
+            'file_type': result.get('file_type', get_file_type(name)),
+            'potholes_detected': result.get('potholes_detected', 0),
+            'total_cost': cost.get('total_cost', 0),
+            'result_image': result.get('result_image'),
+            'cache_hit': result.get('cache_hit', False),
+            'error': result.get('error')
+        })
+
+    elapsed = time.perf_counter() - started
+    succeeded = [f for f in files if f['success']]
+    return {
+        'success': bool(succeeded),
+        'error': None if succeeded else ('No file in the batch could be analysed' if files
+                                         else 'No supported images or videos in the upload'),
+        'summary': {
+            'files': len(files),
+            'succeeded': len(succeeded),
+            'failed': len(files) - len(succeeded),
+            'skipped': list(skipped),
+            'archive_errors': archive_errors,
+            'cache_hits': sum(1 for f in succeeded if f['cache_hit']),
+            'total_potholes': sum(f['potholes_detected'] for f in succeeded),
+            'total_cost': round(sum(f['total_cost'] for f in succeeded), 2),
+            'elapsed_seconds': round(elapsed, 3),
+            'files_per_second': round(len(files) / elapsed, 3) if elapsed > 0 else 0.0
+        },
+        'files': files
+    }
+
+def join_original_upload(media_data):
+    """Wait for the background upload of the original file; returns an error result or None"""
+    upload_future = media_data.pop('original_upload', None)
+    if upload_future is None:
+        return None
+    try:
+        upload_result = upload_future.result()
+    except Exception as e:
+        print("Cloudinary upload exception:", e)
+        return {'success': False, 'error': 'Cloudinary upload failed — check API keys or network'}
+
+    if not upload_result or not upload_result.get('success'):
+        print("Cloudinary returned failure:", upload_result)
+        return {'success': False, 'error': f'Cloudinary upload failed: {upload_result.get("error", "Unknown")}'}
+
+    print("Cloudinary upload successful:", upload_result.get('url'))
+    media_data['original_file_url'] = upload_result['url']
+    media_data['file_size'] = upload_result.get('bytes', 0)
+    return None
+
+def remember_detections(cache_key, media_data, pothole_data, result_summary=None):
+    """Cache detections and media URLs for a later upload of the same file"""
+    if not cache_key:
+        return
+    if DetectionCache.store(*cache_key, media_data, pothole_data, result_summary):
+        DetectionCache.evict(app.config['RESULT_CACHE_MAX_AGE_DAYS'], app.config['RESULT_CACHE_MAX_BYTES'])
+
+def process_cached_result(cached, params, location_data, filename, analysis_batch=None):
+    """Re-cost cached detections with this request's parameters and record a new analysis"""
+    pothole_data = cached['pothole_data']
+    file_type = cached['file_type']
+
+    cost_params = cost_parameters_from(params)
+    cost_breakdown = cost_estimator.calculate_repair_cost(pothole_data, params=cost_params)
+
+    media_data = {
+        'original_filename': filename,
+        'file_type': file_type,
+        'original_file_url': cached['original_file_url'],
+        'processed_file_url': cached['processed_file_url'],
+        'file_size': cached['file_size']
+    }
+    analysis_id = store_analysis_data(location_data, media_data, pothole_data, cost_breakdown, cost_params,
+                                      analysis_batch)
+    if not analysis_id:
+        return {'success': False, 'error': 'Failed to store analysis data'}
+
+    result = {
+        'success': True,
+        'analysis_id': analysis_id,
+        'file_type': file_type,
+        'potholes_detected': len(pothole_data),
+        'pothole_data': pothole_data if file_type == 'image' else pothole_data[:10],
+        'cost_breakdown': cost_breakdown,
+        'result_image': cached['processed_file_url'],
+        'location_data': {'location_name': location_data.get('location_name', ''), 'city': location_data.get('city', '')},
+        'cache_hit': True
+    }
+    result.update(cached['result_summary'])
+    return result
+
+@app.route('/jobs/<job_id>')
+def get_job(job_id):
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+@app.route('/jobs/<job_id>/progress')
+def get_job_progress(job_id):
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    progress = job.progress()
+    progress['success'] = True
+    return jsonify(progress)
+
+def process_image(image_bytes, cost_params, location_data, media_data, filename,
+                  tile_size=0, tile_overlap=0.2, min_confidence=None, max_detections=None,
+                  cache_key=None, progress_callback=None, analysis_batch=None):
     try:
         print("Processing image...")
-        results = depth_estimator.calculate_pothole_dimensions(image_path)
+        if progress_callback:
+            progress_callback(0, 1)
+        # Decode straight from the uploaded bytes, no temp file round trip
+        image = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            return {'success': False, 'error': 'Could not decode image'}
+
+        results = get_depth_estimator().calculate_pothole_dimensions(image, tile_size, tile_overlap,
+                                                                     min_confidence, max_detections)
+        if progress_callback:
+            progress_callback(1, 1)
 
         if not results:
             return {'success': False, 'error': 'No potholes detected in the image'}
@@ -215,12 +733,7 @@ def process_image(image_path, material_cost, labor_cost, team_size, overhead, lo
         pothole_data, image = results
         print(f"Found {len(pothole_data)} potholes")
 
-        cost_estimator.material_cost_per_liter = material_cost
-        cost_estimator.labor_cost_per_hour = labor_cost
-        cost_estimator.team_size = team_size
-        cost_estimator.overhead_percentage = overhead
-
-        cost_breakdown = cost_estimator.calculate_repair_cost(pothole_data)
+        cost_breakdown = cost_estimator.calculate_repair_cost(pothole_data, params=cost_params)
 
         # Annotate image
         result_image = image.copy()
@@ -240,35 +753,37 @@ def process_image(image_path, material_cost, labor_cost, team_size, overhead, lo
         if not annotated_result.get('success'):
             return {'success': False, 'error': 'Annotated image upload failed'}
 
-        # Update media processed URL in DB
-        cursor = db.get_cursor()
-        try:
-            cursor.execute("UPDATE media_files SET processed_file_url = %s WHERE media_id = %s", 
-              (annotated_result['url'], media_id))
+        media_data['processed_file_url'] = annotated_result['url']
 
-            db.get_connection().commit()
-        finally:
-            cursor.close()
+        upload_error = join_original_upload(media_data)
+        if upload_error:
+            return upload_error
 
-        # Store analysis data
-        analysis_id = store_analysis_data(location_id, media_id, pothole_data, cost_breakdown, material_cost, labor_cost, team_size, overhead)
+        # Store media, location and analysis data in one transaction
+        analysis_id = store_analysis_data(location_data, media_data, pothole_data, cost_breakdown, cost_params,
+                                          analysis_batch)
         if not analysis_id:
             return {'success': False, 'error': 'Failed to store analysis data'}
+        remember_detections(cache_key, media_data, pothole_data)
 
         return {
             'success': True,
+            'analysis_id': analysis_id,
             'file_type': 'image',
             'potholes_detected': len(pothole_data),
             'pothole_data': pothole_data,
             'cost_breakdown': cost_breakdown,
             'result_image': annotated_result['url'],
-            'location_data': {'location_name': request.form.get('location_name', ''), 'city': request.form.get('city', '')}
+            'location_data': {'location_name': location_data.get('location_name', ''), 'city': location_data.get('city', '')}
         }
     except Exception as e:
         print("Image processing error:", e)
         return {'success': False, 'error': f'Image processing failed: {str(e)}'}
 
-def process_video(video_path, material_cost, labor_cost, team_size, overhead, location_id, media_id, filename):
+def process_video(video_path, cost_params, location_data, media_data, filename,
+                  frame_stride=1, target_fps=None, scene_threshold=0.0, dedupe_mode='track',
+                  min_confidence=None, max_detections=None, cache_key=None, progress_callback=None,
+                  analysis_batch=None):
     try:
         print("Processing video...")
         cap = cv2.VideoCapture(video_path)
@@ -276,165 +791,131 @@ def process_video(video_path, material_cost, labor_cost, team_size, overhead, lo
             return {'success': False, 'error': 'Could not open video file'}
 
         fps = cap.get(cv2.CAP_PROP_FPS)
-        total_video_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-
-        frame_count = 0
-        total_frames_analyzed = 0
-        all_potholes = []
-
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-
-            try:
-                results = depth_estimator.calculate_pothole_dimensions_from_array(frame)
-                total_frames_analyzed += 1
-                if results and results[0]:
-                    pothole_data, _ = results
-                    all_potholes.extend(pothole_data)
-            except Exception as e:
-                print(f"Frame processing error at {frame_count}:", e)
-                total_frames_analyzed += 1
-
-            frame_count += 1
-            if frame_count % 50 == 0:
-                print(f"Processed {frame_count}/{total_video_frames} frames...")
-
-        cap.release()
+        sampler = FrameSampler(stride=frame_stride, target_fps=target_fps, source_fps=fps,
+                               scene_threshold=scene_threshold)
+
+        # Tracks survive about a second (or three detection steps) without a sighting
+        tracker = None
+        if dedupe_mode == 'track':
+            tracker = PotholeTracker(iou_threshold=0.3,
+                                     max_age=max(int(fps or 30), 3 * sampler.stride),
+                                     min_hits=app.config['TRACK_MIN_HITS'])
+
+        all_detections = []
+        keeper = SummaryFrameKeeper()
+
+        def on_frame(index, frame, columns):
+            keeper.offer(index, frame, columns)
+            if tracker:
+                tracker.update(columns, index)
+            elif len(columns):
+                all_detections.append(columns)
+
+        # Decode runs on its own thread, overlapped with inference
+        pipeline = VideoPipeline(cap, get_depth_estimator(), sampler,
+                                 batch_size=app.config['VIDEO_BATCH_SIZE'],
+                                 consumers=app.config['VIDEO_INFERENCE_CONSUMERS'],
+                                 max_pending_batches=app.config['VIDEO_QUEUE_BATCHES'],
+                                 progress_callback=progress_callback,
+                                 detector_options={'min_confidence': min_confidence,
+                                                   'max_detections': max_detections})
+        stats = pipeline.run(on_frame)
+        frame_count = stats['frames_decoded']
+        total_frames_analyzed = stats['frames_inferred']
+        total_video_frames = stats['total_video_frames']
 
         if total_frames_analyzed == 0:
             return {'success': False, 'error': 'No frames could be processed from the video'}
-        if not all_potholes:
+
+        if tracker:
+            # One aggregated measurement per physical pothole
+            unique_potholes = tracker.aggregated_potholes()
+        else:
+            # IoU dedupe (indexed, same 0.3 threshold as before) straight on the box arrays
+            detections = PotholeColumns.concatenate(all_detections)
+            unique_potholes = detections.take(deduplicate_boxes(detections.bbox, iou_threshold=0.3)).to_dicts()
+
+        if not unique_potholes:
             return {'success': False, 'error': 'No potholes detected in the video'}
 
-        # IoU dedupe
-        def calculate_iou(box1, box2):
-            x11, y11, x21, y21 = box1
-            x12, y12, x22, y22 = box2
-            xi1 = max(x11, x12); yi1 = max(y11, y12)
-            xi2 = min(x21, x22); yi2 = min(y21, y22)
-            inter = max(0, xi2 - xi1) * max(0, yi2 - yi1)
-            area1 = (x21 - x11) * (y21 - y11)
-            area2 = (x22 - x12) * (y22 - y12)
-            union = area1 + area2 - inter
-            return inter / union if union > 0 else 0
-
-        unique_potholes = []
-        for p in all_potholes:
-            duplicate = False
-            for ex in unique_potholes:
-                if calculate_iou(p['bbox'], ex['bbox']) > 0.3:
-                    duplicate = True
-                    break
-            if not duplicate:
-                unique_potholes.append(p)
-
-        cost_estimator.material_cost_per_liter = material_cost
-        cost_estimator.labor_cost_per_hour = labor_cost
-        cost_estimator.team_size = team_size
-        cost_estimator.overhead_percentage = overhead
-        cost_breakdown = cost_estimator.calculate_repair_cost(unique_potholes)
-
-        # Create annotated summary frame
+        cost_breakdown = cost_estimator.calculate_repair_cost(unique_potholes, params=cost_params)
+
+        # Annotate the frame with the most detections, kept while streaming
         result_image_url = None
-        cap = cv2.VideoCapture(video_path)
-        ret, first_frame = cap.read()
-        cap.release()
-        if ret and unique_potholes:
-            result_frame = first_frame.copy()
-            for i, pothole in enumerate(unique_potholes[:10]):
-                x1, y1, x2, y2 = pothole['bbox']
+        if keeper.frame is not None and keeper.potholes:
+            result_frame = keeper.frame
+            for i, (x1, y1, x2, y2) in enumerate(keeper.potholes.bbox.tolist()):
                 cv2.rectangle(result_frame, (x1, y1), (x2, y2), (0,255,0), 2)
                 cv2.putText(result_frame, f"Pothole {i+1}", (x1, max(y1-10,0)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0,255,0), 2)
             try:
                 annotated_result = upload_annotated_image(result_frame, f"video_summary_{filename}", 'results')
                 if annotated_result.get('success'):
                     result_image_url = annotated_result['url']
-                    cursor = db.get_cursor()
-                    try:
-                        cursor.execute("UPDATE media_files SET processed_file_url = %s WHERE media_id = %s", (annotated_result['url'], media_id))
-                        db.get_connection().commit()
-                    finally:
-                        cursor.close()
+                    media_data['processed_file_url'] = result_image_url
             except Exception as e:
                 print("Video annotated upload failed:", e)
 
-        analysis_id = store_analysis_data(location_id, media_id, unique_potholes, cost_breakdown, material_cost, labor_cost, team_size, overhead)
+        upload_error = join_original_upload(media_data)
+        if upload_error:
+            return upload_error
+
+        analysis_id = store_analysis_data(location_data, media_data, unique_potholes, cost_breakdown, cost_params,
+                                          analysis_batch)
         if not analysis_id:
             return {'success': False, 'error': 'Failed to store analysis data'}
 
+        video_summary = {
+            'total_frames_analyzed': total_frames_analyzed,
+            'total_video_frames': total_video_frames,
+            'frames_decoded': frame_count,
+            'frames_inferred': total_frames_analyzed,
+            'frame_stride': sampler.stride,
+            'summary_frame_index': keeper.frame_index,
+            'dedupe_mode': 'track' if tracker else 'iou'
+        }
+        remember_detections(cache_key, media_data, unique_potholes, video_summary)
+
         return {
             'success': True,
+            'analysis_id': analysis_id,
             'file_type': 'video',
             'potholes_detected': len(unique_potholes),
-            'total_frames_analyzed': total_frames_analyzed,
-            'total_video_frames': total_video_frames,
+            **video_summary,
             'pothole_data': unique_potholes[:10],
             'cost_breakdown': cost_breakdown,
             'result_image': result_image_url,
-            'location_data': {'location_name': request.form.get('location_name', ''), 'city': request.form.get('city', '')}
+            'location_data': {'location_name': location_data.get('location_name', ''), 'city': location_data.get('city', '')}
         }
 
     except Exception as e:
         print("Video processing error:", e)
         return {'success': False, 'error': f'Video processing failed: {str(e)}'}
 
-def store_analysis_data(location_id, media_id, pothole_data, cost_breakdown, material_cost, labor_cost, team_size, overhead):
+def store_analysis_data(location_data, media_data, pothole_data, cost_breakdown, cost_params, analysis_batch=None):
+    """
+    Persist location, media, analysis, details, cost and time rows in a single transaction.
+    With an analysis_batch the rows are queued for its next bulk flush instead, and the
+    queued unit of work stands in for the analysis id until then.
+    """
     try:
-        total_volume = sum(p['volume_liters'] for p in pothole_data) if pothole_data else 0
-        avg_width = sum(p['width_cm'] for p in pothole_data) / len(pothole_data) if pothole_data else 0
-        avg_depth = sum(p['depth_cm'] for p in pothole_data) / len(pothole_data) if pothole_data else 0
-
-        analysis_data = {
-            'location_id': location_id,
-            'media_id': media_id,
-            'total_potholes': len(pothole_data),
-            'total_volume_liters': total_volume,
-            'average_width_cm': avg_width,
-            'average_depth_cm': avg_depth
-        }
-        analysis_id = PotholeAnalysis.create(analysis_data)
-        if not analysis_id:
-            return None
-
-        if pothole_data:
-            PotholeDetails.create_batch(analysis_id, pothole_data)
-
-        cost_data = {
-            'analysis_id': analysis_id,
-            'material_cost': cost_breakdown.get('material_cost', 0),
-            'labor_cost': cost_breakdown.get('labor_cost', 0),
-            'equipment_cost': cost_breakdown.get('equipment_cost', 0),
-            'transport_cost': cost_breakdown.get('transport_cost', 0),
-            'overhead_cost': cost_breakdown.get('overhead_cost', 0),
-            'total_cost': cost_breakdown.get('total_cost', 0),
-            'cost_parameters': {
-                'material_cost_per_liter': material_cost,
-                'labor_cost_per_hour': labor_cost,
-                'team_size': team_size,
-                'overhead_percentage': overhead
-            }
-        }
-        CostAnalysis.create(cost_data)
-
-        if 'time_breakdown' in cost_breakdown:
-            time_data = {
-                'analysis_id': analysis_id,
-                'total_hours': cost_breakdown['time_breakdown'].get('total_hours', 0),
-                'setup_time': cost_breakdown['time_breakdown'].get('setup_time', 0),
-                'prep_time': cost_breakdown['time_breakdown'].get('prep_time', 0),
-                'fill_time': cost_breakdown['time_breakdown'].get('fill_time', 0),
-                'compact_time': cost_breakdown['time_breakdown'].get('compact_time', 0),
-                'cleanup_time': cost_breakdown['time_breakdown'].get('cleanup_time', 0)
-            }
-            TimeEstimation.create(time_data)
-
-        return analysis_id
+        unit_of_work = AnalysisUnitOfWork.from_results(location_data, media_data, pothole_data,
+                                                       cost_breakdown, cost_params)
+        if analysis_batch is not None:
+            return analysis_batch.add(unit_of_work)
+        ids = unit_of_work.commit()
+        return ids['analysis_id'] if ids else None
     except Exception as e:
         print("Error storing analysis data:", e)
         return None
 
+@app.route('/media/<path:filename>')
+def local_media(filename):
+    """Serve files written by the local storage backend"""
+    backend = get_storage_backend()
+    if not isinstance(backend, LocalStorageBackend):
+        abort(404)
+    return send_from_directory(backend.root, filename)
+
 @app.route('/results/<filename>')
 def get_result_image(filename):
     return jsonify({'success': False, 'error': 'Use Cloudinary URL directly'})
@@ -446,108 +927,9 @@ def generate_report():
         if not data:
             return jsonify({'success': False, 'error': 'No data provided'}), 400
 
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=1*inch, bottomMargin=1*inch)
-        elements = []
-        styles = getSampleStyleSheet()
-
-        title_style = ParagraphStyle('CustomTitle', parent=styles['Heading1'], fontSize=18, spaceAfter=30, alignment=1, textColor=colors.HexColor('#2563eb'))
-        elements.append(Paragraph("Pothole Inspection Report", title_style))
-        elements.append(Spacer(1, 20))
-
-        details_data = [
-            ['Report Date', datetime.now().strftime('%Y-%m-%d %H:%M:%S')],
-            ['File Type', data.get('file_type', 'N/A')],
-            ['Potholes Detected', str(data.get('potholes_detected', 0))],
-        ]
-
-        location_data = data.get('location_data', {})
-        if location_data.get('location_name'):
-            details_data.append(['Location', location_data['location_name']])
-        if location_data.get('city'):
-            details_data.append(['City', location_data['city']])
-
-        details_table = Table(details_data, colWidths=[2*inch, 3*inch])
-        details_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1e293b')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#f8fafc')),
-            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 1), (-1, -1), 10),
-            ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-        ]))
-        elements.append(details_table)
-        elements.append(Spacer(1, 30))
-
-        cost_breakdown = data.get('cost_breakdown', {})
-        material_cost = f"₹{cost_breakdown.get('material_cost', 0):.2f}"
-        labor_cost = f"₹{cost_breakdown.get('labor_cost', 0):.2f}"
-        equipment_transport = f"₹{(cost_breakdown.get('equipment_cost', 0) + cost_breakdown.get('transport_cost', 0)):.2f}"
-        overhead_cost = f"₹{cost_breakdown.get('overhead_cost', 0):.2f}"
-        total_cost = f"₹{cost_breakdown.get('total_cost', 0):.2f}"
-
-        cost_data = [
-            ['Cost Item', 'Amount (₹)'],
-            ['Material Cost', material_cost],
-            ['Labor Cost', labor_cost],
-            ['Equipment & Transport', equipment_transport],
-            ['Overhead', overhead_cost],
-            ['TOTAL COST', total_cost]
-        ]
-
-        cost_table = Table(cost_data, colWidths=[3*inch, 2*inch])
-        cost_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#10b981')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -2), colors.HexColor('#f8fafc')),
-            ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#1e293b')),
-            ('TEXTCOLOR', (0, -1), (-1, -1), colors.whitesmoke),
-            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 1), (-1, -1), 10),
-            ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-        ]))
-        elements.append(Paragraph("Cost Breakdown", styles['Heading2']))
-        elements.append(Spacer(1, 10))
-        elements.append(cost_table)
-
-        pothole_data = data.get('pothole_data', [])
-        if pothole_data:
-            elements.append(Spacer(1, 30))
-            elements.append(Paragraph("Pothole Details", styles['Heading2']))
-            elements.append(Spacer(1, 10))
-            pothole_table_data = [['ID', 'Width (cm)', 'Depth (cm)', 'Volume (L)']]
-            for pothole in pothole_data[:10]:
-                pothole_table_data.append([
-                    str(pothole.get('id', '')),
-                    f"{pothole.get('width_cm', 0):.1f}",
-                    f"{pothole.get('depth_cm', 0):.1f}",
-                    f"{pothole.get('volume_liters', 0):.2f}"
-                ])
-            pothole_table = Table(pothole_table_data, colWidths=[0.5*inch, 1.2*inch, 1.2*inch, 1.2*inch])
-            pothole_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3b82f6')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#f8fafc')),
-                ('FONTSIZE', (0, 1), (-1, -1), 9),
-                ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-            ]))
-            elements.append(pothole_table)
-
-        doc.build(elements)
-        buffer.seek(0)
-        if buffer.getbuffer().nbytes == 0:
-            raise Exception("Generated PDF is empty")
+        # ReportLab loads on the first report, not at startup
+        from report import build_inspection_report
+        buffer = build_inspection_report(data)
 
         print("PDF generated successfully, size:", buffer.getbuffer().nbytes)
         return send_file(buffer, as_attachment=True, download_name=f'pothole_report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf', mimetype='application/pdf')
@@ -556,11 +938,81 @@ def generate_report():
         print("PDF generation error:", e)
         return jsonify({'success': False, 'error': f'PDF generation failed: {str(e)}'}), 500
 
+@app.route('/reports/<int:analysis_id>')
+def analysis_report(analysis_id):
+    """
+    Inspection report PDF rendered from the stored rows of one analysis, with every pothole.
+    The ETag is a hash of those rows: If-None-Match gets a 304, and repeat downloads
+    come from the rendered-PDF cache instead of ReportLab.
+    """
+    try:
+        data = AnalysisReport.load(analysis_id)
+        if not data:
+            return jsonify({'success': False, 'error': 'Analysis not found'}), 404
+
+        from report import build_inspection_report, pdf_cache, report_etag
+        etag = report_etag(data)
+        if etag in request.if_none_match:
+            response = app.response_class(status=304)
+        else:
+            pdf = pdf_cache.get(etag)
+            if pdf is None:
+                pdf = build_inspection_report(data).getvalue()
+                pdf_cache.put(etag, pdf)
+                print(f"Report for analysis {analysis_id} rendered, size:", len(pdf))
+            response = send_file(io.BytesIO(pdf), as_attachment=True, mimetype='application/pdf',
+                                 download_name=f'pothole_report_{analysis_id}.pdf')
+        response.set_etag(etag)
+        # Browsers revalidate each download; an unchanged analysis costs one query and a 304
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    except Exception as e:
+        print("Report error:", e)
+        return jsonify({'success': False, 'error': f'PDF generation failed: {str(e)}'}), 500
+
+def encode_history_cursor(analysis_date, analysis_id):
+    return base64.urlsafe_b64encode(f"{analysis_date.isoformat()}|{analysis_id}".encode()).decode()
+
+def decode_history_cursor(cursor_token):
+    analysis_date, analysis_id = base64.urlsafe_b64decode(cursor_token.encode()).decode().split('|')
+    return datetime.fromisoformat(analysis_date), int(analysis_id)
+
 @app.route('/history')
 def get_history():
+    """
+    Newest analyses first, keyset-paginated: pass next_cursor from the previous
+    page as ?cursor=. Optional filters: city, start / end (YYYY-MM-DD),
+    min_cost / max_cost, and limit (default 50, max 200).
+    """
+    conditions = []
+    params = []
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), 200)
+        if request.args.get('cursor'):
+            conditions.append("(pa.analysis_date, pa.analysis_id) < (%s, %s)")
+            params.extend(decode_history_cursor(request.args['cursor']))
+        if request.args.get('city'):
+            conditions.append("l.city = %s")
+            params.append(request.args['city'])
+        if request.args.get('start'):
+            conditions.append("pa.analysis_date >= %s")
+            params.append(datetime.strptime(request.args['start'], '%Y-%m-%d'))
+        if request.args.get('end'):
+            conditions.append("pa.analysis_date < %s")
+            params.append(datetime.strptime(request.args['end'], '%Y-%m-%d') + timedelta(days=1))
+        if request.args.get('min_cost'):
+            conditions.append("ca.total_cost >= %s")
+            params.append(float(request.args['min_cost']))
+        if request.args.get('max_cost'):
+            conditions.append("ca.total_cost <= %s")
+            params.append(float(request.args['max_cost']))
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        return jsonify({'success': False, 'error': 'Invalid cursor, limit, date or cost filter'}), 400
+
     try:
         cursor = db.get_cursor()
-        query = """
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = f"""
             SELECT 
                 pa.analysis_id,
                 pa.total_potholes,
@@ -578,13 +1030,19 @@ def get_history():
             LEFT JOIN locations l ON pa.location_id = l.location_id
             LEFT JOIN media_files mf ON pa.media_id = mf.media_id
             LEFT JOIN cost_analysis ca ON pa.analysis_id = ca.analysis_id
-            ORDER BY pa.analysis_date DESC
-            LIMIT 50
+            {where}
+            ORDER BY pa.analysis_date DESC, pa.analysis_id DESC
+            LIMIT %s
         """
-        cursor.execute(query)
+        # One extra row tells whether another page exists
+        cursor.execute(query, params + [limit + 1])
         history = cursor.fetchall()
         cursor.close()
 
+        has_more = len(history) > limit
+        history = history[:limit]
+        next_cursor = encode_history_cursor(history[-1][3], history[-1][0]) if has_more else None
+
         history_list = []
         for row in history:
             # Convert row to dict if necessary
@@ -607,11 +1065,205 @@ def get_history():
                     'total_cost': row[11] if len(row) > 11 else None
                 })
 
-        return jsonify({'success': True, 'history': history_list})
+        return jsonify({'success': True, 'history': history_list, 'next_cursor': next_cursor, 'has_more': has_more})
     except Exception as e:
         print("History error:", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def map_analysis_row(row):
+    return {
+        'analysis_id': row[0],
+        'analysis_date': row[1].isoformat() if row[1] else None,
+        'total_potholes': row[2],
+        'total_volume_liters': row[3],
+        'location_name': row[4],
+        'city': row[5],
+        'latitude': row[6],
+        'longitude': row[7],
+        'total_cost': row[8]
+    }
+
+@app.route('/map/analyses')
+def map_analyses():
+    """Analyses inside a map viewport: ?bbox=west,south,east,north[&limit=500]"""
+    try:
+        west, south, east, north = (float(v) for v in request.args['bbox'].split(','))
+        limit = min(max(int(request.args.get('limit', 500)), 1), 2000)
+    except (KeyError, ValueError):
+        return jsonify({'success': False, 'error': 'bbox=west,south,east,north is required'}), 400
+    if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180):
+        return jsonify({'success': False, 'error': 'bbox is out of range'}), 400
+
+    try:
+        rows = LocationSearch.in_bbox(south, west, north, east, limit)
+        response = jsonify({'success': True, 'analyses': [map_analysis_row(r) for r in rows],
+                            'truncated': len(rows) == limit})
+        # Dashboards pan over the same tiles; let browsers and proxies reuse them briefly
+        response.headers['Cache-Control'] = f"public, max-age={app.config['MAP_CACHE_SECONDS']}"
+        return response
+    except Exception as e:
+        print("Map query error:", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/map/nearby')
+def map_nearby():
+    """Analyses near a point, nearest first: ?lat=&lon=&radius_m=500[&limit=100]"""
+    try:
+        latitude = float(request.args['lat'])
+        longitude = float(request.args['lon'])
+        radius_m = min(float(request.args.get('radius_m', 500)), 50000)
+        limit = min(max(int(request.args.get('limit', 100)), 1), 1000)
+    except (KeyError, ValueError):
+        return jsonify({'success': False, 'error': 'lat and lon are required'}), 400
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180) or radius_m <= 0:
+        return jsonify({'success': False, 'error': 'lat, lon or radius_m is out of range'}), 400
+
+    try:
+        rows = LocationSearch.near(latitude, longitude, radius_m, limit)
+        analyses = []
+        for row in rows:
+            analysis = map_analysis_row(row)
+            analysis['distance_m'] = round(float(row[9]), 1)
+            analyses.append(analysis)
+        response = jsonify({'success': True, 'analyses': analyses})
+        response.headers['Cache-Control'] = f"public, max-age={app.config['MAP_CACHE_SECONDS']}"
+        return response
+    except Exception as e:
+        print("Map query error:", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+def scenario_axis_length(spec):
+    """Number of values scenario_axis would build, without building them"""
+    if spec is None or isinstance(spec, (int, float)):
+        return 1
+    if isinstance(spec, dict):
+        return int(spec.get('steps', 10))
+    return len(spec)
+
+def scenario_axis(spec, default):
+    """A list of values, {"min", "max", "steps"} for an even range, or nothing for the default"""
+    if spec is None:
+        return np.array([default], dtype=np.float64)
+    if isinstance(spec, dict):
+        return np.linspace(float(spec['min']), float(spec['max']), int(spec.get('steps', 10)))
+    if isinstance(spec, (int, float)):
+        return np.array([spec], dtype=np.float64)
+    return np.asarray([float(v) for v in spec], dtype=np.float64)
+
+@app.route('/scenarios', methods=['POST'])
+def cost_scenarios():
+    """
+    What-if costing over stored work. Body: {"analysis_id": ...} or
+    {"city": ..., "start": ..., "end": ...}, plus any of material_cost,
+    labor_cost, team_size, overhead as value lists or {"min", "max", "steps"}.
+    Every combination is costed in one vectorized pass.
+    """
+    data = request.get_json(silent=True) or {}
+    defaults = CostParameters()
+    names = ('material_cost', 'labor_cost', 'team_size', 'overhead')
+    scenario_max = app.config['SCENARIO_MAX']
+    try:
+        # Size the grid on Python ints before allocating anything
+        lengths = [scenario_axis_length(data.get(name)) for name in names]
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'Invalid scenario parameters'}), 400
+    if any(n < 1 or n > scenario_max for n in lengths) or math.prod(lengths) > scenario_max:
+        return jsonify({'success': False, 'error': f"Scenario grid must have 1 to {scenario_max} combinations"}), 400
+
+    try:
+        axes = {
+            'material_cost': scenario_axis(data.get('material_cost'), defaults.material_cost_per_liter),
+            'labor_cost': scenario_axis(data.get('labor_cost'), defaults.labor_cost_per_hour),
+            'team_size': np.round(scenario_axis(data.get('team_size'), defaults.team_size)),
+            'overhead': scenario_axis(data.get('overhead'), defaults.overhead_percentage)
+        }
+        end = datetime.strptime(data['end'], '%Y-%m-%d').date() if data.get('end') else datetime.now().date()
+        start = datetime.strptime(data['start'], '%Y-%m-%d').date() if data.get('start') else end - timedelta(days=365)
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'Invalid scenario parameters'}), 400
+
+    shape = tuple(len(axis) for axis in axes.values())
+    count = math.prod(shape)
+
+    try:
+        if data.get('analysis_id') is not None:
+            basis = CostBasis.for_analysis(int(data['analysis_id']))
+            if not basis:
+                return jsonify({'success': False, 'error': 'Analysis not found'}), 404
+        elif data.get('city'):
+            basis = CostBasis.for_city(data['city'], start, end)
+        else:
+            return jsonify({'success': False, 'error': 'analysis_id or city is required'}), 400
+        jobs, total_potholes, total_volume = (float(v) for v in basis)
+        if jobs == 0:
+            return jsonify({'success': False, 'error': 'No analyses for this city and date range'}), 404
+
+        started = time.perf_counter()
+        totals = CostEstimator.scenario_grid(jobs, total_potholes, total_volume, *axes.values())
+        cheapest = np.unravel_index(np.argmin(totals), shape)
+        priciest = np.unravel_index(np.argmax(totals), shape)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        def scenario_at(index):
+            scenario = {name: float(axis[i]) for (name, axis), i in zip(axes.items(), index)}
+            scenario['total_cost'] = round(float(totals[index]), 2)
+            return scenario
+
+        result = {
+            'success': True,
+            'basis': {'analyses': int(jobs), 'total_potholes': int(total_potholes),
+                      'total_volume_liters': round(total_volume, 2)},
+            'axes': {name: axis.tolist() for name, axis in axes.items()},
+            'scenarios': count,
+            'summary': {
+                'min': round(float(totals.min()), 2),
+                'max': round(float(totals.max()), 2),
+                'mean': round(float(totals.mean()), 2),
+                'p50': round(float(np.percentile(totals, 50)), 2),
+                'p90': round(float(np.percentile(totals, 90)), 2)
+            },
+            'cheapest': scenario_at(cheapest),
+            'most_expensive': scenario_at(priciest),
+            'elapsed_ms': round(elapsed_ms, 3)
+        }
+        # Full grid, indexed [material_cost][labor_cost][team_size][overhead]
+        if count <= app.config['SCENARIO_GRID_LIMIT']:
+            result['total_cost'] = np.round(totals, 2).tolist()
+        return jsonify(result)
+    except Exception as e:
+        print("Scenario error:", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/healthz')
+def healthz():
+    """Liveness: the process is up and serving requests"""
+    return jsonify({'success': True, 'status': 'ok'})
+
+@app.route('/readyz')
+def readyz():
+    """Readiness: the model is warm and the database answers; route traffic only after this is 200"""
+    if not startup_state['ready']:
+        start_warm_up()
+        return jsonify({'success': False, 'status': 'warming_up', **startup_state}), 503
+    try:
+        cursor = db.get_cursor()
+        cursor.execute("SELECT 1")
+        cursor.close()
+    except Exception as e:
+        return jsonify({'success': False, 'status': 'database_unavailable', 'error': str(e)}), 503
+    return jsonify({'success': True, 'status': 'ready', **startup_state})
+
+@app.route('/metrics')
+def metrics():
+    estimator = _depth_estimator
+    return jsonify({
+        'success': True,
+        'db_pool': db.pool_stats(),
+        'result_cache': DetectionCache.stats(),
+        'micro_batching': estimator.stats() if isinstance(estimator, MicroBatcher) else {},
+        'report_cache': sys.modules['report'].pdf_cache.stats() if 'report' in sys.modules else {}
+    })
+
 @app.teardown_appcontext
 def close_db(error):
     db.close()
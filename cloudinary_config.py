@@ -1,75 +1,188 @@
 import cloudinary
 import cloudinary.uploader
 import cloudinary.api
+import cv2
+import io
 import os
+import shutil
+import tempfile
+import uuid
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from datetime import datetime
 
 load_dotenv()
 
-def configure_cloudinary():
-    cloudinary.config(
-        cloud_name=os.getenv('CLOUDINARY_CLOUD_NAME'),
-        api_key=os.getenv('CLOUDINARY_API_KEY'),
-        api_secret=os.getenv('CLOUDINARY_API_SECRET'),
-        secure=True
-    )
-    print("✅ Cloudinary configured successfully")
+class StorageBackend(ABC):
+    """
+    Where original uploads and annotated results are stored. Abstract, so a
+    backend missing a method fails when STORAGE_BACKEND is resolved, not mid-upload.
+    """
+    name = 'base'
 
-def upload_to_cloudinary(file_path, folder="uploads", resource_type="image"):
-    """Upload file to Cloudinary and return URL"""
-    try:
+    @abstractmethod
+    def upload_file(self, file_path, folder="uploads", resource_type="image"):
+        """Upload a file on disk"""
+
+    @abstractmethod
+    def upload_bytes(self, data, filename, folder="uploads", resource_type="image"):
+        """Upload an in-memory file; filename supplies the name and extension"""
+
+class CloudinaryBackend(StorageBackend):
+    name = 'cloudinary'
+
+    def __init__(self):
+        cloudinary.config(
+            cloud_name=os.getenv('CLOUDINARY_CLOUD_NAME'),
+            api_key=os.getenv('CLOUDINARY_API_KEY'),
+            api_secret=os.getenv('CLOUDINARY_API_SECRET'),
+            secure=True
+        )
+
+    def _result(self, upload_result):
+        return {
+            'success': True,
+            'url': upload_result['secure_url'],
+            'public_id': upload_result['public_id'],
+            'format': upload_result['format'],
+            'bytes': upload_result['bytes']
+        }
+
+    def upload_file(self, file_path, folder="uploads", resource_type="image"):
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = os.path.basename(file_path)
         public_id = f"pothole-detection/{folder}/{timestamp}_{os.path.splitext(filename)[0]}"
-        
+
         upload_result = cloudinary.uploader.upload(
             file_path,
             public_id=public_id,
             resource_type=resource_type,
             folder=f"pothole-detection/{folder}"
         )
-        
+        return self._result(upload_result)
+
+    def upload_bytes(self, data, filename, folder="uploads", resource_type="image"):
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        public_id = f"pothole-detection/{folder}/{timestamp}_{os.path.splitext(filename)[0]}"
+
+        upload_result = cloudinary.uploader.upload(
+            io.BytesIO(data),
+            public_id=public_id,
+            resource_type=resource_type,
+            folder=f"pothole-detection/{folder}"
+        )
+        return self._result(upload_result)
+
+class LocalStorageBackend(StorageBackend):
+    """
+    Stores files on the local filesystem; a stand-in for Cloudinary in
+    development and tests. Files are served by the app under base_url.
+    """
+    name = 'local'
+
+    def __init__(self, root=None, base_url='/media'):
+        self.root = root or os.getenv('LOCAL_STORAGE_DIR') or os.path.join(tempfile.gettempdir(), 'pothole-storage')
+        self.base_url = base_url.rstrip('/')
+        os.makedirs(self.root, exist_ok=True)
+
+    def _target(self, folder, stem, ext):
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        public_id = f"pothole-detection/{folder}/{timestamp}_{uuid.uuid4().hex[:8]}_{stem}"
+        path = os.path.join(self.root, *f"{public_id}.{ext}".split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return public_id, path
+
+    def _result(self, public_id, path, ext):
         return {
             'success': True,
-            'url': upload_result['secure_url'],
-            'public_id': upload_result['public_id'],
-            'format': upload_result['format'],
-            'bytes': upload_result['bytes']
+            'url': f"{self.base_url}/{public_id}.{ext}",
+            'public_id': public_id,
+            'format': ext,
+            'bytes': os.path.getsize(path)
         }
+
+    def upload_file(self, file_path, folder="uploads", resource_type="image"):
+        stem, ext = os.path.splitext(os.path.basename(file_path))
+        ext = ext.lstrip('.').lower() or 'bin'
+        public_id, path = self._target(folder, stem, ext)
+        shutil.copyfile(file_path, path)
+        return self._result(public_id, path, ext)
+
+    def upload_bytes(self, data, filename, folder="uploads", resource_type="image"):
+        stem, ext = os.path.splitext(os.path.basename(filename))
+        ext = ext.lstrip('.').lower() or 'bin'
+        public_id, path = self._target(folder, stem, ext)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return self._result(public_id, path, ext)
+
+storage_backend = None
+upload_executor = ThreadPoolExecutor(max_workers=int(os.getenv('UPLOAD_WORKERS', 4)),
+                                     thread_name_prefix='upload')
+
+def configure_cloudinary():
+    """Select the storage backend from STORAGE_BACKEND ('cloudinary' or 'local')"""
+    global storage_backend
+    backend = os.getenv('STORAGE_BACKEND', 'cloudinary').lower()
+    if backend == 'local':
+        storage_backend = LocalStorageBackend()
+        print(f"✅ Local storage configured at {storage_backend.root}")
+    else:
+        storage_backend = CloudinaryBackend()
+        print("✅ Cloudinary configured successfully")
+    return storage_backend
+
+def get_storage_backend():
+    if storage_backend is None:
+        configure_cloudinary()
+    return storage_backend
+
+def upload_to_cloudinary(file_path, folder="uploads", resource_type="image"):
+    """Upload file to the configured storage backend and return URL"""
+    try:
+        return get_storage_backend().upload_file(file_path, folder, resource_type)
     except Exception as e:
         print(f"❌ Cloudinary upload failed: {e}")
         return {'success': False, 'error': str(e)}
 
-def upload_annotated_image(image_array, original_filename, folder="results"):
-    """Upload annotated image (numpy array) to Cloudinary"""
+def upload_to_cloudinary_async(file_path, folder="uploads", resource_type="image"):
+    """Start upload_to_cloudinary on the upload thread pool; returns a Future"""
+    return upload_executor.submit(upload_to_cloudinary, file_path, folder, resource_type)
+
+def upload_bytes_to_cloudinary(data, filename, folder="uploads", resource_type="image"):
+    """Upload in-memory file contents to the configured storage backend"""
     try:
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        public_id = f"pothole-detection/{folder}/annotated_{timestamp}_{os.path.splitext(original_filename)[0]}"
-        
-        # Convert numpy array to temporary file
-        import tempfile
-        import cv2
-        
-        with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as temp_file:
-            cv2.imwrite(temp_file.name, image_array)
-            upload_result = cloudinary.uploader.upload(
-                temp_file.name,
-                public_id=public_id,
-                resource_type="image",
-                folder=f"pothole-detection/{folder}"
-            )
-        
-        # Clean up temp file
-        os.unlink(temp_file.name)
-        
-        return {
-            'success': True,
-            'url': upload_result['secure_url'],
-            'public_id': upload_result['public_id'],
-            'format': upload_result['format'],
-            'bytes': upload_result['bytes']
-        }
+        return get_storage_backend().upload_bytes(data, filename, folder, resource_type)
+    except Exception as e:
+        print(f"❌ Cloudinary upload failed: {e}")
+        return {'success': False, 'error': str(e)}
+
+def upload_bytes_to_cloudinary_async(data, filename, folder="uploads", resource_type="image"):
+    """Start upload_bytes_to_cloudinary on the upload thread pool; returns a Future"""
+    return upload_executor.submit(upload_bytes_to_cloudinary, data, filename, folder, resource_type)
+
+def encode_image(image_array, image_format=None, quality=None):
+    """Encode a BGR array in memory (jpg or webp); returns (bytes, extension)"""
+    image_format = (image_format or os.getenv('ANNOTATED_IMAGE_FORMAT', 'jpg')).lower().lstrip('.')
+    quality = int(quality or os.getenv('ANNOTATED_IMAGE_QUALITY', 85))
+    if image_format == 'webp':
+        params = [cv2.IMWRITE_WEBP_QUALITY, quality]
+    else:
+        image_format = 'jpg'
+        params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+
+    ok, buffer = cv2.imencode(f'.{image_format}', image_array, params)
+    if not ok:
+        raise ValueError(f"Could not encode image as {image_format}")
+    return buffer.tobytes(), image_format
+
+def upload_annotated_image(image_array, original_filename, folder="results", image_format=None, quality=None):
+    """Encode annotated image (numpy array) in memory and upload it to the configured storage backend"""
+    try:
+        data, ext = encode_image(image_array, image_format, quality)
+        filename = f"annotated_{os.path.splitext(original_filename)[0]}.{ext}"
+        return get_storage_backend().upload_bytes(data, filename, folder, "image")
     except Exception as e:
         print(f"❌ Cloudinary annotated image upload failed: {e}")
-        return {'success': False, 'error': str(e)}
\ No newline at end of file
+        return {'success': False, 'error': str(e)}
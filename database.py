@@ -1,26 +1,214 @@
 import psycopg2
+from psycopg2.extras import execute_values
 import os
 import threading
+import time
 from dotenv import load_dotenv
 
+from utils import geohash
+
 load_dotenv()
 
+class PoolTimeout(Exception):
+    """Raised when no pooled connection frees up within the checkout timeout"""
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe psycopg2 connection pool.
+    Idle connections are reused LIFO; connections idle for longer than
+    health_check_idle seconds are pinged before being handed out.
+    """
+
+    def __init__(self, dsn, minconn=1, maxconn=10, timeout=10.0, health_check_idle=30.0):
+        self.dsn = dsn
+        self.minconn = max(0, minconn)
+        self.maxconn = max(1, maxconn, self.minconn)
+        self.timeout = timeout
+        self.health_check_idle = health_check_idle
+
+        self._idle = []     # stack of (connection, last_used)
+        self._size = 0      # idle + checked out
+        self._cond = threading.Condition()
+
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._max_wait = 0.0
+        self._timeouts = 0
+        self._created = 0
+        self._discarded = 0
+
+        for _ in range(self.minconn):
+            self._idle.append((self._connect(), time.monotonic()))
+            self._size += 1
+
+    def _connect(self):
+        conn = psycopg2.connect(self.dsn)
+        with self._cond:
+            self._created += 1
+        return conn
+
+    def _is_healthy(self, conn, last_used):
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.health_check_idle:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._discarded += 1
+            self._cond.notify()
+
+    def getconn(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = False
+        conn = last_used = None
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._size < self.maxconn:
+                    self._size += 1   # reserve a slot, connect outside the lock
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(f"No database connection available after {self.timeout}s")
+                waited = True
+                self._cond.wait(remaining)
+
+            wait = time.monotonic() - start
+            self._checkouts += 1
+            if waited:
+                self._waits += 1
+                self._wait_time += wait
+                self._max_wait = max(self._max_wait, wait)
+
+        if conn is not None and self._is_healthy(conn, last_used):
+            return conn
+
+        if conn is not None:
+            # Stale connection: drop it but keep its slot for the replacement
+            try:
+                conn.close()
+            except Exception:
+                pass
+            with self._cond:
+                self._discarded += 1
+
+        try:
+            return self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+    def putconn(self, conn):
+        if conn.closed:
+            self._discard(conn)
+            return
+        try:
+            # Never hand the next caller a half-finished transaction
+            if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except Exception:
+            self._discard(conn)
+            return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'min_size': self.minconn,
+                'max_size': self.maxconn,
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'total_wait_seconds': round(self._wait_time, 4),
+                'max_wait_seconds': round(self._max_wait, 4),
+                'timeouts': self._timeouts,
+                'connections_created': self._created,
+                'connections_discarded': self._discarded
+            }
+
 class Database:
     def __init__(self):
         self.database_url = os.getenv("DATABASE_URL")
         self.thread_local = threading.local()
+        self.pool = None
+        self.pool_lock = threading.Lock()
 
         print("✅ DATABASE_URL:", self.database_url)
 
         if not self.database_url:
             raise RuntimeError("❌ DATABASE_URL is missing")
 
+    def get_pool(self):
+        if self.pool is None:
+            with self.pool_lock:
+                if self.pool is None:
+                    pool = ConnectionPool(
+                        self.database_url,
+                        minconn=int(os.getenv("DB_POOL_MIN", 1)),
+                        maxconn=int(os.getenv("DB_POOL_MAX", 10)),
+                        timeout=float(os.getenv("DB_POOL_TIMEOUT", 10)),
+                        health_check_idle=float(os.getenv("DB_POOL_HEALTH_CHECK_IDLE", 30))
+                    )
+                    # Schema is created once, with the pool, on first database use
+                    conn = pool.getconn()
+                    try:
+                        self.create_tables(conn)
+                    finally:
+                        pool.putconn(conn)
+                    self.pool = pool
+        return self.pool
+
     def get_connection(self):
+        """Check out a pooled connection, pinned to this thread until close()"""
         if not hasattr(self.thread_local, 'connection'):
-            self.thread_local.connection = psycopg2.connect(self.database_url)
-            self.create_tables(self.thread_local.connection)   # ✅ pass existing connection
+            self.thread_local.connection = self.get_pool().getconn()
         return self.thread_local.connection
 
+    def get_cursor(self):
+        return self.get_connection().cursor()
+
+    def close(self):
+        """Return this thread's connection to the pool (does not disconnect)"""
+        conn = getattr(self.thread_local, 'connection', None)
+        if conn is None:
+            return
+        del self.thread_local.connection
+        if self.pool is not None:
+            self.pool.putconn(conn)
+
+    def pool_stats(self):
+        return self.pool.stats() if self.pool is not None else {}
+
+    def migrate(self):
+        """Create the pool (and with it the schema) now rather than on the first query"""
+        self.get_pool()
+
     def create_tables(self, conn):    # ✅ receive connection
         cur = conn.cursor()
 
@@ -43,7 +231,7 @@ class Database:
                 file_type TEXT NOT NULL,
                 original_file_url TEXT,
                 processed_file_url TEXT,
-                file_size INTEGER,
+                file_size BIGINT,
                 upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             );
         """)
@@ -70,9 +258,12 @@ class Database:
                 depth_cm FLOAT,
                 volume_liters FLOAT,
                 confidence_score FLOAT,
+                class_id INTEGER,
                 bounding_box TEXT
             );
         """)
+        # Added after the first deployments
+        cur.execute("ALTER TABLE pothole_details ADD COLUMN IF NOT EXISTS class_id INTEGER;")
 
         cur.execute("""
             CREATE TABLE IF NOT EXISTS cost_analysis (
@@ -101,7 +292,103 @@ class Database:
             );
         """)
 
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS detection_cache (
+                cache_id SERIAL PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                model_version TEXT NOT NULL,
+                params_key TEXT NOT NULL,
+                file_type TEXT NOT NULL,
+                original_file_url TEXT,
+                processed_file_url TEXT,
+                file_size BIGINT,
+                pothole_data TEXT NOT NULL,
+                result_summary TEXT,
+                size_bytes INTEGER NOT NULL,
+                hit_count INTEGER DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE (content_hash, model_version, params_key)
+            );
+        """)
+        # Archived survey videos can exceed 2 GB; widen older tables once
+        cur.execute("""
+            DO $$
+            BEGIN
+                IF (SELECT data_type FROM information_schema.columns
+                    WHERE table_name = 'media_files' AND column_name = 'file_size') = 'integer' THEN
+                    ALTER TABLE media_files ALTER COLUMN file_size TYPE BIGINT;
+                END IF;
+                IF (SELECT data_type FROM information_schema.columns
+                    WHERE table_name = 'detection_cache' AND column_name = 'file_size') = 'integer' THEN
+                    ALTER TABLE detection_cache ALTER COLUMN file_size TYPE BIGINT;
+                END IF;
+            END $$;
+        """)
+
+        # Spatial bucketing for the map API: geohash prefixes are btree ranges under the C collation
+        cur.execute('ALTER TABLE locations ADD COLUMN IF NOT EXISTS geohash TEXT COLLATE "C";')
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_locations_geohash ON locations (geohash);")
+        self.backfill_geohashes(cur)
+
+        # Foreign keys are not indexed by Postgres; /history and the report joins need them
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_pothole_analysis_date ON pothole_analysis (analysis_date DESC, analysis_id DESC);
+            CREATE INDEX IF NOT EXISTS idx_pothole_analysis_location ON pothole_analysis (location_id);
+            CREATE INDEX IF NOT EXISTS idx_pothole_analysis_media ON pothole_analysis (media_id);
+            CREATE INDEX IF NOT EXISTS idx_pothole_details_analysis ON pothole_details (analysis_id);
+            CREATE INDEX IF NOT EXISTS idx_cost_analysis_analysis ON cost_analysis (analysis_id);
+            CREATE INDEX IF NOT EXISTS idx_time_estimation_analysis ON time_estimation (analysis_id);
+            CREATE INDEX IF NOT EXISTS idx_locations_city ON locations (city);
+        """)
+
+        # Per day and city totals for /analytics-data, kept current by AnalysisUnitOfWork.commit
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS analysis_daily_rollup (
+                day DATE NOT NULL,
+                city TEXT NOT NULL DEFAULT '',
+                analyses INTEGER NOT NULL DEFAULT 0,
+                total_potholes INTEGER NOT NULL DEFAULT 0,
+                depth_weighted_sum FLOAT NOT NULL DEFAULT 0,
+                total_volume_liters FLOAT NOT NULL DEFAULT 0,
+                material_cost FLOAT NOT NULL DEFAULT 0,
+                total_cost FLOAT NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, city)
+            );
+        """)
+        # Backfill once from existing analyses when the rollup is first created
+        cur.execute("""
+            INSERT INTO analysis_daily_rollup (day, city, analyses, total_potholes, depth_weighted_sum,
+                                               total_volume_liters, material_cost, total_cost)
+            SELECT pa.analysis_date::date, COALESCE(l.city, ''), COUNT(*),
+                   COALESCE(SUM(pa.total_potholes), 0),
+                   COALESCE(SUM(pa.average_depth_cm * pa.total_potholes), 0),
+                   COALESCE(SUM(pa.total_volume_liters), 0),
+                   COALESCE(SUM(ca.material_cost), 0),
+                   COALESCE(SUM(ca.total_cost), 0)
+            FROM pothole_analysis pa
+            LEFT JOIN locations l ON pa.location_id = l.location_id
+            LEFT JOIN cost_analysis ca ON pa.analysis_id = ca.analysis_id
+            WHERE NOT EXISTS (SELECT 1 FROM analysis_daily_rollup)
+            GROUP BY 1, 2;
+        """)
+
         conn.commit()
         print("✅ PostgreSQL tables created")
 
+    def backfill_geohashes(self, cur):
+        """Fill locations.geohash for rows stored before the column existed"""
+        cur.execute("""
+            SELECT location_id, latitude, longitude FROM locations
+            WHERE geohash IS NULL AND latitude BETWEEN -90 AND 90 AND longitude BETWEEN -180 AND 180
+        """)
+        rows = [(geohash.encode(lat, lon), location_id) for location_id, lat, lon in cur.fetchall()]
+        if rows:
+            execute_values(cur, """
+                UPDATE locations SET geohash = data.geohash
+                FROM (VALUES %s) AS data (geohash, location_id)
+                WHERE locations.location_id = data.location_id
+            """, rows, page_size=1000)
+            print(f"✅ Backfilled geohash for {len(rows)} locations")
+
 db = Database()
@@ -0,0 +1,124 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Job:
+    def __init__(self, description=''):
+        self.job_id = uuid.uuid4().hex
+        self.description = description
+        self.status = 'queued'          # queued → running → done | failed
+        self.stage = 'queued'
+        self.frames_processed = 0
+        self.total_frames = 0
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.lock = threading.Lock()
+
+    def set_stage(self, stage):
+        with self.lock:
+            self.stage = stage
+
+    def update_progress(self, frames_processed, total_frames=None):
+        """Progress callback handed to process_image/process_video"""
+        with self.lock:
+            self.frames_processed = int(frames_processed)
+            if total_frames is not None:
+                self.total_frames = int(total_frames)
+
+    def progress(self):
+        with self.lock:
+            percent = 0.0
+            if self.status == 'done':
+                percent = 100.0
+            elif self.total_frames > 0:
+                percent = min(100.0, 100.0 * self.frames_processed / self.total_frames)
+            return {
+                'job_id': self.job_id,
+                'status': self.status,
+                'stage': self.stage,
+                'frames_processed': self.frames_processed,
+                'total_frames': self.total_frames,
+                'percent': round(percent, 1)
+            }
+
+    def to_dict(self):
+        data = self.progress()
+        with self.lock:
+            data.update({
+                'description': self.description,
+                'created_at': self.created_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+                'result': self.result,
+                'error': self.error
+            })
+        return data
+
+
+class JobQueue:
+    """
+    In-process job queue backed by a thread pool.
+    Job state lives in memory, so the app must run as a single gunicorn worker process.
+    """
+
+    def __init__(self, max_workers=2, retention_seconds=3600):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self.retention_seconds = retention_seconds
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def submit(self, fn, *args, description='', **kwargs):
+        """Queue fn(job, *args, **kwargs) and return the Job immediately"""
+        job = Job(description)
+        with self.lock:
+            self._evict_finished()
+            self.jobs[job.job_id] = job
+        self.executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def _run(self, job, fn, args, kwargs):
+        with job.lock:
+            job.status = 'running'
+            job.started_at = time.time()
+        try:
+            result = fn(job, *args, **kwargs)
+            with job.lock:
+                job.result = result
+                if isinstance(result, dict) and not result.get('success', True):
+                    job.status = 'failed'
+                    job.error = result.get('error')
+                else:
+                    job.status = 'done'
+        except Exception as e:
+            print(f"❌ Job {job.job_id} failed: {e}")
+            with job.lock:
+                job.status = 'failed'
+                job.error = str(e)
+        finally:
+            with job.lock:
+                job.stage = job.status
+                job.finished_at = time.time()
+
+    def _evict_finished(self):
+        cutoff = time.time() - self.retention_seconds
+        expired = [job_id for job_id, job in self.jobs.items()
+                   if job.finished_at and job.finished_at < cutoff]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+
+# Default to one job thread per inference process so the pool can be kept busy
+job_queue = JobQueue(
+    max_workers=int(os.environ.get('JOB_WORKERS') or max(2, int(os.environ.get('INFERENCE_WORKERS', 0)))),
+    retention_seconds=int(os.environ.get('JOB_RETENTION_SECONDS', 3600))
+)
@@ -1,184 +1,606 @@
 from database import db
-from datetime import datetime
+from psycopg2.extras import execute_values
+from utils import geohash
 import json
+import threading
 
-class Location:
-    @staticmethod
-    def create(location_data):
+def _float_or_none(value):
+    """Form fields arrive as strings; empty coordinates must become NULL, not ''"""
+    try:
+        return float(value) if value not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
+def _location_geohash(location_data):
+    """Geohash of the form coordinates, or None when they are missing or out of range"""
+    latitude = _float_or_none(location_data.get('latitude'))
+    longitude = _float_or_none(location_data.get('longitude'))
+    if latitude is None or longitude is None or not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+    return geohash.encode(latitude, longitude)
+
+def _pothole_detail_rows(analysis_id, potholes_data):
+    return [(
+        analysis_id,
+        pothole.get('id'),
+        pothole.get('width_cm'),
+        pothole.get('depth_cm'),
+        pothole.get('volume_liters'),
+        pothole.get('confidence'),
+        pothole.get('class_id'),
+        json.dumps(pothole.get('bbox'))  # Convert list to JSON string
+    ) for pothole in potholes_data]
+
+POTHOLE_DETAILS_INSERT = '''
+    INSERT INTO pothole_details (analysis_id, pothole_number, width_cm,
+                               depth_cm, volume_liters, confidence_score, class_id, bounding_box)
+    VALUES %s
+'''
+
+class AnalysisUnitOfWork:
+    """
+    Collects every row produced by one analysis (location, media file, summary,
+    per-pothole details, cost and time) and writes them in a single transaction,
+    together with its share of the daily analytics rollup.
+    The parent rows go in one chained INSERT statement and the details in one
+    multi-row VALUES insert, so the whole upload commits once.
+    """
+
+    def __init__(self, location_data, media_data):
+        self.location_data = location_data or {}
+        self.media_data = media_data or {}
+        self.analysis_data = {}
+        self.potholes_data = []
+        self.cost_data = {}
+        self.time_data = None
+        # Set by AnalysisBatch.flush when written as part of a batch
+        self.analysis_id = None
+
+    @classmethod
+    def from_results(cls, location_data, media_data, pothole_data, cost_breakdown, cost_params):
+        """Unit of work for one analysed file: summary, details, cost and (if estimated) time rows"""
+        total_volume = sum(p['volume_liters'] for p in pothole_data) if pothole_data else 0
+        avg_width = sum(p['width_cm'] for p in pothole_data) / len(pothole_data) if pothole_data else 0
+        avg_depth = sum(p['depth_cm'] for p in pothole_data) / len(pothole_data) if pothole_data else 0
+
+        unit_of_work = cls(location_data, media_data)
+
+        unit_of_work.set_analysis({
+            'total_potholes': len(pothole_data),
+            'total_volume_liters': total_volume,
+            'average_width_cm': avg_width,
+            'average_depth_cm': avg_depth
+        }, pothole_data)
+
+        unit_of_work.set_cost({
+            'material_cost': cost_breakdown.get('material_cost', 0),
+            'labor_cost': cost_breakdown.get('labor_cost', 0),
+            'equipment_cost': cost_breakdown.get('equipment_cost', 0),
+            'transport_cost': cost_breakdown.get('transport_cost', 0),
+            'overhead_cost': cost_breakdown.get('overhead_cost', 0),
+            'total_cost': cost_breakdown.get('total_cost', 0),
+            'cost_parameters': cost_params.to_dict()
+        })
+
+        if 'time_breakdown' in cost_breakdown:
+            unit_of_work.set_time({
+                'total_hours': cost_breakdown['time_breakdown'].get('total_hours', 0),
+                'setup_time': cost_breakdown['time_breakdown'].get('setup_time', 0),
+                'prep_time': cost_breakdown['time_breakdown'].get('prep_time', 0),
+                'fill_time': cost_breakdown['time_breakdown'].get('fill_time', 0),
+                'compact_time': cost_breakdown['time_breakdown'].get('compact_time', 0),
+                'cleanup_time': cost_breakdown['time_breakdown'].get('cleanup_time', 0)
+            })
+        return unit_of_work
+
+    def set_analysis(self, analysis_data, potholes_data):
+        self.analysis_data = analysis_data
+        self.potholes_data = potholes_data or []
+
+    def set_cost(self, cost_data):
+        self.cost_data = cost_data
+
+    def set_time(self, time_data):
+        self.time_data = time_data
+
+    def commit(self):
+        """Write everything; returns {'location_id', 'media_id', 'analysis_id'} or None on failure"""
         cursor = db.get_cursor()
         try:
-            query = '''
-                INSERT INTO locations (location_name, latitude, longitude, city, additional_notes)
+            location_id, media_id, analysis_id = self.insert(cursor)
+
+            rows = _pothole_detail_rows(analysis_id, self.potholes_data)
+            if rows:
+                execute_values(cursor, POTHOLE_DETAILS_INSERT, rows, page_size=len(rows))
+
+            db.get_connection().commit()
+            return {'location_id': location_id, 'media_id': media_id, 'analysis_id': analysis_id}
+        except Exception as e:
+            print(f"❌ Analysis unit of work failed: {e}")
+            db.get_connection().rollback()
+            return None
+        finally:
+            cursor.close()
+
+    def insert(self, cursor):
+        """Run the chained parent-row INSERT (no details, no commit); returns (location_id, media_id, analysis_id)"""
+        location = self.location_data
+        media = self.media_data
+        analysis = self.analysis_data
+        cost = self.cost_data
+        time_data = self.time_data or {}
+
+        query = '''
+            WITH loc AS (
+                INSERT INTO locations (location_name, latitude, longitude, city, additional_notes, geohash)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                RETURNING location_id
+            ), media AS (
+                INSERT INTO media_files (original_filename, file_type, original_file_url,
+                                       processed_file_url, file_size)
                 VALUES (%s, %s, %s, %s, %s)
-            '''
-            values = (
-                location_data.get('location_name'),
-                location_data.get('latitude'),
-                location_data.get('longitude'),
-                location_data.get('city'),
-                location_data.get('additional_notes')
+                RETURNING media_id
+            ), analysis AS (
+                INSERT INTO pothole_analysis (location_id, media_id, total_potholes,
+                                            total_volume_liters, average_width_cm, average_depth_cm)
+                SELECT loc.location_id, media.media_id, %s, %s, %s, %s FROM loc, media
+                RETURNING analysis_id
+            ), cost AS (
+                INSERT INTO cost_analysis (analysis_id, material_cost, labor_cost,
+                                         equipment_cost, transport_cost, overhead_cost,
+                                         total_cost, cost_parameters)
+                SELECT analysis.analysis_id, %s, %s, %s, %s, %s, %s, %s FROM analysis
+            ), time_est AS (
+                INSERT INTO time_estimation (analysis_id, total_hours, setup_time,
+                                           prep_time, fill_time, compact_time, cleanup_time)
+                SELECT analysis.analysis_id, %s, %s, %s, %s, %s, %s FROM analysis
+                WHERE %s
+            ), rollup AS (
+                INSERT INTO analysis_daily_rollup AS r (day, city, analyses, total_potholes,
+                                                       depth_weighted_sum, total_volume_liters,
+                                                       material_cost, total_cost)
+                SELECT LOCALTIMESTAMP::date, %s, 1, %s, %s, %s, %s, %s FROM analysis
+                ON CONFLICT (day, city) DO UPDATE SET
+                    analyses = r.analyses + 1,
+                    total_potholes = r.total_potholes + EXCLUDED.total_potholes,
+                    depth_weighted_sum = r.depth_weighted_sum + EXCLUDED.depth_weighted_sum,
+                    total_volume_liters = r.total_volume_liters + EXCLUDED.total_volume_liters,
+                    material_cost = r.material_cost + EXCLUDED.material_cost,
+                    total_cost = r.total_cost + EXCLUDED.total_cost
             )
-            cursor.execute(query + " RETURNING location_id", values)
-            location_id = cursor.fetchone()[0]
+            SELECT loc.location_id, media.media_id, analysis.analysis_id FROM loc, media, analysis
+        '''
+        values = (
+            location.get('location_name'),
+            _float_or_none(location.get('latitude')),
+            _float_or_none(location.get('longitude')),
+            location.get('city'),
+            location.get('additional_notes'),
+            _location_geohash(location),
+
+            media.get('original_filename'),
+            media.get('file_type'),
+            media.get('original_file_url'),
+            media.get('processed_file_url'),
+            media.get('file_size'),
+
+            analysis.get('total_potholes'),
+            analysis.get('total_volume_liters'),
+            analysis.get('average_width_cm'),
+            analysis.get('average_depth_cm'),
+
+            cost.get('material_cost'),
+            cost.get('labor_cost'),
+            cost.get('equipment_cost'),
+            cost.get('transport_cost'),
+            cost.get('overhead_cost'),
+            cost.get('total_cost'),
+            json.dumps(cost.get('cost_parameters')),
+
+            time_data.get('total_hours'),
+            time_data.get('setup_time'),
+            time_data.get('prep_time'),
+            time_data.get('fill_time'),
+            time_data.get('compact_time'),
+            time_data.get('cleanup_time'),
+            self.time_data is not None,
+
+            location.get('city') or '',
+            analysis.get('total_potholes') or 0,
+            (analysis.get('average_depth_cm') or 0) * (analysis.get('total_potholes') or 0),
+            analysis.get('total_volume_liters') or 0,
+            cost.get('material_cost') or 0,
+            cost.get('total_cost') or 0
+        )
+        cursor.execute(query, values)
+        return cursor.fetchone()
+
+class AnalysisBatch:
+    """
+    Units of work from many files, written in as few transactions as possible:
+    parent rows unit by unit (each under a savepoint, so one bad row does not
+    drop the rest), every unit's pothole details in one multi-row insert, and
+    a single commit per flush. Workers add() from any thread.
+    """
+
+    def __init__(self):
+        self.pending = []
+        self.lock = threading.Lock()
+
+    def add(self, unit_of_work):
+        with self.lock:
+            self.pending.append(unit_of_work)
+        return unit_of_work
+
+    def __len__(self):
+        with self.lock:
+            return len(self.pending)
+
+    def flush(self):
+        """Write every pending unit; sets unit.analysis_id (None if its insert failed) and returns the count stored"""
+        with self.lock:
+            units, self.pending = self.pending, []
+        if not units:
+            return 0
+
+        cursor = db.get_cursor()
+        try:
+            rows = []
+            for unit in units:
+                cursor.execute("SAVEPOINT batch_unit")
+                try:
+                    _, _, unit.analysis_id = unit.insert(cursor)
+                    cursor.execute("RELEASE SAVEPOINT batch_unit")
+                except Exception as e:
+                    print(f"❌ Batch analysis insert failed: {e}")
+                    cursor.execute("ROLLBACK TO SAVEPOINT batch_unit")
+                    continue
+                rows.extend(_pothole_detail_rows(unit.analysis_id, unit.potholes_data))
+            if rows:
+                execute_values(cursor, POTHOLE_DETAILS_INSERT, rows, page_size=1000)
+
             db.get_connection().commit()
-            return location_id
+            return sum(1 for unit in units if unit.analysis_id)
         except Exception as e:
-            print(f"❌ Location creation failed: {e}")
+            print(f"❌ Analysis batch failed: {e}")
             db.get_connection().rollback()
-            return None
+            for unit in units:
+                unit.analysis_id = None
+            return 0
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def stored_files(urls):
+        """{(original_file_url, file_size): latest analysis_id} for the given URLs that already have an analysis"""
+        if not urls:
+            return {}
+        cursor = db.get_cursor()
+        try:
+            cursor.execute('''
+                SELECT mf.original_file_url, mf.file_size, MAX(pa.analysis_id)
+                FROM media_files mf
+                JOIN pothole_analysis pa ON pa.media_id = mf.media_id
+                WHERE mf.original_file_url = ANY(%s)
+                GROUP BY mf.original_file_url, mf.file_size
+            ''', (list(urls),))
+            return {(url, size): analysis_id for url, size, analysis_id in cursor.fetchall()}
         finally:
             cursor.close()
 
-class MediaFile:
+class AnalyticsRollup:
+    GRANULARITIES = ('day', 'week', 'month')
+
     @staticmethod
-    def create(media_data):
+    def series(start, end, granularity='day', city=None):
+        """Totals per day/week/month between start and end (inclusive dates), oldest first"""
+        if granularity not in AnalyticsRollup.GRANULARITIES:
+            raise ValueError(f"granularity must be one of {AnalyticsRollup.GRANULARITIES}")
         cursor = db.get_cursor()
         try:
             query = '''
-                INSERT INTO media_files (original_filename, file_type, original_file_url, 
-                                       processed_file_url, file_size)
-                VALUES (%s, %s, %s,%s,%s)
+                SELECT date_trunc(%s, day)::date AS bucket,
+                       SUM(analyses), SUM(total_potholes),
+                       SUM(depth_weighted_sum) / NULLIF(SUM(total_potholes), 0),
+                       SUM(total_volume_liters), SUM(material_cost), SUM(total_cost)
+                FROM analysis_daily_rollup
+                WHERE day BETWEEN %s AND %s AND (%s IS NULL OR city = %s)
+                GROUP BY bucket
+                ORDER BY bucket
             '''
-            values = (
-                media_data.get('original_filename'),
-                media_data.get('file_type'),
-                media_data.get('original_file_url'),
-                media_data.get('processed_file_url'),
-                media_data.get('file_size')
-            )
-            cursor.execute(query + " RETURNING media_id", values)
-            media_id = cursor.fetchone()[0]
-            db.get_connection().commit()
-            return media_id
+            cursor.execute(query, (granularity, start, end, city, city))
+            return cursor.fetchall()
+        finally:
+            cursor.close()
 
-        except Exception as e:
-            print(f"❌ Media file creation failed: {e}")
-            db.get_connection().rollback()
-            return None
+class CostBasis:
+    """The workload a cost scenario is evaluated over: (jobs, total potholes, total volume in liters)"""
+
+    @staticmethod
+    def for_analysis(analysis_id):
+        cursor = db.get_cursor()
+        try:
+            cursor.execute(
+                "SELECT 1, total_potholes, COALESCE(total_volume_liters, 0) FROM pothole_analysis WHERE analysis_id = %s",
+                (analysis_id,))
+            return cursor.fetchone()
         finally:
             cursor.close()
 
-class PotholeAnalysis:
     @staticmethod
-    def create(analysis_data):
+    def for_city(city, start, end):
+        """Summed from the daily rollup, so a whole city costs one indexed range read"""
         cursor = db.get_cursor()
         try:
-            query = '''
-                INSERT INTO pothole_analysis (location_id, media_id, total_potholes, 
-                                            total_volume_liters, average_width_cm, average_depth_cm)
-                VALUES (%s, %s, %s, %s, %s, %s)
+            cursor.execute('''
+                SELECT COALESCE(SUM(analyses), 0), COALESCE(SUM(total_potholes), 0),
+                       COALESCE(SUM(total_volume_liters), 0)
+                FROM analysis_daily_rollup
+                WHERE city = %s AND day BETWEEN %s AND %s
+            ''', (city, start, end))
+            return cursor.fetchone()
+        finally:
+            cursor.close()
 
-            '''
-            values = (
-                analysis_data.get('location_id'),
-                analysis_data.get('media_id'),
-                analysis_data.get('total_potholes'),
-                analysis_data.get('total_volume_liters'),
-                analysis_data.get('average_width_cm'),
-                analysis_data.get('average_depth_cm')
-            )
-            cursor.execute(query + " RETURNING analysis_id", values)
-            analysis_id = cursor.fetchone()[0]
-            db.get_connection().commit()
-            return analysis_id
+class AnalysisReport:
+    @staticmethod
+    def load(analysis_id):
+        """
+        Everything an inspection report shows for one stored analysis, shaped like
+        the upload result (with the full pothole list), or None if it does not exist
+        """
+        cursor = db.get_cursor()
+        try:
+            cursor.execute('''
+                SELECT pa.analysis_id, pa.analysis_date, pa.total_potholes, pa.total_volume_liters,
+                       mf.file_type, mf.original_filename, mf.processed_file_url,
+                       l.location_name, l.city, l.latitude, l.longitude,
+                       ca.material_cost, ca.labor_cost, ca.equipment_cost, ca.transport_cost,
+                       ca.overhead_cost, ca.total_cost, te.total_hours
+                FROM pothole_analysis pa
+                LEFT JOIN media_files mf ON pa.media_id = mf.media_id
+                LEFT JOIN locations l ON pa.location_id = l.location_id
+                LEFT JOIN cost_analysis ca ON pa.analysis_id = ca.analysis_id
+                LEFT JOIN time_estimation te ON pa.analysis_id = te.analysis_id
+                WHERE pa.analysis_id = %s
+            ''', (analysis_id,))
+            row = cursor.fetchone()
+            if not row:
+                return None
 
-        except Exception as e:
-            print(f"❌ Pothole analysis creation failed: {e}")
-            db.get_connection().rollback()
-            return None
+            cursor.execute('''
+                SELECT pothole_number, width_cm, depth_cm, volume_liters, confidence_score
+                FROM pothole_details
+                WHERE analysis_id = %s
+                ORDER BY pothole_number
+            ''', (analysis_id,))
+            details = cursor.fetchall()
         finally:
             cursor.close()
 
-class PotholeDetails:
+        pothole_data = []
+        for number, width_cm, depth_cm, volume_liters, confidence in details:
+            pothole = {'id': number, 'width_cm': width_cm or 0, 'depth_cm': depth_cm or 0,
+                       'volume_liters': volume_liters or 0}
+            if confidence is not None:
+                pothole['confidence'] = confidence
+            pothole_data.append(pothole)
+
+        return {
+            'analysis_id': row[0],
+            'analysis_date': row[1].isoformat() if row[1] else None,
+            'potholes_detected': row[2],
+            'total_volume_liters': row[3] or 0,
+            'file_type': row[4],
+            'original_filename': row[5],
+            'result_image': row[6],
+            'location_data': {'location_name': row[7] or '', 'city': row[8] or '',
+                              'latitude': row[9], 'longitude': row[10]},
+            'cost_breakdown': {
+                'material_cost': row[11] or 0,
+                'labor_cost': row[12] or 0,
+                'equipment_cost': row[13] or 0,
+                'transport_cost': row[14] or 0,
+                'overhead_cost': row[15] or 0,
+                'total_cost': row[16] or 0,
+                'total_hours': row[17]
+            },
+            'pothole_data': pothole_data
+        }
+
+class LocationSearch:
+    """
+    Map queries over analyzed locations. A viewport is turned into a few
+    geohash prefixes (utils.geohash.covering_cells), each an index range scan
+    on locations.geohash; the exact box or distance check runs on that subset.
+    """
+    COLUMNS = '''
+        pa.analysis_id, pa.analysis_date, pa.total_potholes, pa.total_volume_liters,
+        l.location_name, l.city, l.latitude, l.longitude, ca.total_cost
+    '''
+
+    @staticmethod
+    def _cell_condition(cells):
+        # '{' sorts right after 'z', the last geohash character
+        ranges = " OR ".join(["(l.geohash >= %s AND l.geohash < %s)"] * len(cells))
+        params = []
+        for cell in cells:
+            params.extend([cell, cell + '{'])
+        return f"({ranges})", params
+
+    @staticmethod
+    def _longitude_condition(west, east):
+        if west > east:    # viewport crosses the antimeridian
+            return "(l.longitude >= %s OR l.longitude <= %s)", [west, east]
+        return "l.longitude BETWEEN %s AND %s", [west, east]
+
     @staticmethod
-    def create_batch(analysis_id, potholes_data):
+    def in_bbox(south, west, north, east, limit=500):
+        """Analyses whose location falls in the box, newest first"""
+        cells_sql, params = LocationSearch._cell_condition(geohash.covering_cells(south, west, north, east))
+        lon_sql, lon_params = LocationSearch._longitude_condition(west, east)
         cursor = db.get_cursor()
         try:
-            query = '''
-                INSERT INTO pothole_details (analysis_id, pothole_number, width_cm, 
-                                           depth_cm, volume_liters, confidence_score, bounding_box)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
+            query = f'''
+                SELECT {LocationSearch.COLUMNS}
+                FROM locations l
+                JOIN pothole_analysis pa ON pa.location_id = l.location_id
+                LEFT JOIN cost_analysis ca ON ca.analysis_id = pa.analysis_id
+                WHERE {cells_sql}
+                  AND l.latitude BETWEEN %s AND %s AND {lon_sql}
+                ORDER BY pa.analysis_date DESC
+                LIMIT %s
+            '''
+            cursor.execute(query, params + [south, north] + lon_params + [limit])
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def near(latitude, longitude, radius_m, limit=100):
+        """Analyses within radius_m of the point, nearest first; rows end with distance in meters"""
+        south, west, north, east = geohash.radius_bbox(latitude, longitude, radius_m)
+        cells_sql, params = LocationSearch._cell_condition(geohash.covering_cells(south, west, north, east))
+        cursor = db.get_cursor()
+        try:
+            query = f'''
+                SELECT * FROM (
+                    SELECT {LocationSearch.COLUMNS},
+                           2 * %s * asin(sqrt(
+                               power(sin(radians(l.latitude - %s) / 2), 2) +
+                               cos(radians(%s)) * cos(radians(l.latitude)) *
+                               power(sin(radians(l.longitude - %s) / 2), 2)
+                           )) AS distance_m
+                    FROM locations l
+                    JOIN pothole_analysis pa ON pa.location_id = l.location_id
+                    LEFT JOIN cost_analysis ca ON ca.analysis_id = pa.analysis_id
+                    WHERE {cells_sql}
+                ) nearby
+                WHERE distance_m <= %s
+                ORDER BY distance_m
+                LIMIT %s
             '''
-            values = []
-            for pothole in potholes_data:
-                values.append((
-                    analysis_id,
-                    pothole.get('id'),
-                    pothole.get('width_cm'),
-                    pothole.get('depth_cm'),
-                    pothole.get('volume_liters'),
-                    pothole.get('confidence'),
-                    json.dumps(pothole.get('bbox'))  # Convert list to JSON string
-                ))
-            
-            cursor.executemany(query, values)
+            values = [geohash.EARTH_RADIUS_M, latitude, latitude, longitude] + params + [radius_m, limit]
+            cursor.execute(query, values)
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+class DetectionCache:
+    """
+    Content-addressed cache of detection results, keyed by file hash,
+    model version and the parameters that change detections.
+    Entries expire by age and the oldest-used ones are evicted past a byte budget.
+    """
+    stats_lock = threading.Lock()
+    hits = 0
+    misses = 0
+
+    @classmethod
+    def record(cls, hit):
+        with cls.stats_lock:
+            if hit:
+                cls.hits += 1
+            else:
+                cls.misses += 1
+
+    @classmethod
+    def stats(cls):
+        with cls.stats_lock:
+            total = cls.hits + cls.misses
+            return {
+                'hits': cls.hits,
+                'misses': cls.misses,
+                'hit_rate': round(cls.hits / total, 4) if total else 0.0
+            }
+
+    @staticmethod
+    def lookup(content_hash, model_version, params_key):
+        cursor = db.get_cursor()
+        try:
+            cursor.execute('''
+                UPDATE detection_cache
+                SET hit_count = hit_count + 1, last_used_at = CURRENT_TIMESTAMP
+                WHERE content_hash = %s AND model_version = %s AND params_key = %s
+                RETURNING file_type, original_file_url, processed_file_url, file_size,
+                          pothole_data, result_summary
+            ''', (content_hash, model_version, params_key))
+            row = cursor.fetchone()
             db.get_connection().commit()
-            return True
+            DetectionCache.record(row is not None)
+            if not row:
+                return None
+            return {
+                'file_type': row[0],
+                'original_file_url': row[1],
+                'processed_file_url': row[2],
+                'file_size': row[3],
+                'pothole_data': json.loads(row[4]),
+                'result_summary': json.loads(row[5]) if row[5] else {}
+            }
         except Exception as e:
-            print(f"❌ Pothole details creation failed: {e}")
+            print(f"❌ Detection cache lookup failed: {e}")
             db.get_connection().rollback()
-            return False
+            return None
         finally:
             cursor.close()
 
-class CostAnalysis:
     @staticmethod
-    def create(cost_data):
+    def store(content_hash, model_version, params_key, media_data, pothole_data, result_summary):
         cursor = db.get_cursor()
         try:
-            query = '''
-                INSERT INTO cost_analysis (analysis_id, material_cost, labor_cost, 
-                                         equipment_cost, transport_cost, overhead_cost, 
-                                         total_cost, cost_parameters)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-
-            '''
-            values = (
-                cost_data.get('analysis_id'),
-                cost_data.get('material_cost'),
-                cost_data.get('labor_cost'),
-                cost_data.get('equipment_cost'),
-                cost_data.get('transport_cost'),
-                cost_data.get('overhead_cost'),
-                cost_data.get('total_cost'),
-                json.dumps(cost_data.get('cost_parameters'))
-            )
-            cursor.execute(query, values)
+            pothole_json = json.dumps(pothole_data)
+            summary_json = json.dumps(result_summary or {})
+            cursor.execute('''
+                INSERT INTO detection_cache (content_hash, model_version, params_key, file_type,
+                                             original_file_url, processed_file_url, file_size,
+                                             pothole_data, result_summary, size_bytes)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT (content_hash, model_version, params_key) DO NOTHING
+            ''', (
+                content_hash, model_version, params_key,
+                media_data.get('file_type'),
+                media_data.get('original_file_url'),
+                media_data.get('processed_file_url'),
+                media_data.get('file_size'),
+                pothole_json, summary_json,
+                len(pothole_json) + len(summary_json)
+            ))
             db.get_connection().commit()
             return True
         except Exception as e:
-            print(f"❌ Cost analysis creation failed: {e}")
+            print(f"❌ Detection cache store failed: {e}")
             db.get_connection().rollback()
             return False
         finally:
             cursor.close()
 
-class TimeEstimation:
     @staticmethod
-    def create(time_data):
+    def evict(max_age_days, max_bytes):
+        """Drop entries unused for max_age_days, then least recently used ones beyond max_bytes"""
         cursor = db.get_cursor()
         try:
-            query = '''
-                INSERT INTO time_estimation (analysis_id, total_hours, setup_time, 
-                                           prep_time, fill_time, compact_time, cleanup_time)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-
-            '''
-            values = (
-                time_data.get('analysis_id'),
-                time_data.get('total_hours'),
-                time_data.get('setup_time'),
-                time_data.get('prep_time'),
-                time_data.get('fill_time'),
-                time_data.get('compact_time'),
-                time_data.get('cleanup_time')
-            )
-            cursor.execute(query, values)
+            cursor.execute('''
+                DELETE FROM detection_cache
+                WHERE last_used_at < CURRENT_TIMESTAMP - make_interval(days => %s)
+            ''', (int(max_age_days),))
+            expired = cursor.rowcount
+            cursor.execute('''
+                DELETE FROM detection_cache WHERE cache_id IN (
+                    SELECT cache_id FROM (
+                        SELECT cache_id,
+                               SUM(size_bytes) OVER (ORDER BY last_used_at DESC, cache_id DESC) AS running_bytes
+                        FROM detection_cache
+                    ) ranked
+                    WHERE running_bytes > %s
+                )
+            ''', (int(max_bytes),))
+            evicted = cursor.rowcount
             db.get_connection().commit()
-            return True
+            return expired + evicted
         except Exception as e:
-            print(f"❌ Time estimation creation failed: {e}")
+            print(f"❌ Detection cache eviction failed: {e}")
             db.get_connection().rollback()
-            return False
+            return 0
         finally:
-            cursor.close()
\ No newline at end of file
+            cursor.close()
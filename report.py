@@ -0,0 +1,206 @@
+"""
+PDF inspection reports. app.py imports this module lazily (warm_up_services
+loads it in the background), keeping ReportLab off the import path. Styles
+are built once when the module loads and shared by every report.
+"""
+import hashlib
+import io
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from reportlab.lib.pagesizes import A4
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib import colors
+from reportlab.lib.units import inch
+
+# Bump when the layout changes so cached PDFs and ETags are not reused
+REPORT_LAYOUT_VERSION = 2
+# Pothole rows per table flowable; each splits across pages with its header repeated
+POTHOLE_ROWS_PER_TABLE = 200
+
+STYLES = getSampleStyleSheet()
+TITLE_STYLE = ParagraphStyle('CustomTitle', parent=STYLES['Heading1'], fontSize=18, spaceAfter=30, alignment=1, textColor=colors.HexColor('#2563eb'))
+
+DETAILS_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1e293b')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 12),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#f8fafc')),
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 1), (-1, -1), 10),
+    ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+])
+
+COST_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#10b981')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 12),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -2), colors.HexColor('#f8fafc')),
+    ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#1e293b')),
+    ('TEXTCOLOR', (0, -1), (-1, -1), colors.whitesmoke),
+    ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 1), (-1, -1), 10),
+    ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+])
+
+POTHOLE_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3b82f6')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#f8fafc')),
+    ('FONTSIZE', (0, 1), (-1, -1), 9),
+    ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+])
+
+POTHOLE_HEADER = ['ID', 'Width (cm)', 'Depth (cm)', 'Volume (L)', 'Confidence']
+POTHOLE_COL_WIDTHS = [0.6*inch, 1.2*inch, 1.2*inch, 1.2*inch, 1.1*inch]
+
+def build_inspection_report(data):
+    """
+    Render the inspection report for one analysis result; returns a BytesIO positioned at 0.
+    Stored analyses (data with analysis_date) show that date, so the same rows always
+    render the same report; posted results show the current time.
+    """
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=1*inch, bottomMargin=1*inch)
+    elements = []
+
+    elements.append(Paragraph("Pothole Inspection Report", TITLE_STYLE))
+    elements.append(Spacer(1, 20))
+
+    if data.get('analysis_date'):
+        details_data = [
+            ['Analysis Date', datetime.fromisoformat(data['analysis_date']).strftime('%Y-%m-%d %H:%M:%S')],
+            ['Analysis ID', str(data.get('analysis_id', ''))],
+        ]
+    else:
+        details_data = [['Report Date', datetime.now().strftime('%Y-%m-%d %H:%M:%S')]]
+    details_data += [
+        ['File Type', data.get('file_type', 'N/A')],
+        ['Potholes Detected', str(data.get('potholes_detected', 0))],
+    ]
+
+    location_data = data.get('location_data', {})
+    if location_data.get('location_name'):
+        details_data.append(['Location', location_data['location_name']])
+    if location_data.get('city'):
+        details_data.append(['City', location_data['city']])
+
+    details_table = Table(details_data, colWidths=[2*inch, 3*inch])
+    details_table.setStyle(DETAILS_TABLE_STYLE)
+    elements.append(details_table)
+    elements.append(Spacer(1, 30))
+
+    cost_breakdown = data.get('cost_breakdown', {})
+    material_cost = f"₹{cost_breakdown.get('material_cost', 0):.2f}"
+    labor_cost = f"₹{cost_breakdown.get('labor_cost', 0):.2f}"
+    equipment_transport = f"₹{(cost_breakdown.get('equipment_cost', 0) + cost_breakdown.get('transport_cost', 0)):.2f}"
+    overhead_cost = f"₹{cost_breakdown.get('overhead_cost', 0):.2f}"
+    total_cost = f"₹{cost_breakdown.get('total_cost', 0):.2f}"
+
+    cost_data = [
+        ['Cost Item', 'Amount (₹)'],
+        ['Material Cost', material_cost],
+        ['Labor Cost', labor_cost],
+        ['Equipment & Transport', equipment_transport],
+        ['Overhead', overhead_cost],
+        ['TOTAL COST', total_cost]
+    ]
+
+    cost_table = Table(cost_data, colWidths=[3*inch, 2*inch])
+    cost_table.setStyle(COST_TABLE_STYLE)
+    elements.append(Paragraph("Cost Breakdown", STYLES['Heading2']))
+    elements.append(Spacer(1, 10))
+    elements.append(cost_table)
+
+    pothole_data = data.get('pothole_data', [])
+    if pothole_data:
+        elements.append(Spacer(1, 30))
+        elements.append(Paragraph("Pothole Details", STYLES['Heading2']))
+        elements.append(Spacer(1, 10))
+        rows = []
+        for pothole in pothole_data:
+            confidence = pothole.get('confidence')
+            rows.append([
+                str(pothole.get('id', '')),
+                f"{pothole.get('width_cm', 0):.1f}",
+                f"{pothole.get('depth_cm', 0):.1f}",
+                f"{pothole.get('volume_liters', 0):.2f}",
+                f"{confidence:.2f}" if confidence is not None else '-'
+            ])
+        # Every pothole, in page-splittable chunks rather than one huge table
+        for start in range(0, len(rows), POTHOLE_ROWS_PER_TABLE):
+            pothole_table = Table([POTHOLE_HEADER] + rows[start:start + POTHOLE_ROWS_PER_TABLE],
+                                  colWidths=POTHOLE_COL_WIDTHS, repeatRows=1)
+            pothole_table.setStyle(POTHOLE_TABLE_STYLE)
+            elements.append(pothole_table)
+
+    doc.build(elements)
+    buffer.seek(0)
+    if buffer.getbuffer().nbytes == 0:
+        raise Exception("Generated PDF is empty")
+    return buffer
+
+def report_etag(data):
+    """Content hash of the report input; the same stored rows give the same ETag"""
+    payload = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(f"{REPORT_LAYOUT_VERSION}:{payload}".encode()).hexdigest()[:32]
+
+class RenderedReportCache:
+    """In-memory LRU of rendered PDFs keyed by report_etag, bounded by total bytes"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, etag):
+        with self.lock:
+            pdf = self.entries.get(etag)
+            if pdf is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(etag)
+            self.hits += 1
+            return pdf
+
+    def put(self, etag, pdf):
+        if len(pdf) > self.max_bytes:
+            return
+        with self.lock:
+            if etag in self.entries:
+                return
+            self.entries[etag] = pdf
+            self.size += len(pdf)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0
+            }
+
+pdf_cache = RenderedReportCache(int(os.environ.get('REPORT_CACHE_MAX_BYTES', 64 * 1024 * 1024)))
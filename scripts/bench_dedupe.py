@@ -0,0 +1,66 @@
+"""
+Benchmark the sweep-and-prune pothole dedupe against the original O(n²) IoU loop.
+
+Usage (from the repo root):
+    python -m scripts.bench_dedupe
+    python -m scripts.bench_dedupe --sizes 1000 10000 100000 --naive-limit 20000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from utils.box_dedupe import calculate_iou, deduplicate_boxes
+
+
+def naive_deduplicate(boxes, iou_threshold=0.3):
+    """The nested loop process_video used before utils.box_dedupe"""
+    unique = []
+    for box in boxes:
+        if not any(calculate_iou(box, ex) > iou_threshold for ex in unique):
+            unique.append(box)
+    return unique
+
+
+def make_boxes(n, frame_w=1920, frame_h=1080, potholes=400, jitter=12, seed=0):
+    """Simulate video detections: each raw box is a jittered copy of one of `potholes` real ones"""
+    rng = np.random.default_rng(seed)
+    sizes = rng.integers(30, 160, size=(potholes, 2))
+    origins = rng.integers(0, [frame_w - 160, frame_h - 160], size=(potholes, 2))
+    picks = rng.integers(0, potholes, size=n)
+    offsets = rng.integers(-jitter, jitter + 1, size=(n, 2))
+    x1y1 = origins[picks] + offsets
+    x2y2 = x1y1 + sizes[picks]
+    return np.hstack([x1y1, x2y2]).astype(int).tolist()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--naive-limit', type=int, default=10000,
+                        help='skip the O(n²) loop above this many boxes')
+    parser.add_argument('--iou', type=float, default=0.3)
+    args = parser.parse_args()
+
+    print(f"{'boxes':>8} {'kept':>6} {'index (s)':>10} {'naive (s)':>10} {'speedup':>8}")
+    for n in args.sizes:
+        boxes = make_boxes(n)
+
+        start = time.perf_counter()
+        kept = deduplicate_boxes(boxes, args.iou)
+        index_time = time.perf_counter() - start
+
+        naive_time = None
+        if n <= args.naive_limit:
+            start = time.perf_counter()
+            naive_kept = naive_deduplicate(boxes, args.iou)
+            naive_time = time.perf_counter() - start
+            assert [boxes[i] for i in kept] == naive_kept, "indexed dedupe diverged from the naive loop"
+
+        naive_col = f"{naive_time:>10.3f}" if naive_time is not None else f"{'skipped':>10}"
+        speedup = f"{naive_time / index_time:>7.1f}x" if naive_time else f"{'-':>8}"
+        print(f"{n:>8} {len(kept):>6} {index_time:>10.3f} {naive_col} {speedup}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Measure image throughput and latency under concurrent load, with and without micro-batching.
+
+A fixed number of client threads each send images through calculate_pothole_dimensions,
+first straight to the estimator (one predict per image) and then through a MicroBatcher
+for every --batch-size/--wait-ms pair. Reports images/s, p50/p99 request latency and
+the mean batch size the batcher actually formed.
+
+Usage (from the repo root):
+    python -m scripts.bench_micro_batching --images data/val/images --clients 8
+    python -m scripts.bench_micro_batching --images ... --batch-sizes 4 8 16 --wait-ms 2 5 10
+"""
+import argparse
+import glob
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from utils.depth_estimation import PotholeDepthEstimator
+from utils.micro_batcher import MicroBatcher
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+
+def run_load(estimator, images, clients, requests):
+    """(images per second, per-request latencies in ms) for `requests` calls from `clients` threads"""
+    def one(i):
+        start = time.perf_counter()
+        estimator.calculate_pothole_dimensions(images[i % len(images)], tile_size=0)
+        return 1000 * (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        latencies = list(executor.map(one, range(requests)))
+    return requests / (time.perf_counter() - start), np.array(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', required=True)
+    parser.add_argument('--model', default=None, help='weights to load (default: MODEL_BACKEND location)')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[4, 8])
+    parser.add_argument('--wait-ms', type=float, nargs='+', default=[2, 5, 10])
+    args = parser.parse_args()
+
+    paths = sorted(p for p in glob.glob(os.path.join(args.images, '*'))
+                   if p.lower().endswith(IMAGE_EXTENSIONS))
+    if not paths:
+        parser.error(f"no images found in {args.images}")
+    images = [cv2.imread(p) for p in paths]
+
+    estimator = PotholeDepthEstimator(args.model, tile_size=0)
+    estimator.warm_up()
+
+    print(f"{len(images)} images, {args.clients} clients, {args.requests} requests")
+    print(f"{'batch':>6} {'wait ms':>8} {'images/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'mean batch':>11}")
+    rate, latencies = run_load(estimator, images, args.clients, args.requests)
+    print(f"{'off':>6} {'-':>8} {rate:>9.1f} {np.percentile(latencies, 50):>8.1f} "
+          f"{np.percentile(latencies, 99):>8.1f} {1:>11.2f}")
+
+    for batch_size in args.batch_sizes:
+        for wait_ms in args.wait_ms:
+            batcher = MicroBatcher(estimator, batch_size, wait_ms)
+            rate, latencies = run_load(batcher, images, args.clients, args.requests)
+            print(f"{batch_size:>6} {wait_ms:>8.1f} {rate:>9.1f} {np.percentile(latencies, 50):>8.1f} "
+                  f"{np.percentile(latencies, 99):>8.1f} {batcher.stats()['mean_batch_size']:>11.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Compare whole-image and sliced (tiled) inference on labelled high-resolution images.
+
+Labels are YOLO txt files (class cx cy w h, normalised) with the same stem as
+the image. Reports mean latency per image and recall at IoU >= --match-iou for
+each tile configuration; tile size 0 is the plain whole-image pass.
+
+Usage (from the repo root):
+    python -m scripts.bench_sliced_inference --images data/val/images --labels data/val/labels
+    python -m scripts.bench_sliced_inference --images ... --labels ... --tiles 0 640 960 --imgsz 320
+"""
+import argparse
+import glob
+import os
+import time
+
+import cv2
+import numpy as np
+
+from utils.box_dedupe import matrix_iou
+from utils.depth_estimation import PotholeDepthEstimator
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+
+def load_labels(label_path, width, height):
+    """YOLO label file → (n, 4) xyxy array in pixels"""
+    if not os.path.exists(label_path):
+        return np.empty((0, 4))
+    rows = np.loadtxt(label_path, ndmin=2)
+    if rows.size == 0:
+        return np.empty((0, 4))
+    cx, cy = rows[:, 1] * width, rows[:, 2] * height
+    w, h = rows[:, 3] * width, rows[:, 4] * height
+    return np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+
+
+def matched(truth, predicted, match_iou):
+    """Number of ground-truth boxes matched one-to-one by a prediction"""
+    if len(truth) == 0 or len(predicted) == 0:
+        return 0
+    iou = matrix_iou(truth, predicted)
+    hits = 0
+    used = set()
+    for t in np.argsort(-iou.max(axis=1)):
+        for p in np.argsort(-iou[t]):
+            if iou[t, p] < match_iou:
+                break
+            if p not in used:
+                used.add(p)
+                hits += 1
+                break
+    return hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', required=True)
+    parser.add_argument('--labels', required=True)
+    parser.add_argument('--model', default=None, help='weights to load (default: MODEL_BACKEND location)')
+    parser.add_argument('--tiles', type=int, nargs='+', default=[0, 640, 1024])
+    parser.add_argument('--overlap', type=float, default=0.2)
+    parser.add_argument('--imgsz', type=int, default=None, help='model input size (default: model default)')
+    parser.add_argument('--match-iou', type=float, default=0.5)
+    args = parser.parse_args()
+
+    paths = sorted(p for p in glob.glob(os.path.join(args.images, '*'))
+                   if p.lower().endswith(IMAGE_EXTENSIONS))
+    if not paths:
+        parser.error(f"no images found in {args.images}")
+
+    estimator = PotholeDepthEstimator(args.model, imgsz=args.imgsz)
+    images = []
+    for path in paths:
+        image = cv2.imread(path)
+        stem = os.path.splitext(os.path.basename(path))[0]
+        truth = load_labels(os.path.join(args.labels, f"{stem}.txt"), image.shape[1], image.shape[0])
+        images.append((image, truth))
+    total_truth = sum(len(t) for _, t in images)
+
+    # First call pays for model warm-up; keep it out of the timings
+    estimator.detect_boxes(images[0][0], tile_size=0)
+
+    print(f"{len(images)} images, {total_truth} labelled potholes, imgsz={args.imgsz or 'default'}")
+    print(f"{'tile':>6} {'overlap':>8} {'ms/image':>10} {'detections':>11} {'recall':>8}")
+    for tile in args.tiles:
+        elapsed = 0.0
+        detections = 0
+        hits = 0
+        for image, truth in images:
+            start = time.perf_counter()
+            boxes, _, _ = estimator.detect_boxes(image, tile_size=tile, tile_overlap=args.overlap)
+            elapsed += time.perf_counter() - start
+            detections += len(boxes)
+            hits += matched(truth, boxes, args.match_iou)
+
+        recall = hits / total_truth if total_truth else 0.0
+        label = tile if tile else 'full'
+        print(f"{label:>6} {args.overlap:>8.2f} {1000 * elapsed / len(images):>10.1f} "
+              f"{detections:>11} {recall:>8.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,382 @@
+"""
+Analyse a directory tree of archived survey images and videos straight into the database.
+
+No Flask, HTTP, temp copies or Cloudinary: files are read in place by a pool of
+worker processes (one PotholeDepthEstimator each), costed with CostEstimator
+and written with the models.py unit of work, --commit-size analyses per
+transaction. The file's absolute path is stored as its original URL; with
+--annotated-dir an annotated image (or a video's busiest frame) is written
+there and stored as the processed URL.
+
+Progress is appended to a JSONL checkpoint in two phases: files about to be
+committed are recorded as pending before the commit and as stored after it.
+A crashed or interrupted run picks up where it stopped: files already recorded
+(same path, size and mtime) are skipped, and a pending file is skipped only if
+the database already holds its analysis, so a crash between the commit and the
+checkpoint write never stores a file twice. Files that failed are retried only
+with --retry-failed. A throughput report (files/s, frames/s) is printed at the end.
+
+Usage (from the repo root, DATABASE_URL set):
+    python -m scripts.bulk_process /data/survey-2023 --workers 4 --city Pune
+    python -m scripts.bulk_process /data/survey-2023 --manifest locations.csv --frame-stride 5 \\
+        --annotated-dir /data/annotated --checkpoint survey-2023.jsonl
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from database import db
+from models import AnalysisBatch, AnalysisUnitOfWork
+from utils.batch_ingest import LOCATION_FIELDS, manifest_entry, read_manifest
+from utils.cost_estimation import CostEstimator, CostParameters
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+
+# Per-process estimator and options, set by _init_worker
+_worker_estimator = None
+_worker_options = None
+
+
+def _init_worker(model_path, torch_threads, options):
+    global _worker_estimator, _worker_options
+
+    os.environ['OMP_NUM_THREADS'] = str(torch_threads)
+    os.environ['MKL_NUM_THREADS'] = str(torch_threads)
+    import torch
+    torch.set_num_threads(torch_threads)
+    torch.set_num_interop_threads(1)
+
+    from utils.depth_estimation import PotholeDepthEstimator
+    _worker_estimator = PotholeDepthEstimator(model_path, tile_size=options['tile_size'],
+                                              tile_overlap=options['tile_overlap'])
+    _worker_estimator.warm_up()
+    _worker_options = options
+
+
+def _analyse_image(path):
+    import cv2
+
+    image = cv2.imread(path)
+    if image is None:
+        raise ValueError('could not decode image')
+    columns = _worker_estimator.detect_columns(image, min_confidence=_worker_options['min_confidence'],
+                                               max_detections=_worker_options['max_detections'])
+    annotated = _worker_estimator.annotate(image, columns) if len(columns) else None
+    return columns.to_dicts(), annotated, {'frames_decoded': 1, 'frames_inferred': 1}
+
+
+def _analyse_video(path):
+    import cv2
+    from utils.frame_sampling import FrameSampler
+    from utils.pothole_tracker import PotholeTracker
+    from utils.video_pipeline import SummaryFrameKeeper, VideoPipeline
+
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError('could not open video')
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        sampler = FrameSampler(stride=_worker_options['frame_stride'], target_fps=_worker_options['target_fps'],
+                               source_fps=fps, scene_threshold=_worker_options['scene_threshold'])
+        # Same tracking settings as the upload route
+        tracker = PotholeTracker(iou_threshold=0.3, max_age=max(int(fps or 30), 3 * sampler.stride),
+                                 min_hits=_worker_options['track_min_hits'])
+        keeper = SummaryFrameKeeper()
+
+        def on_frame(index, frame, columns):
+            keeper.offer(index, frame, columns)
+            tracker.update(columns, index)
+
+        pipeline = VideoPipeline(cap, _worker_estimator, sampler, batch_size=_worker_options['video_batch_size'],
+                                 detector_options={'min_confidence': _worker_options['min_confidence'],
+                                                   'max_detections': _worker_options['max_detections']})
+        stats = pipeline.run(on_frame)
+    finally:
+        cap.release()
+
+    annotated = None
+    if keeper.frame is not None and len(keeper.potholes):
+        annotated = _worker_estimator.annotate(keeper.frame, keeper.potholes)
+    return tracker.aggregated_potholes(), annotated, stats
+
+
+def analyse_file(path, file_type, annotated_path):
+    """Worker task: detect and measure one file; returns a picklable result dict"""
+    started = time.perf_counter()
+    try:
+        potholes, annotated, stats = _analyse_image(path) if file_type == 'image' else _analyse_video(path)
+        if annotated is not None and annotated_path:
+            import cv2
+            os.makedirs(os.path.dirname(annotated_path), exist_ok=True)
+            cv2.imwrite(annotated_path, annotated)
+        else:
+            annotated_path = None
+        return {'success': True, 'potholes': potholes, 'annotated_path': annotated_path,
+                'elapsed': time.perf_counter() - started, **stats}
+    except Exception as e:
+        return {'success': False, 'error': str(e), 'elapsed': time.perf_counter() - started,
+                'frames_decoded': 0, 'frames_inferred': 0}
+
+
+def file_key(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def discover(root):
+    """(relative path, absolute path, file type) of every supported file, in a stable order"""
+    for directory, dirs, names in os.walk(root):
+        dirs.sort()
+        for name in sorted(names):
+            lower = name.lower()
+            if name.startswith('.'):
+                continue
+            if lower.endswith(IMAGE_EXTENSIONS):
+                file_type = 'image'
+            elif lower.endswith(VIDEO_EXTENSIONS):
+                file_type = 'video'
+            else:
+                continue
+            path = os.path.join(directory, name)
+            yield os.path.relpath(path, root).replace(os.sep, '/'), os.path.abspath(path), file_type
+
+
+def load_checkpoint(path):
+    """{relative path: last record} from an existing checkpoint file"""
+    done = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue    # a line cut short by a crash
+                done[record['path']] = record
+    return done
+
+
+class Checkpoint:
+    def __init__(self, path):
+        self.file = open(path, 'a')
+
+    def record(self, records):
+        for record in records:
+            self.file.write(json.dumps(record) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('root')
+    parser.add_argument('--model', default=None, help='weights to load (default: MODEL_BACKEND location)')
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 1) // 2))
+    parser.add_argument('--torch-threads', type=int, default=None, help='per worker (default: cores / workers)')
+    parser.add_argument('--checkpoint', default='bulk_checkpoint.jsonl')
+    parser.add_argument('--retry-failed', action='store_true')
+    parser.add_argument('--commit-size', type=int, default=100)
+    parser.add_argument('--annotated-dir', default=None)
+    parser.add_argument('--manifest', default=None, help='CSV/JSON of per-file locations, keyed by relative path or filename')
+    for field in LOCATION_FIELDS:
+        parser.add_argument(f"--{field.replace('_', '-')}", dest=field, default='')
+    parser.add_argument('--material-cost', type=float, default=40.0)
+    parser.add_argument('--labor-cost', type=float, default=300.0)
+    parser.add_argument('--team-size', type=int, default=2)
+    parser.add_argument('--overhead', type=float, default=15.0)
+    parser.add_argument('--min-confidence', type=float, default=float(os.getenv('MIN_CONFIDENCE', 0.25)))
+    parser.add_argument('--max-detections', type=int, default=int(os.getenv('MAX_DETECTIONS', 100)))
+    parser.add_argument('--tile-size', type=int, default=int(os.getenv('TILE_SIZE', 0)))
+    parser.add_argument('--tile-overlap', type=float, default=float(os.getenv('TILE_OVERLAP', 0.2)))
+    parser.add_argument('--frame-stride', type=int, default=1)
+    parser.add_argument('--target-fps', type=float, default=None)
+    parser.add_argument('--scene-threshold', type=float, default=0.0)
+    parser.add_argument('--track-min-hits', type=int, default=int(os.getenv('TRACK_MIN_HITS', 2)))
+    parser.add_argument('--video-batch-size', type=int, default=int(os.getenv('VIDEO_BATCH_SIZE', 8)))
+    args = parser.parse_args()
+
+    root = os.path.abspath(args.root)
+    if not os.path.isdir(root):
+        parser.error(f"{args.root} is not a directory")
+
+    manifest = {}
+    if args.manifest:
+        with open(args.manifest, 'rb') as f:
+            manifest = read_manifest(f.read(), args.manifest)
+    default_location = {field: getattr(args, field) for field in LOCATION_FIELDS}
+    cost_params = CostParameters(args.material_cost, args.labor_cost, args.team_size, args.overhead)
+    cost_estimator = CostEstimator()
+
+    done = load_checkpoint(args.checkpoint)
+    todo, pending, skipped = [], [], 0
+    for relative, path, file_type in discover(root):
+        size, mtime = file_key(path)
+        item = (relative, path, file_type, size, mtime)
+        record = done.get(relative)
+        if not record or record.get('size') != size or record.get('mtime') != mtime:
+            todo.append(item)
+        elif record['status'] == 'pending':
+            pending.append((item, record))
+        elif args.retry_failed and record['status'] == 'failed':
+            todo.append(item)
+        else:
+            skipped += 1
+
+    checkpoint = Checkpoint(args.checkpoint)
+    if pending:
+        # The last run stopped between writing these as pending and recording the commit's outcome
+        stored = AnalysisBatch.stored_files([item[1] for item, _ in pending])
+        reconciled = []
+        for item, record in pending:
+            analysis_id = stored.get((item[1], item[3]))
+            if analysis_id:
+                reconciled.append(dict(record, status='stored', analysis_id=analysis_id))
+            else:
+                todo.append(item)
+        checkpoint.record(reconciled)
+        skipped += len(reconciled)
+        print(f"{len(pending)} files pending from the last run, {len(reconciled)} of them already stored")
+
+    print(f"{len(todo)} files to analyse, {skipped} already in {args.checkpoint}")
+    if not todo:
+        checkpoint.close()
+        db.close()
+        return
+
+    options = {
+        'min_confidence': args.min_confidence, 'max_detections': args.max_detections,
+        'tile_size': args.tile_size, 'tile_overlap': args.tile_overlap,
+        'frame_stride': args.frame_stride, 'target_fps': args.target_fps,
+        'scene_threshold': args.scene_threshold, 'track_min_hits': args.track_min_hits,
+        'video_batch_size': args.video_batch_size
+    }
+    torch_threads = args.torch_threads or max(1, (os.cpu_count() or 1) // args.workers)
+
+    totals = {'image': 0, 'video': 0, 'stored': 0, 'empty': 0, 'failed': 0, 'bytes': 0,
+              'frames_decoded': 0, 'frames_inferred': 0, 'potholes': 0, 'total_cost': 0.0}
+    db_seconds = 0.0
+    analysis_batch = AnalysisBatch()
+    pending_records = []    # (checkpoint record, unit of work) waiting for the next commit
+
+    def flush():
+        nonlocal db_seconds
+        # Pending first: a crash after the commit leaves a record that resume checks against the database
+        checkpoint.record([dict(record, status='pending') for record, _ in pending_records])
+        started = time.perf_counter()
+        analysis_batch.flush()
+        db_seconds += time.perf_counter() - started
+        records = []
+        for record, unit in pending_records:
+            if unit.analysis_id:
+                record.update(status='stored', analysis_id=unit.analysis_id)
+                totals['stored'] += 1
+            else:
+                record.update(status='failed', error='database write failed')
+                totals['failed'] += 1
+            records.append(record)
+        pending_records.clear()
+        checkpoint.record(records)
+
+    def collect(item, result):
+        relative, path, file_type, size, mtime = item
+        record = {'path': relative, 'size': size, 'mtime': mtime, 'file_type': file_type}
+        totals[file_type] += 1
+        totals['bytes'] += size
+        totals['frames_decoded'] += result['frames_decoded']
+        totals['frames_inferred'] += result['frames_inferred']
+
+        if not result['success']:
+            print(f"❌ {relative}: {result['error']}")
+            totals['failed'] += 1
+            checkpoint.record([dict(record, status='failed', error=result['error'])])
+            return
+        potholes = result['potholes']
+        if not potholes:
+            totals['empty'] += 1
+            checkpoint.record([dict(record, status='empty')])
+            return
+
+        cost_breakdown = cost_estimator.calculate_repair_cost(potholes, params=cost_params)
+        location_data = dict(default_location, **manifest_entry(manifest, relative))
+        media_data = {
+            'original_filename': os.path.basename(path),
+            'file_type': file_type,
+            'original_file_url': path,
+            'processed_file_url': result['annotated_path'],
+            'file_size': size
+        }
+        unit = analysis_batch.add(AnalysisUnitOfWork.from_results(location_data, media_data, potholes,
+                                                                  cost_breakdown, cost_params))
+        pending_records.append((dict(record, potholes=len(potholes),
+                                     total_cost=cost_breakdown['total_cost']), unit))
+        totals['potholes'] += len(potholes)
+        totals['total_cost'] += cost_breakdown['total_cost']
+        if len(pending_records) >= args.commit_size:
+            flush()
+
+    started = time.perf_counter()
+    executor = ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=_init_worker, initargs=(args.model, torch_threads, options))
+    try:
+        # Keep a couple of files per worker in flight so the file list never sits in the pool queue
+        queue = iter(todo)
+        in_flight = {}
+        finished = 0
+
+        def submit_next():
+            item = next(queue, None)
+            if item is None:
+                return False
+            annotated_path = None
+            if args.annotated_dir:
+                annotated_path = os.path.join(args.annotated_dir, os.path.splitext(item[0])[0] + '_annotated.jpg')
+            in_flight[executor.submit(analyse_file, item[1], item[2], annotated_path)] = item
+            return True
+
+        for _ in range(2 * args.workers):
+            if not submit_next():
+                break
+        while in_flight:
+            completed, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in completed:
+                collect(in_flight.pop(future), future.result())
+                finished += 1
+                submit_next()
+            if finished % 50 == 0 or not in_flight:
+                elapsed = time.perf_counter() - started
+                print(f"{finished}/{len(todo)} files, {finished / elapsed:.2f} files/s")
+        flush()
+    except KeyboardInterrupt:
+        print("⚠️ Interrupted; committing finished files before exit")
+        executor.shutdown(wait=False, cancel_futures=True)
+        flush()
+        raise
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        checkpoint.close()
+        db.close()
+
+    elapsed = time.perf_counter() - started
+    processed = totals['image'] + totals['video']
+    print()
+    print(f"files:          {processed} ({totals['image']} images, {totals['video']} videos) in {elapsed:.1f}s")
+    print(f"stored:         {totals['stored']}   no potholes: {totals['empty']}   failed: {totals['failed']}")
+    print(f"files/s:        {processed / elapsed:.2f}")
+    print(f"MB/s:           {totals['bytes'] / elapsed / 1e6:.1f}")
+    print(f"frames decoded: {totals['frames_decoded']} ({totals['frames_decoded'] / elapsed:.1f} frames/s)")
+    print(f"frames inferred:{totals['frames_inferred']:>7} ({totals['frames_inferred'] / elapsed:.1f} frames/s)")
+    print(f"potholes:       {totals['potholes']}   total cost: {totals['total_cost']:.2f}")
+    print(f"database:       {db_seconds:.1f}s in bulk commits of up to {args.commit_size}")
+
+
+if __name__ == '__main__':
+    main()
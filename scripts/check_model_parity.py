@@ -0,0 +1,115 @@
+"""
+Check an exported model backend against the PyTorch weights on a folder of images.
+
+For every image both estimators run detect_boxes; boxes are matched one-to-one
+by IoU and the script reports per-backend latency, detection counts, recall
+(share of reference boxes reproduced), precision (share of candidate boxes that
+match a reference box, so extra false positives count against it), F1, the mean
+IoU of matched pairs and the pothole volume drift that reaches the cost
+estimate. Exits non-zero when recall is below --min-agreement or precision is
+below --min-precision, so it can gate a deploy.
+
+Usage (from the repo root):
+    python -m scripts.check_model_parity --images data/val/images --backend onnx
+    python -m scripts.check_model_parity --images data/val/images --candidate models/best_int8_openvino_model
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from utils.box_dedupe import matrix_iou
+from utils.depth_estimation import MODEL_BACKENDS, PotholeDepthEstimator
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+
+def match_pairs(reference, candidate, match_iou):
+    """Greedy one-to-one matching; returns the IoU of each matched pair"""
+    if len(reference) == 0 or len(candidate) == 0:
+        return []
+    iou = matrix_iou(reference, candidate)
+    pairs = []
+    while iou.size and iou.max() >= match_iou:
+        r, c = np.unravel_index(np.argmax(iou), iou.shape)
+        pairs.append(float(iou[r, c]))
+        iou[r, :] = -1
+        iou[:, c] = -1
+    return pairs
+
+
+def timed_run(estimator, images):
+    boxes, elapsed = [], 0.0
+    estimator.detect_boxes(images[0])   # warm-up
+    for image in images:
+        start = time.perf_counter()
+        b, _, _ = estimator.detect_boxes(image)
+        elapsed += time.perf_counter() - start
+        boxes.append(b)
+    return boxes, 1000 * elapsed / len(images)
+
+
+def total_volume(estimator, images):
+    return sum(p['volume_liters'] for image in images
+               for p in estimator.calculate_pothole_dimensions(image)[0])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', required=True)
+    parser.add_argument('--reference', default=MODEL_BACKENDS['pytorch'])
+    parser.add_argument('--backend', default='onnx', choices=[b for b in MODEL_BACKENDS if b != 'pytorch'])
+    parser.add_argument('--candidate', default=None, help='exported model path (default: --backend location)')
+    parser.add_argument('--match-iou', type=float, default=0.5)
+    parser.add_argument('--min-agreement', type=float, default=0.95, help='minimum recall')
+    parser.add_argument('--min-precision', type=float, default=0.95)
+    args = parser.parse_args()
+
+    paths = sorted(p for p in glob.glob(os.path.join(args.images, '*'))
+                   if p.lower().endswith(IMAGE_EXTENSIONS))
+    if not paths:
+        parser.error(f"no images found in {args.images}")
+    images = [cv2.imread(p) for p in paths]
+
+    candidate_path = args.candidate or MODEL_BACKENDS[args.backend]
+    reference = PotholeDepthEstimator(args.reference, tile_size=0)
+    candidate = PotholeDepthEstimator(candidate_path, tile_size=0)
+
+    ref_boxes, ref_ms = timed_run(reference, images)
+    cand_boxes, cand_ms = timed_run(candidate, images)
+
+    ref_total = sum(len(b) for b in ref_boxes)
+    cand_total = sum(len(b) for b in cand_boxes)
+    ious = [iou for r, c in zip(ref_boxes, cand_boxes) for iou in match_pairs(r, c, args.match_iou)]
+    agreement = len(ious) / ref_total if ref_total else 1.0
+    precision = len(ious) / cand_total if cand_total else 1.0
+    f1 = 2 * agreement * precision / (agreement + precision) if agreement + precision else 0.0
+    ref_volume = total_volume(reference, images)
+    cand_volume = total_volume(candidate, images)
+
+    print(f"{len(images)} images")
+    print(f"{'model':<40} {'ms/image':>10} {'detections':>11}")
+    print(f"{args.reference:<40} {ref_ms:>10.1f} {ref_total:>11}")
+    print(f"{candidate_path:<40} {cand_ms:>10.1f} {cand_total:>11}")
+    print(f"speedup:          {ref_ms / cand_ms:.2f}x")
+    print(f"recall:           {agreement:.3f} (IoU >= {args.match_iou})")
+    print(f"precision:        {precision:.3f}")
+    print(f"F1:               {f1:.3f}")
+    print(f"mean matched IoU: {np.mean(ious) if ious else 0.0:.3f}")
+    print(f"volume drift:     {cand_volume - ref_volume:+.1f} L of {ref_volume:.1f} L")
+
+    if agreement < args.min_agreement:
+        print(f"❌ Recall below {args.min_agreement}")
+        sys.exit(1)
+    if precision < args.min_precision:
+        print(f"❌ Precision below {args.min_precision}: the exported model adds boxes")
+        sys.exit(1)
+    print("✅ Exported model matches the PyTorch model")
+
+
+if __name__ == '__main__':
+    main()
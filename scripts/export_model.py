@@ -0,0 +1,64 @@
+"""
+Export models/best.pt to an optimized CPU inference format.
+
+The exported model is written next to the weights, at the location
+MODEL_BACKEND=<backend> loads by default (see utils.depth_estimation.MODEL_BACKENDS).
+openvino-int8 needs a dataset yaml for post-training quantization calibration.
+
+Usage (from the repo root):
+    python -m scripts.export_model --backend onnx
+    python -m scripts.export_model --backend openvino
+    python -m scripts.export_model --backend openvino-int8 --data data/potholes.yaml
+
+Then check it against the .pt model with scripts.check_model_parity and start
+the app with MODEL_BACKEND set.
+"""
+import argparse
+import os
+import shutil
+import time
+
+from ultralytics import YOLO
+
+from utils.depth_estimation import MODEL_BACKENDS
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', required=True, choices=[b for b in MODEL_BACKENDS if b != 'pytorch'])
+    parser.add_argument('--weights', default=MODEL_BACKENDS['pytorch'])
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--data', default=None, help='dataset yaml used to calibrate int8 quantization')
+    args = parser.parse_args()
+
+    if args.backend == 'openvino-int8' and not args.data:
+        parser.error("--data is required for openvino-int8")
+
+    options = {'imgsz': args.imgsz}
+    if args.backend == 'onnx':
+        # dynamic axes so the video pipeline can send batches of frames
+        options.update(format='onnx', dynamic=True, simplify=True)
+    else:
+        options.update(format='openvino', dynamic=True)
+        if args.backend == 'openvino-int8':
+            options.update(int8=True, data=args.data)
+
+    start = time.perf_counter()
+    exported = YOLO(args.weights).export(**options)
+    elapsed = time.perf_counter() - start
+
+    # Ultralytics names the output after the weights; move it to where MODEL_BACKEND looks
+    target = MODEL_BACKENDS[args.backend]
+    if os.path.abspath(str(exported)) != os.path.abspath(target):
+        if os.path.isdir(target):
+            shutil.rmtree(target)
+        elif os.path.exists(target):
+            os.remove(target)
+        shutil.move(str(exported), target)
+
+    print(f"✅ Exported {args.weights} → {target} ({args.backend}, imgsz={args.imgsz}) in {elapsed:.1f}s")
+    print(f"   Start the app with MODEL_BACKEND={args.backend}")
+
+
+if __name__ == '__main__':
+    main()
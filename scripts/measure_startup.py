@@ -0,0 +1,101 @@
+"""
+Measure application startup time.
+
+Default mode imports app.py in a fresh interpreter (so nothing is cached in
+sys.modules), then runs warm_up_services() and reports each stage: import,
+model load, dummy inference, database pool/schema and storage.
+
+With --command the server is started as given and /healthz and /readyz are
+polled; this is the number that matters for deploy health checks.
+
+Usage (from the repo root):
+    python -m scripts.measure_startup --runs 3
+    python -m scripts.measure_startup --command "gunicorn --workers 1 --threads 4 --bind 127.0.0.1:8000 app:app" \\
+        --url http://127.0.0.1:8000
+"""
+import argparse
+import json
+import os
+import shlex
+import subprocess
+import sys
+import time
+import urllib.request
+
+PROBE = """
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter() - start
+app.warm_up_services()
+print(json.dumps({'import': round(imported, 3), **app.startup_state['timings'],
+                  'ready': app.startup_state['ready'], 'error': app.startup_state['error']}))
+"""
+
+
+def measure_in_process(runs):
+    env = dict(os.environ, WARM_UP_ON_START='0')
+    rows = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', PROBE], env=env, capture_output=True, text=True)
+        if out.returncode != 0:
+            print(out.stderr)
+            sys.exit(out.returncode)
+        rows.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    stages = [k for k in rows[0] if k not in ('ready', 'error')]
+    print(f"{'stage':<16}" + ''.join(f"{'run ' + str(i + 1):>10}" for i in range(runs)))
+    for stage in stages:
+        print(f"{stage:<16}" + ''.join(f"{row.get(stage, 0):>10.3f}" for row in rows))
+    totals = [sum(row.get(stage, 0) for stage in stages) for row in rows]
+    print(f"{'total':<16}" + ''.join(f"{t:>10.3f}" for t in totals))
+    for row in rows:
+        if not row['ready']:
+            print(f"⚠️ Warm-up did not finish: {row['error']}")
+
+
+def wait_for(url, timeout):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return True
+        except Exception:
+            pass
+        time.sleep(0.1)
+    return False
+
+
+def measure_server(command, url, timeout):
+    start = time.perf_counter()
+    server = subprocess.Popen(shlex.split(command))
+    try:
+        healthy = wait_for(f"{url}/healthz", timeout)
+        healthy_at = time.perf_counter() - start
+        ready = healthy and wait_for(f"{url}/readyz", timeout)
+        ready_at = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(f"/healthz 200 after {healthy_at:.2f}s" if healthy else f"/healthz not up within {timeout}s")
+    print(f"/readyz  200 after {ready_at:.2f}s" if ready else f"/readyz not ready within {timeout}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=1)
+    parser.add_argument('--command', default=None, help='server command to start and poll')
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--timeout', type=float, default=120)
+    args = parser.parse_args()
+
+    if args.command:
+        measure_server(args.command, args.url.rstrip('/'), args.timeout)
+    else:
+        measure_in_process(args.runs)
+
+
+if __name__ == '__main__':
+    main()
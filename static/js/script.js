@@ -235,8 +235,7 @@ document.getElementById('uploadForm').addEventListener('submit', async function(
     document.getElementById('loadingText').textContent = 
         `Processing ${fileType} for comprehensive road analysis...`;
     
-    // Simulate progress for better UX
-    simulateProgress();
+    resetProgress();
     
     try {
         const response = await fetch('/upload', {
@@ -244,7 +243,14 @@ document.getElementById('uploadForm').addEventListener('submit', async function(
             body: formData
         });
         
-        const data = await response.json();
+        const queued = await response.json();
+        if (!queued.success) {
+            displayError(queued.error);
+            return;
+        }
+        
+        // Poll the job until the worker finishes
+        const data = await waitForJob(queued.job_id);
         
         if (data.success) {
             currentResultsData = data; // Store for PDF export
@@ -260,30 +266,60 @@ document.getElementById('uploadForm').addEventListener('submit', async function(
     }
 });
 
-function simulateProgress() {
+const JOB_POLL_INTERVAL_MS = 1000;
+
+const JOB_STAGE_LABELS = {
+    'queued': 'Waiting for a free worker...',
+    'detecting': 'Detecting potholes',
+    'cached': 'Reusing previous detections...',
+    'running': 'Processing...'
+};
+
+function resetProgress() {
+    updateProgress(0, 'Processing');
+}
+
+function updateProgress(percent, label) {
     const progressFill = document.getElementById('progressFill');
     const progressPercentage = document.querySelector('.progress-percentage');
-    let progress = 0;
+    const progressText = document.querySelector('.progress-text');
     
-    const interval = setInterval(() => {
-        progress += Math.random() * 10;
-        if (progress > 90) {
-            progress = 90; // Hold at 90% until actual completion
+    progressFill.style.width = percent + '%';
+    progressPercentage.textContent = Math.floor(percent) + '%';
+    if (progressText && label) {
+        progressText.textContent = label;
+    }
+}
+
+async function waitForJob(jobId) {
+    while (true) {
+        const response = await fetch(`/jobs/${jobId}/progress`);
+        const progress = await response.json();
+        if (!progress.success) {
+            throw new Error(progress.error || 'Lost track of analysis job');
         }
-        progressFill.style.width = progress + '%';
-        progressPercentage.textContent = Math.floor(progress) + '%';
-    }, 200);
-    
-    // Store interval ID to clear later
-    window.progressInterval = interval;
+        
+        let label = JOB_STAGE_LABELS[progress.stage] || 'Processing';
+        if (progress.stage === 'detecting' && progress.total_frames > 1) {
+            label += ` (${progress.frames_processed}/${progress.total_frames} frames)`;
+        }
+        updateProgress(progress.percent, label);
+        
+        if (progress.status === 'done' || progress.status === 'failed') {
+            const jobResponse = await fetch(`/jobs/${jobId}`);
+            const jobData = await jobResponse.json();
+            if (!jobData.success) {
+                throw new Error(jobData.error || 'Could not fetch analysis result');
+            }
+            const job = jobData.job;
+            return job.result || { success: false, error: job.error || 'Analysis failed' };
+        }
+        
+        await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+    }
 }
 
 function displayResults(data) {
-    // Clear progress simulation
-    if (window.progressInterval) {
-        clearInterval(window.progressInterval);
-    }
-    
     const resultsDiv = document.getElementById('results');
     const errorDiv = document.getElementById('error');
     
@@ -334,7 +370,7 @@ function displayResults(data) {
                     <i class="fas fa-film"></i>
                 </div>
                 <span class="stat-number">${data.total_frames_analyzed}</span>
-                <span class="stat-label">Frames Analyzed</span>
+                <span class="stat-label">Frames Analyzed${data.frames_decoded ? ` of ${data.frames_decoded}` : ''}</span>
             </div>
         `;
     }
@@ -515,11 +551,6 @@ function displayResults(data) {
 }
 
 function displayError(message) {
-    // Clear progress simulation
-    if (window.progressInterval) {
-        clearInterval(window.progressInterval);
-    }
-    
     const errorDiv = document.getElementById('error');
     errorDiv.innerHTML = `
         <div class="error-icon">
@@ -564,14 +595,18 @@ function exportReport(event) {
     
     console.log('Starting PDF generation with data:', currentResultsData);
     
-    // Send request to generate PDF
-    fetch('/generate_report', {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/json',
-        },
-        body: JSON.stringify(currentResultsData)
-    })
+    // Stored analyses are rendered server-side from the database (full pothole list);
+    // otherwise send the results back to generate the PDF
+    const reportRequest = currentResultsData.analysis_id
+        ? fetch(`/reports/${currentResultsData.analysis_id}`)
+        : fetch('/generate_report', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify(currentResultsData)
+        });
+    reportRequest
     .then(response => {
         console.log('Response status:', response.status);
         if (!response.ok) {
@@ -0,0 +1,82 @@
+import csv
+import io
+import json
+import os
+import posixpath
+import zipfile
+
+# Files with these names (in any folder of an archive) are read as the location manifest
+MANIFEST_NAMES = ('manifest.json', 'manifest.csv')
+LOCATION_FIELDS = ('location_name', 'latitude', 'longitude', 'city', 'additional_notes')
+
+
+def read_manifest(data, filename):
+    """
+    Per-file locations from a manifest: CSV with a filename column plus any of
+    LOCATION_FIELDS, or JSON as a list of such objects or a {filename: {...}} map.
+    Returns {filename: {field: value}}.
+    """
+    text = data.decode('utf-8-sig') if isinstance(data, bytes) else data
+    if filename.lower().endswith('.csv'):
+        rows = list(csv.DictReader(io.StringIO(text)))
+    else:
+        parsed = json.loads(text)
+        if isinstance(parsed, dict):
+            rows = [dict(fields, filename=name) for name, fields in parsed.items()]
+        else:
+            rows = parsed
+
+    manifest = {}
+    for row in rows:
+        row = {str(k).strip(): v for k, v in row.items() if k is not None}
+        if not row.get('filename'):
+            raise ValueError("every manifest entry needs a filename")
+        manifest[row['filename'].strip()] = {field: str(row[field]).strip()
+                                             for field in LOCATION_FIELDS if row.get(field) not in (None, '')}
+    return manifest
+
+
+def manifest_entry(manifest, name):
+    """Manifest fields for a file, matched by its path in the archive and then by bare filename"""
+    return manifest.get(name) or manifest.get(posixpath.basename(name)) or {}
+
+
+def extract_archive(archive_path, dest_dir, allowed_extensions, max_files, max_bytes, prefix=''):
+    """
+    Extract the supported media of a ZIP into dest_dir under generated names
+    (archive paths are never used on disk). Returns ([(archive name, path)], manifest,
+    bytes written). Raises ValueError when the archive holds more than max_files
+    media files or more than max_bytes uncompressed.
+    """
+    items = []
+    manifest = {}
+    extracted = 0
+    with zipfile.ZipFile(archive_path) as archive:
+        for info in archive.infolist():
+            name = info.filename
+            base = posixpath.basename(name)
+            if info.is_dir() or not base or base.startswith('.') or name.startswith('__MACOSX/'):
+                continue
+            if base.lower() in MANIFEST_NAMES:
+                manifest.update(read_manifest(archive.read(info), base))
+                continue
+            ext = base.rsplit('.', 1)[-1].lower() if '.' in base else ''
+            if ext not in allowed_extensions:
+                continue
+            if len(items) >= max_files:
+                raise ValueError(f"archive holds more than {max_files} media files")
+
+            path = os.path.join(dest_dir, f"{prefix}{len(items):05d}.{ext}")
+            # Count real bytes rather than trusting the header sizes
+            with archive.open(info) as source, open(path, 'wb') as target:
+                while True:
+                    chunk = source.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    extracted += len(chunk)
+                    if extracted > max_bytes:
+                        raise ValueError(f"archive expands to more than the {max_bytes} bytes left for this batch")
+                    target.write(chunk)
+            items.append((name, path))
+    return items, manifest, extracted
+
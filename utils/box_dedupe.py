@@ -0,0 +1,150 @@
+import numpy as np
+
+
+def calculate_iou(box1, box2):
+    """IoU of two [x1, y1, x2, y2] boxes"""
+    x11, y11, x21, y21 = box1
+    x12, y12, x22, y22 = box2
+    xi1 = max(x11, x12); yi1 = max(y11, y12)
+    xi2 = min(x21, x22); yi2 = min(y21, y22)
+    inter = max(0, xi2 - xi1) * max(0, yi2 - yi1)
+    area1 = (x21 - x11) * (y21 - y11)
+    area2 = (x22 - x12) * (y22 - y12)
+    union = area1 + area2 - inter
+    return inter / union if union > 0 else 0
+
+
+def pairwise_iou(a, b):
+    """Element-wise IoU of two (n, 4) box arrays"""
+    ix1 = np.maximum(a[:, 0], b[:, 0])
+    iy1 = np.maximum(a[:, 1], b[:, 1])
+    ix2 = np.minimum(a[:, 2], b[:, 2])
+    iy2 = np.minimum(a[:, 3], b[:, 3])
+    inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a + area_b - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+
+def matrix_iou(a, b):
+    """(len(a), len(b)) IoU matrix"""
+    ix1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    iy1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    ix2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    iy2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+
+class BoxDeduplicator:
+    """
+    Incremental greedy IoU deduplication over batches of boxes.
+
+    Same semantics as the original nested loop in process_video: walking the
+    boxes in order, a box is dropped if its IoU with any box kept so far is
+    above the threshold, otherwise it is kept.
+
+    Kept boxes are held sorted by x1 (a sweep-and-prune index). Two boxes can
+    only overlap if their x ranges intersect, so for each incoming box the
+    candidates are the kept boxes with x1 in (box.x1 - widest kept width, box.x2).
+    Those ranges are found with searchsorted for the whole batch and the
+    candidate IoUs are computed in one vectorized pass.
+    """
+
+    def __init__(self, iou_threshold=0.3):
+        self.iou_threshold = iou_threshold
+        self.kept = np.empty((0, 4), dtype=np.float64)   # sorted by x1
+        self.max_width = 0.0
+
+    def __len__(self):
+        return len(self.kept)
+
+    def _duplicates_of_kept(self, boxes):
+        n = len(boxes)
+        dup = np.zeros(n, dtype=bool)
+        if n == 0 or len(self.kept) == 0:
+            return dup
+
+        x1s = self.kept[:, 0]
+        lo = np.searchsorted(x1s, boxes[:, 0] - self.max_width, side='right')
+        hi = np.searchsorted(x1s, boxes[:, 2], side='left')
+        counts = np.clip(hi - lo, 0, None)
+        total = int(counts.sum())
+        if total == 0:
+            return dup
+
+        # Expand the (lo, hi) ranges into explicit (box, kept) candidate pairs
+        rows = np.repeat(np.arange(n), counts)
+        starts = np.repeat(lo, counts)
+        offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        cols = starts + offsets
+
+        iou = pairwise_iou(boxes[rows], self.kept[cols])
+        dup[rows[iou > self.iou_threshold]] = True
+        return dup
+
+    def add_batch(self, boxes):
+        """Add boxes in order; returns a boolean mask of the ones that were kept"""
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        keep = ~self._duplicates_of_kept(boxes)
+
+        # Survivors may still duplicate each other; resolve them greedily in order
+        survivors = np.flatnonzero(keep)
+        if len(survivors) > 1:
+            overlaps = matrix_iou(boxes[survivors], boxes[survivors]) > self.iou_threshold
+            kept_local = np.zeros(len(survivors), dtype=bool)
+            for i in range(len(survivors)):
+                if not (overlaps[i] & kept_local).any():
+                    kept_local[i] = True
+            keep[survivors[~kept_local]] = False
+
+        new = boxes[keep]
+        if len(new):
+            merged = np.concatenate([self.kept, new])
+            self.kept = merged[np.argsort(merged[:, 0], kind='stable')]
+            self.max_width = max(self.max_width, float((new[:, 2] - new[:, 0]).max()))
+        return keep
+
+
+def deduplicate_boxes(boxes, iou_threshold=0.3, chunk_size=1024):
+    """Return the indices of the boxes kept by greedy IoU deduplication, in input order"""
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    deduper = BoxDeduplicator(iou_threshold)
+    keep = np.zeros(len(boxes), dtype=bool)
+    for start in range(0, len(boxes), chunk_size):
+        keep[start:start + chunk_size] = deduper.add_batch(boxes[start:start + chunk_size])
+    return np.flatnonzero(keep).tolist()
+
+
+def nms(boxes, scores, iou_threshold=0.5, metric='iou'):
+    """
+    Greedy non-maximum suppression; returns kept indices, highest score first.
+    metric='ios' compares intersection over the smaller box, which also
+    suppresses fragments of one object cut at a tile seam.
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    scores = np.asarray(scores, dtype=np.float64).reshape(-1)
+    order = np.argsort(-scores, kind='stable')
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+
+    keep = []
+    while len(order):
+        i = order[0]
+        keep.append(int(i))
+        rest = order[1:]
+        ix1 = np.maximum(boxes[i, 0], boxes[rest, 0])
+        iy1 = np.maximum(boxes[i, 1], boxes[rest, 1])
+        ix2 = np.minimum(boxes[i, 2], boxes[rest, 2])
+        iy2 = np.minimum(boxes[i, 3], boxes[rest, 3])
+        inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+        if metric == 'ios':
+            denom = np.minimum(areas[i], areas[rest])
+        else:
+            denom = areas[i] + areas[rest] - inter
+        overlap = np.divide(inter, denom, out=np.zeros_like(inter), where=denom > 0)
+        order = rest[overlap <= iou_threshold]
+    return keep
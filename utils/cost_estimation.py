@@ -1,3 +1,29 @@
+from dataclasses import dataclass, asdict
+
+import numpy as np
+
+# Repair time model (based on road maintenance standards), hours
+BASE_SETUP_TIME = 0.5           # equipment setup
+BASE_CLEANUP_TIME = 0.25
+PREP_TIME_PER_POTHOLE = 0.08    # 5 minutes for cleaning/prep
+FILL_TIME_PER_LITER = 0.003
+COMPACT_TIME_PER_POTHOLE = 0.05 # 3 minutes for compaction
+
+MATERIAL_WASTE_FACTOR = 1.10    # 10% waste
+EQUIPMENT_COST = 500.0          # ₹ per job
+TRANSPORT_COST = 300.0          # ₹ per job
+
+@dataclass(frozen=True)
+class CostParameters:
+    """User-supplied prices for one estimate; immutable so concurrent requests cannot share state"""
+    material_cost_per_liter: float = 40.0   # ₹ per liter
+    labor_cost_per_hour: float = 300.0      # ₹ per hour per worker
+    team_size: int = 2                      # Number of workers
+    overhead_percentage: float = 15.0       # % overhead
+
+    def to_dict(self):
+        return asdict(self)
+
 class CostEstimator:
     def __init__(self):
         # Default values (will be updated by user)
@@ -24,43 +50,40 @@ class CostEstimator:
             
         except ValueError:
             print("❌ Invalid input! Using default values.")
+
+    def parameters(self):
+        """This estimator's own prices (the CLI defaults) as CostParameters"""
+        return CostParameters(self.material_cost_per_liter, self.labor_cost_per_hour,
+                              self.team_size, self.overhead_percentage)
     
     def calculate_repair_time(self, pothole_data):
         """Calculate realistic repair time based on pothole volumes"""
         total_volume = sum(pothole['volume_liters'] for pothole in pothole_data)
         total_potholes = len(pothole_data)
         
-        # Realistic time estimates (based on road maintenance standards)
-        base_setup_time = 0.5  # hours (equipment setup)
-        base_cleanup_time = 0.25  # hours
-        
         # Time per pothole depends on size
-        prep_time_per_pothole = 0.08  # hours (5 minutes) for cleaning/prep
-        fill_time_per_liter = 0.003   # hours per liter
-        compact_time_per_pothole = 0.05  # hours (3 minutes) for compaction
-        
-        # Calculate total time
-        total_prep_time = total_potholes * prep_time_per_pothole
-        total_fill_time = total_volume * fill_time_per_liter
-        total_compact_time = total_potholes * compact_time_per_pothole
+        total_prep_time = total_potholes * PREP_TIME_PER_POTHOLE
+        total_fill_time = total_volume * FILL_TIME_PER_LITER
+        total_compact_time = total_potholes * COMPACT_TIME_PER_POTHOLE
         
-        total_hours = (base_setup_time + total_prep_time + 
-                      total_fill_time + total_compact_time + base_cleanup_time)
+        total_hours = (BASE_SETUP_TIME + total_prep_time + 
+                      total_fill_time + total_compact_time + BASE_CLEANUP_TIME)
         
         return {
             'total_hours': total_hours,
-            'setup_time': base_setup_time,
+            'setup_time': BASE_SETUP_TIME,
             'prep_time': total_prep_time,
             'fill_time': total_fill_time,
             'compact_time': total_compact_time,
-            'cleanup_time': base_cleanup_time
+            'cleanup_time': BASE_CLEANUP_TIME
         }
     
     # Update the calculate_repair_cost method to optionally include location
-    def calculate_repair_cost(self, pothole_data, location_data=None):
-        """Calculate total costs based on user inputs"""
+    def calculate_repair_cost(self, pothole_data, location_data=None, params=None):
+        """Calculate total costs for the given CostParameters (default: this estimator's own)"""
         if not pothole_data:
             return None
+        params = params or self.parameters()
         
         total_volume = sum(pothole['volume_liters'] for pothole in pothole_data)
         total_potholes = len(pothole_data)
@@ -69,21 +92,21 @@ class CostEstimator:
         time_breakdown = self.calculate_repair_time(pothole_data)
         
         # Material cost (with 10% waste factor)
-        material_required = total_volume * 1.10
-        material_cost = material_required * self.material_cost_per_liter
+        material_required = total_volume * MATERIAL_WASTE_FACTOR
+        material_cost = material_required * params.material_cost_per_liter
         
         # Labor cost
-        labor_cost = time_breakdown['total_hours'] * self.labor_cost_per_hour * self.team_size
+        labor_cost = time_breakdown['total_hours'] * params.labor_cost_per_hour * params.team_size
         
         # Equipment and transport (fixed costs)
-        equipment_cost = 500.0  # ₹ per job
-        transport_cost = 300.0  # ₹ per job
+        equipment_cost = EQUIPMENT_COST
+        transport_cost = TRANSPORT_COST
         
         # Subtotal
         subtotal = material_cost + labor_cost + equipment_cost + transport_cost
         
         # Overhead
-        overhead_cost = subtotal * (self.overhead_percentage / 100)
+        overhead_cost = subtotal * (params.overhead_percentage / 100)
         
         # Total cost
         total_cost = subtotal + overhead_cost
@@ -92,10 +115,10 @@ class CostEstimator:
             'total_potholes': total_potholes,
             'total_volume_liters': total_volume,
             'material_required_liters': material_required,
-            'material_cost_per_liter': self.material_cost_per_liter,
-            'labor_cost_per_hour': self.labor_cost_per_hour,
-            'team_size': self.team_size,
-            'overhead_percentage': self.overhead_percentage,
+            'material_cost_per_liter': params.material_cost_per_liter,
+            'labor_cost_per_hour': params.labor_cost_per_hour,
+            'team_size': params.team_size,
+            'overhead_percentage': params.overhead_percentage,
             
             'material_cost': material_cost,
             'labor_cost': labor_cost,
@@ -111,6 +134,29 @@ class CostEstimator:
         
         return cost_breakdown
     
+    @staticmethod
+    def scenario_grid(jobs, total_potholes, total_volume, material_costs, labor_costs, team_sizes, overheads):
+        """
+        Total repair cost for every combination of the given parameter values, in one
+        vectorized pass. jobs / total_potholes / total_volume describe the work: one
+        analysis, or the sums over many (every term of the cost model is linear in
+        them, so a city's totals give the same result as costing each analysis).
+        Returns total costs shaped (materials, labors, team sizes, overheads).
+        """
+        total_hours = (jobs * (BASE_SETUP_TIME + BASE_CLEANUP_TIME) +
+                       total_potholes * (PREP_TIME_PER_POTHOLE + COMPACT_TIME_PER_POTHOLE) +
+                       total_volume * FILL_TIME_PER_LITER)
+
+        material = np.asarray(material_costs, dtype=np.float64)[:, None, None, None]
+        labor = np.asarray(labor_costs, dtype=np.float64)[None, :, None, None]
+        team = np.asarray(team_sizes, dtype=np.float64)[None, None, :, None]
+        overhead = np.asarray(overheads, dtype=np.float64)[None, None, None, :]
+
+        subtotal = (total_volume * MATERIAL_WASTE_FACTOR * material +
+                    total_hours * labor * team +
+                    jobs * (EQUIPMENT_COST + TRANSPORT_COST))
+        return subtotal * (1 + overhead / 100)
+
     def print_cost_report(self, cost_breakdown):
         """Print comprehensive cost report"""
         if not cost_breakdown:
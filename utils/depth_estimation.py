@@ -1,59 +1,187 @@
 import cv2
+import hashlib
+import os
 import numpy as np
-from ultralytics import YOLO
+
+from utils.box_dedupe import nms
+from utils.pothole_columns import PotholeColumns
+
+# Exported model locations per MODEL_BACKEND, as written by scripts/export_model.py
+MODEL_BACKENDS = {
+    'pytorch': 'models/best.pt',
+    'onnx': 'models/best.onnx',
+    'openvino': 'models/best_openvino_model',
+    'openvino-int8': 'models/best_int8_openvino_model',
+}
+
+def resolve_model_path(model_path=None, backend=None):
+    """
+    Weights to load: an explicit path wins, then MODEL_PATH, then the default
+    location for MODEL_BACKEND (pytorch, onnx, openvino or openvino-int8).
+    """
+    if model_path:
+        return model_path
+    if os.environ.get('MODEL_PATH'):
+        return os.environ['MODEL_PATH']
+    backend = (backend or os.environ.get('MODEL_BACKEND', 'pytorch')).lower()
+    if backend not in MODEL_BACKENDS:
+        raise ValueError(f"Unknown MODEL_BACKEND '{backend}', expected one of {sorted(MODEL_BACKENDS)}")
+    return MODEL_BACKENDS[backend]
+
+def model_file_version(model_path):
+    """Short fingerprint of the weights file (or exported model directory), used to key cached detections"""
+    if os.environ.get('MODEL_VERSION'):
+        return os.environ['MODEL_VERSION']
+    if os.path.isdir(model_path):
+        paths = sorted(os.path.join(root, name) for root, _, names in os.walk(model_path) for name in names)
+    else:
+        paths = [model_path]
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+# Smallest useful tile edge, and the overlap range that keeps the tile step sane
+MIN_TILE_SIZE = 128
+MAX_TILE_OVERLAP = 0.9
+
+def validate_tiling(tile_size, tile_overlap):
+    """Raise ValueError unless tile_size is 0 (off) or >= MIN_TILE_SIZE and the overlap is in [0, MAX_TILE_OVERLAP]"""
+    if tile_size != 0 and tile_size < MIN_TILE_SIZE:
+        raise ValueError(f"tile_size must be 0 (off) or at least {MIN_TILE_SIZE}")
+    if not 0 <= tile_overlap <= MAX_TILE_OVERLAP:
+        raise ValueError(f"tile_overlap must be between 0 and {MAX_TILE_OVERLAP}")
+
+def tile_origins(length, tile_size, overlap):
+    """Start offsets of overlapping tiles along one axis; the last tile ends at the edge"""
+    if length <= tile_size:
+        return [0]
+    step = max(1, int(tile_size * (1 - overlap)))
+    starts = list(range(0, length - tile_size, step))
+    starts.append(length - tile_size)
+    return starts
 
 class PotholeDepthEstimator:
-    def __init__(self, model_path="models/best.pt"):
-        self.model = YOLO(model_path)
+    def __init__(self, model_path=None, tile_size=None, tile_overlap=None,
+                 imgsz=None, tile_batch_size=None):
+        # Imported here: ultralytics pulls in torch, which dominates app import time
+        from ultralytics import YOLO
+
+        model_path = resolve_model_path(model_path)
+        # Exported ONNX/OpenVINO models go through the same YOLO wrapper and return the same results
+        self.model = YOLO(model_path, task='detect')
+        self.model_path = model_path
+        self.model_version = model_file_version(model_path)
+
+        # Sliced inference for high-resolution images (0 = off)
+        self.tile_size = int(tile_size if tile_size is not None else os.getenv('TILE_SIZE', 0))
+        self.tile_overlap = float(tile_overlap if tile_overlap is not None else os.getenv('TILE_OVERLAP', 0.2))
+        self.tile_batch_size = int(tile_batch_size or os.getenv('TILE_BATCH_SIZE', 8))
+        # Model input size; with tiling a smaller input keeps small potholes visible
+        self.imgsz = int(imgsz or os.getenv('MODEL_IMGSZ', 0)) or None
+        # Upper bound on tiles per image, whatever the image size and tile settings
+        self.max_tiles = int(os.getenv('MAX_TILES', 256))
+        validate_tiling(self.tile_size, self.tile_overlap)
+        # Default cutoffs, overridable per call (upload parameters)
+        self.min_confidence = float(os.getenv('MIN_CONFIDENCE', 0.25))
+        self.max_detections = int(os.getenv('MAX_DETECTIONS', 100))
+
+    def warm_up(self, size=640):
+        """One dummy inference so weights, kernels and buffers are ready before real traffic"""
+        self._predict(np.zeros((size, size, 3), dtype=np.uint8))
+
+    def _predict(self, images, min_confidence=None, max_detections=None):
+        # Cutoffs go to the model's own NMS so junk boxes never leave predict
+        options = {'verbose': False}
+        if self.imgsz:
+            options['imgsz'] = self.imgsz
+        if min_confidence is not None:
+            options['conf'] = min_confidence
+        if max_detections is not None:
+            options['max_det'] = max_detections
+        return self.model.predict(images, **options)
+
+    def _options(self, min_confidence, max_detections):
+        return (self.min_confidence if min_confidence is None else float(min_confidence),
+                self.max_detections if max_detections is None else int(max_detections))
+
+    @staticmethod
+    def _result_arrays(result):
+        """(xyxy, confidences, class ids) of one YOLO result as numpy arrays"""
+        boxes = result.boxes
+        return (boxes.xyxy.cpu().numpy().reshape(-1, 4),
+                boxes.conf.cpu().numpy().reshape(-1),
+                boxes.cls.cpu().numpy().reshape(-1).astype(np.int64))
+
+    def detect_boxes(self, image, tile_size=None, tile_overlap=None, min_confidence=None, max_detections=None):
+        """
+        Run the model on one BGR image; returns (xyxy, confidences, class ids) as numpy arrays.
 
-    def calculate_pothole_dimensions(self, image_path):
+        With tile_size > 0 and an image larger than one tile, the image is cut into
+        overlapping tiles that go through the model in batches, together with a
+        full-frame pass for potholes larger than a tile. Tile boxes are shifted back
+        to image coordinates and merged with NMS across the seams.
         """
-        Detect potholes and estimate dimensions from an image file.
+        tile_size = self.tile_size if tile_size is None else int(tile_size)
+        tile_overlap = self.tile_overlap if tile_overlap is None else float(tile_overlap)
+        validate_tiling(tile_size, tile_overlap)
+        min_confidence, max_detections = self._options(min_confidence, max_detections)
+        height, width = image.shape[:2]
+
+        full = self._result_arrays(self._predict(image, min_confidence, max_detections)[0])
+        if tile_size <= 0 or (width <= tile_size and height <= tile_size):
+            return full
+
+        rows = tile_origins(height, tile_size, tile_overlap)
+        cols = tile_origins(width, tile_size, tile_overlap)
+        if len(rows) * len(cols) > self.max_tiles:
+            raise ValueError(f"{width}x{height} image needs {len(rows) * len(cols)} tiles of {tile_size}px, "
+                             f"more than MAX_TILES={self.max_tiles}; use a larger tile_size or less overlap")
+        parts = [full]
+        origins = [(x, y) for y in rows for x in cols]
+        for start in range(0, len(origins), self.tile_batch_size):
+            chunk = origins[start:start + self.tile_batch_size]
+            tiles = [image[y:y + tile_size, x:x + tile_size] for x, y in chunk]
+            for (x, y), result in zip(chunk, self._predict(tiles, min_confidence, max_detections)):
+                tile_boxes, tile_scores, tile_classes = self._result_arrays(result)
+                parts.append((tile_boxes + np.array([x, y, x, y], dtype=tile_boxes.dtype),
+                              tile_scores, tile_classes))
+
+        boxes, scores, classes = (np.concatenate(column) for column in zip(*parts))
+        keep = nms(boxes, scores, iou_threshold=0.5, metric='ios')
+        # Back to top-to-bottom, left-to-right so pothole ids read naturally
+        keep = sorted(keep, key=lambda i: (boxes[i, 1], boxes[i, 0]))
+        return boxes[keep], scores[keep], classes[keep]
+
+    def detect_columns(self, image, tile_size=None, tile_overlap=None, min_confidence=None, max_detections=None):
+        """Detect and measure potholes in one BGR image; returns PotholeColumns"""
+        min_confidence, max_detections = self._options(min_confidence, max_detections)
+        columns = PotholeColumns.from_boxes(*self.detect_boxes(image, tile_size, tile_overlap,
+                                                               min_confidence, max_detections))
+        # Tiles each return up to max_detections, so cap again after the merge
+        return columns.filter(min_confidence, max_detections)
+
+    def calculate_pothole_dimensions(self, image_path, tile_size=None, tile_overlap=None,
+                                     min_confidence=None, max_detections=None):
+        """
+        Detect potholes and estimate dimensions from an image file
+        (or an already decoded BGR array).
         Returns list of pothole data and the annotated image.
         """
-        image = cv2.imread(image_path)
+        image = image_path if isinstance(image_path, np.ndarray) else cv2.imread(image_path)
         if image is None:
             return None
 
-        results = self.model.predict(image)[0]
+        columns = self.detect_columns(image, tile_size, tile_overlap, min_confidence, max_detections)
+        return columns.to_dicts(), self.annotate(image, columns)
 
-        potholes = []
+    @staticmethod
+    def annotate(image, columns):
+        """Copy of the image with each pothole's box and number drawn on"""
         annotated_image = image.copy()
-
-        for i, box in enumerate(results.boxes.xyxy):
-            x1, y1, x2, y2 = map(int, box.tolist())
-
-            width_pixels = x2 - x1
-            height_pixels = y2 - y1
-
-            # Depth estimation (fallback values)
-            depth_info = self.estimate_depth(width_pixels, height_pixels)
-
-            # Convert width in cm
-            width_cm = depth_info["width_cm"]
-            depth_cm = depth_info["depth_cm"]
-
-            # Convert width to meters
-            width_m = width_cm / 100.0
-            depth_m = depth_cm / 100.0
-
-            # Cylindrical volume approximation
-            radius_m = width_m / 2
-            volume_m3 = 3.14159 * (radius_m ** 2) * depth_m
-            volume_liters = volume_m3 * 1000  # m^3 → L
-
-
-
-            pothole_info = {
-                "id": i + 1,
-                "bbox": [x1, y1, x2, y2],
-                "width_cm": round(width_cm, 2),
-                "depth_cm": round(depth_cm, 2),
-                "volume_liters": round(volume_liters, 2)
-            }
-
-            potholes.append(pothole_info)
-
+        for i, (x1, y1, x2, y2) in enumerate(columns.bbox.tolist()):
             # Draw bounding box
             cv2.rectangle(annotated_image, (x1, y1), (x2, y2), (0, 255, 0), 2)
             cv2.putText(
@@ -65,70 +193,30 @@ class PotholeDepthEstimator:
                 (0, 255, 0),
                 2
             )
+        return annotated_image
 
-        return potholes, annotated_image
-
-    def calculate_pothole_dimensions_from_array(self, frame):
+    def calculate_pothole_dimensions_from_array(self, frame, min_confidence=None, max_detections=None):
         """
         Detect potholes and estimate dimensions directly from a frame array (video).
         """
-        results = self.model.predict(frame)[0]
-        potholes = []
-
-        for i, box in enumerate(results.boxes.xyxy):
-            x1, y1, x2, y2 = map(int, box.tolist())
-
-            width_pixels = x2 - x1
-            height_pixels = y2 - y1
-
-            depth_info = self.estimate_depth(width_pixels, height_pixels)
-            width_cm = depth_info["width_cm"]
-            depth_cm = depth_info["depth_cm"]
-
-            width_m = width_cm / 100.0
-            depth_m = depth_cm / 100.0
+        results = self._predict(frame, *self._options(min_confidence, max_detections))[0]
+        return PotholeColumns.from_boxes(*self._result_arrays(results)).to_dicts(), frame
 
-            radius_m = width_m / 2
-            volume_m3 = 3.14159 * radius_m * radius_m * depth_m
-            volume_liters = volume_m3 * 1000
-
-            # ⭐ Ensure minimum volume = 1 liter
-            if volume_liters < 1:
-                volume_liters = 1
-
-            pothole_info = {
-                "id": i + 1,
-                "bbox": [x1, y1, x2, y2],
-                "width_cm": round(width_cm, 2),
-                "depth_cm": round(depth_cm, 2),
-                "volume_liters": round(volume_liters, 2)
-            }
-
-            potholes.append(pothole_info)
-
-        return potholes, frame
-
-    # --------------------------
-    # SIMPLE DEPTH ESTIMATION
-    # --------------------------
-    def estimate_depth(self, width_px, height_px):
+    def calculate_pothole_columns_batch(self, frames, min_confidence=None, max_detections=None):
         """
-        Rough depth estimation based on object size in frame.
-        Modify this logic as needed.
+        Detect potholes in several frame arrays with a single model.predict call.
+        Returns one PotholeColumns per input frame, in the same order.
         """
-
-        # Base rule-of-thumb conversion (adjustable)
-        width_cm = width_px * 0.2     # 0.2 cm per pixel -> Example scale
-        depth_cm = height_px * 0.08   # 0.08 cm per pixel -> Example scale
-
-        # Minimum fallback
-        if width_cm < 5:
-            width_cm = 5
-        if depth_cm < 3:
-            depth_cm = 3
-
-        return {
-            "width_cm": width_cm,
-            "depth_cm": depth_cm,
-            "final_depth_m": depth_cm / 100.0
-        }
+        frames = list(frames)
+        if not frames:
+            return []
+
+        min_confidence, max_detections = self._options(min_confidence, max_detections)
+        results = self._predict(frames, min_confidence, max_detections)
+        return [PotholeColumns.from_boxes(*self._result_arrays(r)).filter(min_confidence, max_detections)
+                for r in results]
+
+    def calculate_pothole_dimensions_batch(self, frames, min_confidence=None, max_detections=None):
+        """Same as calculate_pothole_columns_batch, as one pothole list per frame"""
+        return [columns.to_dicts()
+                for columns in self.calculate_pothole_columns_batch(frames, min_confidence, max_detections)]
@@ -0,0 +1,54 @@
+import cv2
+import numpy as np
+
+
+class FrameSampler:
+    """
+    Decide which decoded video frames are worth sending to the detector.
+
+    Frames are first thinned by a fixed stride (or the stride implied by a
+    target analysis FPS). If a scene threshold is set, a sampled frame is only
+    forwarded when it differs enough from the last forwarded keyframe, with a
+    keyframe forced at least every `max_gap_frames` decoded frames so slow
+    camera motion never starves the detector.
+    """
+
+    def __init__(self, stride=1, target_fps=None, source_fps=None,
+                 scene_threshold=0.0, max_gap_frames=30, thumb_size=(64, 36)):
+        stride = max(1, int(stride or 1))
+        if target_fps and source_fps and target_fps > 0:
+            stride = max(stride, int(round(source_fps / target_fps)))
+
+        self.stride = stride
+        self.scene_threshold = float(scene_threshold or 0.0)
+        self.max_gap_frames = max(1, int(max_gap_frames))
+        self.thumb_size = thumb_size
+
+        self._last_thumb = None
+        self._last_index = None
+
+    def _thumbnail(self, frame):
+        small = cv2.resize(frame, self.thumb_size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small.astype(np.int16)
+
+    def should_process(self, frame_index, frame):
+        """Return True if the frame at `frame_index` should be run through the model."""
+        if frame_index % self.stride != 0:
+            return False
+
+        if self.scene_threshold <= 0:
+            return True
+
+        thumb = self._thumbnail(frame)
+        forced = self._last_index is None or frame_index - self._last_index >= self.max_gap_frames
+        if not forced:
+            # Mean absolute grey-level difference on a tiny thumbnail (0-255 scale)
+            diff = float(np.abs(thumb - self._last_thumb).mean())
+            if diff < self.scene_threshold:
+                return False
+
+        self._last_thumb = thumb
+        self._last_index = frame_index
+        return True
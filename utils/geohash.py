@@ -0,0 +1,92 @@
+import math
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+# Stored precision: 9 characters is a cell of about 5 m x 5 m
+PRECISION = 9
+EARTH_RADIUS_M = 6371000.0
+
+
+def encode(latitude, longitude, precision=PRECISION):
+    """Geohash of a point; nearby points share a prefix"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bit = 0
+    value = 0
+    even = True     # bits alternate longitude, latitude
+    while len(chars) < precision:
+        rng, coord = (lon_range, longitude) if even else (lat_range, latitude)
+        mid = (rng[0] + rng[1]) / 2
+        value <<= 1
+        if coord >= mid:
+            value |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bit += 1
+        if bit == 5:
+            chars.append(BASE32[value])
+            bit = 0
+            value = 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """(height, width) in degrees of a geohash cell"""
+    bits = 5 * precision
+    lon_bits = (bits + 1) // 2
+    lat_bits = bits // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def covering_cells(south, west, north, east, max_cells=16):
+    """
+    Geohash prefixes whose cells cover the box, at the finest precision that
+    needs no more than max_cells of them. Boxes crossing the antimeridian
+    (west > east) are split in two.
+    """
+    if west > east:
+        return sorted(set(covering_cells(south, west, north, 180.0, max_cells) +
+                          covering_cells(south, -180.0, north, east, max_cells)))
+
+    best = ['']    # the empty prefix matches everything
+    # A box edge on +90/+180 lies on the last cell, not past it
+    north = min(north, 90.0 - 1e-9)
+    east = min(east, 180.0 - 1e-9)
+    for precision in range(1, PRECISION + 1):
+        height, width = cell_size(precision)
+        rows = math.floor((north + 90) / height) - math.floor((south + 90) / height) + 1
+        cols = math.floor((east + 180) / width) - math.floor((west + 180) / width) + 1
+        if rows * cols > max_cells:
+            break
+        cells = set()
+        for r in range(rows):
+            lat = min(south + r * height, north)
+            for c in range(cols):
+                lon = min(west + c * width, east)
+                cells.add(encode(lat, lon, precision))
+            cells.add(encode(lat, east, precision))
+        for c in range(cols):
+            cells.add(encode(north, min(west + c * width, east), precision))
+        cells.add(encode(north, east, precision))
+        best = sorted(cells)
+    return best
+
+
+def radius_bbox(latitude, longitude, radius_m):
+    """(south, west, north, east) of a box containing the circle"""
+    dlat = math.degrees(radius_m / EARTH_RADIUS_M)
+    cos_lat = max(math.cos(math.radians(latitude)), 1e-6)
+    dlon = math.degrees(radius_m / (EARTH_RADIUS_M * cos_lat))
+    if dlon >= 180 or latitude + dlat >= 90 or latitude - dlat <= -90:
+        # A circle that reaches a pole, or is wider than the globe there, spans every longitude;
+        # wrapping would collapse it to one meridian
+        return max(latitude - dlat, -90.0), -180.0, min(latitude + dlat, 90.0), 180.0
+    west = longitude - dlon
+    east = longitude + dlon
+    if west < -180:
+        west += 360
+    if east > 180:
+        east -= 360
+    return max(latitude - dlat, -90.0), west, min(latitude + dlat, 90.0), east
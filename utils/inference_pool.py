@@ -0,0 +1,105 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from utils.depth_estimation import model_file_version, resolve_model_path
+
+# Per-process estimator, created once by _init_worker in each pool process
+_worker_estimator = None
+
+
+def _init_worker(model_path, torch_threads):
+    global _worker_estimator
+
+    # Keep each worker to its share of the cores instead of every process
+    # spinning up one intra-op thread per CPU.
+    os.environ['OMP_NUM_THREADS'] = str(torch_threads)
+    os.environ['MKL_NUM_THREADS'] = str(torch_threads)
+    import torch
+    torch.set_num_threads(torch_threads)
+    torch.set_num_interop_threads(1)
+
+    from utils.depth_estimation import PotholeDepthEstimator
+    _worker_estimator = PotholeDepthEstimator(model_path)
+    _worker_estimator.warm_up()
+    print(f"✅ Inference worker {os.getpid()} ready ({torch_threads} torch threads)")
+
+
+def _ping():
+    return os.getpid()
+
+
+def _detect_image(image_path, *options):
+    return _worker_estimator.calculate_pothole_dimensions(image_path, *options)
+
+
+def _detect_array(frame, *options):
+    return _worker_estimator.calculate_pothole_dimensions_from_array(frame, *options)
+
+
+def _detect_batch(frames, *options):
+    return _worker_estimator.calculate_pothole_dimensions_batch(frames, *options)
+
+
+def _detect_columns_batch(frames, *options):
+    return _worker_estimator.calculate_pothole_columns_batch(frames, *options)
+
+
+class InferencePool:
+    """
+    Pool of inference processes, each holding its own preloaded YOLO model.
+    Exposes the same detection methods as PotholeDepthEstimator so callers can use either.
+    """
+
+    def __init__(self, workers, model_path=None, torch_threads=None):
+        self.workers = max(1, int(workers))
+        self.model_path = resolve_model_path(model_path)
+        self.torch_threads = torch_threads or max(1, (os.cpu_count() or 1) // self.workers)
+        self.model_version = model_file_version(self.model_path)
+        self.lock = threading.Lock()
+        self.executor = self._create_executor()
+
+    def _create_executor(self):
+        # spawn, not fork: the parent already runs gunicorn/job threads
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(self.model_path, self.torch_threads)
+        )
+
+    def warm_up(self):
+        """Start every worker process now so the model load and dummy inference happen before the first request."""
+        futures = [self.executor.submit(_ping) for _ in range(self.workers)]
+        pids = {f.result() for f in futures}
+        print(f"✅ Inference pool warmed up: {len(pids)} process(es)")
+
+    def _call(self, fn, *args):
+        executor = self.executor
+        try:
+            return executor.submit(fn, *args).result()
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM); replace the pool once and retry
+            with self.lock:
+                if self.executor is executor:
+                    print("⚠️ Inference pool broken, restarting workers")
+                    self.executor = self._create_executor()
+            return self.executor.submit(fn, *args).result()
+
+    def calculate_pothole_dimensions(self, image_path, tile_size=None, tile_overlap=None,
+                                     min_confidence=None, max_detections=None):
+        return self._call(_detect_image, image_path, tile_size, tile_overlap, min_confidence, max_detections)
+
+    def calculate_pothole_dimensions_from_array(self, frame, min_confidence=None, max_detections=None):
+        return self._call(_detect_array, frame, min_confidence, max_detections)
+
+    def calculate_pothole_dimensions_batch(self, frames, min_confidence=None, max_detections=None):
+        return self._call(_detect_batch, list(frames), min_confidence, max_detections)
+
+    def calculate_pothole_columns_batch(self, frames, min_confidence=None, max_detections=None):
+        return self._call(_detect_columns_batch, list(frames), min_confidence, max_detections)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
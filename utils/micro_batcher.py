@@ -0,0 +1,153 @@
+import queue
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from utils.depth_estimation import PotholeDepthEstimator
+
+
+class _Request:
+    __slots__ = ('image', 'options', 'future', 'enqueued_at')
+
+    def __init__(self, image, options):
+        self.image = image
+        self.options = options
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class MicroBatcher:
+    """
+    Dynamic batching in front of an estimator (PotholeDepthEstimator or InferencePool).
+
+    Concurrent single-image calls are queued; a dispatcher thread takes the first
+    waiting request, collects more for up to max_wait_ms or until max_batch_size
+    are waiting, and runs them as one calculate_pothole_columns_batch call. Each
+    caller blocks on its own result. Requests with different detection cutoffs
+    are batched separately, and tiled images go straight to the estimator since
+    their tiles are already batched. Up to `workers` batches (one per InferencePool
+    process, one for an in-process model) run at once; while all are busy, new
+    requests keep queueing and go out as the next, fuller batch.
+
+    Anything else (model_version, warm_up, video methods) is passed through.
+    """
+
+    def __init__(self, estimator, max_batch_size=8, max_wait_ms=5.0, stats_window=1000):
+        self.estimator = estimator
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.requests = queue.Queue()
+        self.max_in_flight = max(1, int(getattr(estimator, 'workers', 1)))
+        self.slots = threading.Semaphore(self.max_in_flight)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix='micro-batch')
+
+        self.stats_lock = threading.Lock()
+        self.batch_sizes = Counter()
+        self.batches = 0
+        self.batched_requests = 0
+        self.direct_requests = 0
+        self.errors = 0
+        # Recent queue waits in seconds, for percentiles
+        self.waits = deque(maxlen=stats_window)
+
+        self.dispatcher = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        self.dispatcher.start()
+
+    def __getattr__(self, name):
+        return getattr(self.estimator, name)
+
+    def calculate_pothole_dimensions(self, image_path, tile_size=None, tile_overlap=None,
+                                     min_confidence=None, max_detections=None):
+        """Same contract as PotholeDepthEstimator.calculate_pothole_dimensions"""
+        image = image_path if isinstance(image_path, np.ndarray) else cv2.imread(image_path)
+        if image is None:
+            return None
+
+        tile_size = getattr(self.estimator, 'tile_size', 0) if tile_size is None else int(tile_size)
+        height, width = image.shape[:2]
+        if tile_size > 0 and (width > tile_size or height > tile_size):
+            with self.stats_lock:
+                self.direct_requests += 1
+            return self.estimator.calculate_pothole_dimensions(image, tile_size, tile_overlap,
+                                                               min_confidence, max_detections)
+
+        request = _Request(image, (min_confidence, max_detections))
+        self.requests.put(request)
+        columns = request.future.result()
+        return columns.to_dicts(), PotholeDepthEstimator.annotate(image, columns)
+
+    def _collect(self):
+        """Block for one request, then gather more until the batch is full or max_wait has passed"""
+        batch = [self.requests.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            # Wait for a free slot before collecting, so requests pile up into a bigger batch meanwhile
+            self.slots.acquire()
+            batch = self._collect()
+            groups = {}
+            for request in batch:
+                groups.setdefault(request.options, []).append(request)
+
+            for i, (options, group) in enumerate(groups.items()):
+                if i:
+                    self.slots.acquire()
+                self.executor.submit(self._run_group, options, group)
+
+    def _run_group(self, options, group):
+        started = time.perf_counter()
+        try:
+            results = self.estimator.calculate_pothole_columns_batch([r.image for r in group], *options)
+        except Exception as e:
+            print("❌ Batched inference failed:", e)
+            with self.stats_lock:
+                self.errors += 1
+            for request in group:
+                request.future.set_exception(e)
+            return
+        finally:
+            self.slots.release()
+
+        with self.stats_lock:
+            self.batches += 1
+            self.batched_requests += len(group)
+            self.batch_sizes[len(group)] += 1
+            self.waits.extend(started - r.enqueued_at for r in group)
+        for request, columns in zip(group, results):
+            request.future.set_result(columns)
+
+    def stats(self):
+        with self.stats_lock:
+            waits = np.array(self.waits) if self.waits else np.zeros(1)
+            return {
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': round(self.max_wait * 1000, 3),
+                'max_in_flight': self.max_in_flight,
+                'queued': self.requests.qsize(),
+                'batches': self.batches,
+                'batched_requests': self.batched_requests,
+                'direct_requests': self.direct_requests,
+                'errors': self.errors,
+                'mean_batch_size': round(self.batched_requests / self.batches, 3) if self.batches else 0.0,
+                'batch_sizes': {str(size): count for size, count in sorted(self.batch_sizes.items())},
+                'queue_wait_ms': {
+                    'mean': round(float(waits.mean()) * 1000, 3),
+                    'p50': round(float(np.percentile(waits, 50)) * 1000, 3),
+                    'p99': round(float(np.percentile(waits, 99)) * 1000, 3),
+                    'max': round(float(waits.max()) * 1000, 3)
+                }
+            }
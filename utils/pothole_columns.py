@@ -0,0 +1,100 @@
+import numpy as np
+
+# Rule-of-thumb pixel → size conversion used by PotholeColumns.from_boxes
+WIDTH_CM_PER_PX = 0.2
+DEPTH_CM_PER_PX = 0.08
+MIN_WIDTH_CM = 5.0
+MIN_DEPTH_CM = 3.0
+# Even the smallest detected pothole takes about a litre of fill
+MIN_VOLUME_LITERS = 1.0
+
+
+class PotholeColumns:
+    """
+    Detections of one image or frame as parallel arrays (struct-of-arrays):
+    bbox (n, 4) int, confidence, class_id, width_cm, depth_cm and volume_liters (n,).
+    Sizes are computed for all boxes at once; to_dicts() builds the
+    per-pothole dicts used in JSON responses and the database.
+    """
+
+    __slots__ = ('bbox', 'confidence', 'class_id', 'width_cm', 'depth_cm', 'volume_liters')
+
+    def __init__(self, bbox, confidence, class_id, width_cm, depth_cm, volume_liters):
+        self.bbox = bbox
+        self.confidence = confidence
+        self.class_id = class_id
+        self.width_cm = width_cm
+        self.depth_cm = depth_cm
+        self.volume_liters = volume_liters
+
+    @classmethod
+    def from_boxes(cls, xyxy, confidence=None, class_id=None):
+        """Measure every box in an (n, 4) xyxy array; missing scores are NaN, missing classes -1"""
+        xyxy = np.asarray(xyxy, dtype=np.float64).reshape(-1, 4)
+        # Truncate like int() did, so sizes match the stored bbox
+        bbox = np.trunc(xyxy).astype(np.int64)
+        if confidence is None:
+            confidence = np.full(len(bbox), np.nan)
+        confidence = np.asarray(confidence, dtype=np.float64).reshape(-1)
+        if class_id is None:
+            class_id = np.full(len(bbox), -1)
+        class_id = np.asarray(class_id, dtype=np.int64).reshape(-1)
+
+        width_cm = np.maximum((bbox[:, 2] - bbox[:, 0]) * WIDTH_CM_PER_PX, MIN_WIDTH_CM)
+        depth_cm = np.maximum((bbox[:, 3] - bbox[:, 1]) * DEPTH_CM_PER_PX, MIN_DEPTH_CM)
+
+        # Cylindrical volume approximation, m^3 → L
+        radius_m = width_cm / 200.0
+        volume_liters = np.maximum(3.14159 * radius_m * radius_m * (depth_cm / 100.0) * 1000,
+                                   MIN_VOLUME_LITERS)
+
+        return cls(bbox, confidence, class_id, np.round(width_cm, 2), np.round(depth_cm, 2), np.round(volume_liters, 2))
+
+    @classmethod
+    def empty(cls):
+        return cls.from_boxes(np.empty((0, 4)))
+
+    @classmethod
+    def concatenate(cls, parts):
+        parts = list(parts)
+        if not parts:
+            return cls.empty()
+        return cls(*(np.concatenate([getattr(p, name) for p in parts]) for name in cls.__slots__))
+
+    def __len__(self):
+        return len(self.bbox)
+
+    def take(self, indices):
+        """Subset by an index array or boolean mask, keeping column alignment"""
+        return PotholeColumns(*(getattr(self, name)[indices] for name in self.__slots__))
+
+    def filter(self, min_confidence=None, max_detections=None):
+        """Drop boxes below min_confidence, then keep the max_detections most confident, in array order"""
+        keep = np.arange(len(self))
+        if min_confidence is not None:
+            # Boxes without a score are never dropped for it
+            keep = keep[~(self.confidence[keep] < min_confidence)]
+        if max_detections is not None and len(keep) > max_detections:
+            scores = np.nan_to_num(self.confidence[keep], nan=np.inf)
+            keep = np.sort(keep[np.argsort(-scores, kind='stable')[:max_detections]])
+        return self.take(keep)
+
+    def to_dicts(self):
+        """Per-pothole dicts numbered from 1, in array order"""
+        potholes = []
+        columns = zip(self.bbox.tolist(), self.confidence.tolist(), self.class_id.tolist(),
+                      self.width_cm.tolist(), self.depth_cm.tolist(), self.volume_liters.tolist())
+        for i, (bbox, confidence, class_id, width_cm, depth_cm, volume_liters) in enumerate(columns):
+            pothole = {
+                "id": i + 1,
+                "bbox": bbox,
+                "width_cm": width_cm,
+                "depth_cm": depth_cm,
+                "volume_liters": volume_liters
+            }
+            if confidence == confidence:    # NaN when the backend gave no scores
+                pothole["confidence"] = round(confidence, 4)
+            if class_id >= 0:
+                pothole["class_id"] = class_id
+            potholes.append(pothole)
+        return potholes
@@ -0,0 +1,167 @@
+import numpy as np
+
+from utils.box_dedupe import matrix_iou
+from utils.pothole_columns import PotholeColumns
+
+
+def _bbox_to_z(bbox):
+    """[x1, y1, x2, y2] → [cx, cy, area, aspect]"""
+    x1, y1, x2, y2 = bbox
+    w = max(float(x2 - x1), 1.0)
+    h = max(float(y2 - y1), 1.0)
+    return np.array([x1 + w / 2.0, y1 + h / 2.0, w * h, w / h])
+
+
+def _x_to_bbox(x):
+    area = max(float(x[2]), 1.0)
+    aspect = max(float(x[3]), 1e-3)
+    w = np.sqrt(area * aspect)
+    h = area / w
+    return [x[0] - w / 2.0, x[1] - h / 2.0, x[0] + w / 2.0, x[1] + h / 2.0]
+
+
+class KalmanBoxTracker:
+    """
+    Constant-velocity Kalman filter over [cx, cy, area, aspect] (SORT state layout).
+    Predictions take the number of frames elapsed, so detection can run every
+    k frames and the box is propagated across the skipped ones.
+    """
+
+    H = np.hstack([np.eye(4), np.zeros((4, 3))])
+    R = np.diag([1.0, 1.0, 10.0, 10.0])
+    Q = np.diag([1.0, 1.0, 1.0, 1e-2, 1e-2, 1e-2, 1e-4])
+
+    def __init__(self, track_id, pothole, frame_index):
+        self.track_id = track_id
+        self.x = np.zeros(7)
+        self.x[:4] = _bbox_to_z(pothole['bbox'])
+        self.P = np.diag([10.0, 10.0, 10.0, 10.0, 1e4, 1e4, 1e4])
+        self.frame_index = frame_index
+
+        self.first_frame = frame_index
+        self.last_seen = frame_index
+        self.observations = [pothole]
+
+    def _transition(self, dt):
+        F = np.eye(7)
+        F[0, 4] = F[1, 5] = F[2, 6] = dt
+        return F
+
+    def predict(self, frame_index):
+        """Advance the filter to frame_index and return the predicted box"""
+        dt = frame_index - self.frame_index
+        if dt > 0:
+            if self.x[2] + self.x[6] * dt <= 0:
+                self.x[6] = 0.0
+            F = self._transition(dt)
+            self.x = F @ self.x
+            self.P = F @ self.P @ F.T + self.Q * dt
+            self.frame_index = frame_index
+        return _x_to_bbox(self.x)
+
+    def update(self, pothole, frame_index):
+        z = _bbox_to_z(pothole['bbox'])
+        y = z - self.H @ self.x
+        S = self.H @ self.P @ self.H.T + self.R
+        K = self.P @ self.H.T @ np.linalg.inv(S)
+        self.x = self.x + K @ y
+        self.P = (np.eye(7) - K @ self.H) @ self.P
+
+        self.last_seen = frame_index
+        self.observations.append(pothole)
+
+    @property
+    def hits(self):
+        return len(self.observations)
+
+    def aggregate(self):
+        """One measurement for the physical pothole: median size, bbox of its largest sighting"""
+        obs = self.observations
+        largest = max(obs, key=lambda p: (p['bbox'][2] - p['bbox'][0]) * (p['bbox'][3] - p['bbox'][1]))
+        confidences = [p['confidence'] for p in obs if p.get('confidence') is not None]
+        pothole = {
+            "track_id": self.track_id,
+            "bbox": [int(v) for v in largest['bbox']],
+            "width_cm": round(float(np.median([p['width_cm'] for p in obs])), 2),
+            "depth_cm": round(float(np.median([p['depth_cm'] for p in obs])), 2),
+            "volume_liters": round(float(np.median([p['volume_liters'] for p in obs])), 2),
+            "confidence": round(float(np.median(confidences)), 4) if confidences else None,
+            "class_id": largest.get('class_id'),
+            "frames_seen": self.hits,
+            "first_frame": self.first_frame,
+            "last_frame": self.last_seen
+        }
+        return pothole
+
+
+class PotholeTracker:
+    """
+    SORT-style multi-object tracker for pothole detections across video frames.
+
+    Each update predicts every live track to the current frame, associates
+    detections to tracks greedily by IoU, starts tracks for unmatched
+    detections and retires tracks not seen for max_age frames. Tracks with
+    at least min_hits sightings are reported as one pothole each.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_age=30, min_hits=2):
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.min_hits = min_hits
+        self.tracks = []
+        self.finished = []
+        self.next_id = 1
+
+    def update(self, potholes, frame_index):
+        """
+        Feed the detections of one frame (a list of pothole dicts or PotholeColumns);
+        returns the track id assigned to each detection.
+        """
+        if isinstance(potholes, PotholeColumns):
+            boxes = potholes.bbox.astype(np.float64)
+            potholes = potholes.to_dicts()
+        else:
+            boxes = np.asarray([p['bbox'] for p in potholes], dtype=np.float64).reshape(-1, 4)
+        predicted = [t.predict(frame_index) for t in self.tracks]
+        assigned = [None] * len(potholes)
+
+        if predicted and potholes:
+            iou = matrix_iou(np.asarray(predicted, dtype=np.float64), boxes)
+            # Greedy association, best IoU first
+            order = np.argsort(-iou, axis=None)
+            used_tracks, used_dets = set(), set()
+            for flat in order:
+                t, d = divmod(int(flat), iou.shape[1])
+                if iou[t, d] < self.iou_threshold:
+                    break
+                if t in used_tracks or d in used_dets:
+                    continue
+                used_tracks.add(t)
+                used_dets.add(d)
+                self.tracks[t].update(potholes[d], frame_index)
+                assigned[d] = self.tracks[t].track_id
+
+        for d, pothole in enumerate(potholes):
+            if assigned[d] is None:
+                track = KalmanBoxTracker(self.next_id, pothole, frame_index)
+                self.next_id += 1
+                self.tracks.append(track)
+                assigned[d] = track.track_id
+
+        alive = []
+        for track in self.tracks:
+            if frame_index - track.last_seen > self.max_age:
+                self.finished.append(track)
+            else:
+                alive.append(track)
+        self.tracks = alive
+        return assigned
+
+    def aggregated_potholes(self):
+        """One aggregated pothole per confirmed track, ordered by first sighting"""
+        confirmed = [t for t in self.finished + self.tracks if t.hits >= self.min_hits]
+        confirmed.sort(key=lambda t: (t.first_frame, t.track_id))
+        potholes = []
+        for i, track in enumerate(confirmed):
+            potholes.append({"id": i + 1, **track.aggregate()})
+        return potholes
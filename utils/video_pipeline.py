@@ -0,0 +1,174 @@
+import queue
+import threading
+
+import cv2
+
+from utils.pothole_columns import PotholeColumns
+
+_DONE = object()
+
+
+class SummaryFrameKeeper:
+    """Keep the single inferred frame with the most detections (earliest wins ties)"""
+
+    def __init__(self):
+        self.frame = None
+        self.frame_index = None
+        self.potholes = PotholeColumns.empty()
+
+    def offer(self, frame_index, frame, potholes):
+        if self.frame is None or len(potholes) > len(self.potholes):
+            self.frame = frame.copy()
+            self.frame_index = frame_index
+            self.potholes = potholes
+
+
+class VideoPipeline:
+    """
+    Streaming decode → inference pipeline for one video.
+
+    A decoder thread reads frames, applies the FrameSampler and groups the
+    sampled frames into batches on a bounded queue, so decoding blocks
+    (backpressure) once `max_pending_batches` are waiting. `consumers`
+    threads run the batches through the detector and the results are handed
+    back to the calling thread strictly in frame order. Frames that are not
+    sampled are dropped immediately, and consumers stop taking batches while
+    consumers + max_pending_batches are out of order, so memory is bounded by
+    the queue sizes, not by the length of the video.
+    """
+
+    def __init__(self, cap, detector, sampler, batch_size=8, consumers=1,
+                 max_pending_batches=4, progress_callback=None, detector_options=None):
+        self.cap = cap
+        self.detector = detector
+        # Extra keyword arguments for each detector call (min_confidence, max_detections)
+        self.detector_options = detector_options or {}
+        self.sampler = sampler
+        self.batch_size = max(1, batch_size)
+        self.consumers = max(1, consumers)
+        self.progress_callback = progress_callback
+
+        self.total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.frames_decoded = 0
+        self.frames_inferred = 0
+
+        self.batches = queue.Queue(maxsize=max(1, max_pending_batches))
+        self.results = queue.Queue(maxsize=self.consumers * 2)
+        # Batches taken off the queue but not yet handed to on_frame; without this a slow
+        # batch lets the other consumers pile finished batches up in run()'s reorder buffer
+        self.in_flight = threading.Semaphore(self.consumers + max(1, max_pending_batches))
+        self.stop = threading.Event()
+        self.error = None
+
+    def _put(self, q, item):
+        while not self.stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        while not self.stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _decode(self):
+        seq = 0
+        batch = []
+        try:
+            while not self.stop.is_set():
+                ret, frame = self.cap.read()
+                if not ret:
+                    break
+
+                index = self.frames_decoded
+                self.frames_decoded += 1
+                if self.progress_callback:
+                    self.progress_callback(self.frames_decoded, max(self.total_frames, self.frames_decoded))
+                if self.frames_decoded % 50 == 0:
+                    print(f"Processed {self.frames_decoded}/{self.total_frames} frames...")
+
+                if self.sampler.should_process(index, frame):
+                    batch.append((index, frame))
+                    if len(batch) >= self.batch_size:
+                        self._put(self.batches, (seq, batch))
+                        seq += 1
+                        batch = []
+
+            if batch:
+                self._put(self.batches, (seq, batch))
+        except Exception as e:
+            print("Video decode error:", e)
+            self.error = e
+        finally:
+            self.cap.release()
+            for _ in range(self.consumers):
+                self._put(self.batches, _DONE)
+
+    def _acquire_slot(self):
+        while not self.stop.is_set():
+            if self.in_flight.acquire(timeout=0.1):
+                return True
+        return False
+
+    def _infer(self):
+        while self._acquire_slot():
+            item = self._get(self.batches)
+            if item is _DONE:
+                self.in_flight.release()
+                break
+            seq, batch = item
+            frames = [frame for _, frame in batch]
+            try:
+                results = self.detector.calculate_pothole_columns_batch(frames, **self.detector_options)
+            except Exception as e:
+                print(f"Batch processing error ending at frame {batch[-1][0]}:", e)
+                results = [PotholeColumns.empty() for _ in batch]
+            if not self._put(self.results, (seq, batch, results)):
+                break
+        self._put(self.results, _DONE)
+
+    def run(self, on_frame):
+        """Call on_frame(frame_index, frame, columns) for every inferred frame, in order"""
+        threads = [threading.Thread(target=self._decode, name='video-decode', daemon=True)]
+        threads += [threading.Thread(target=self._infer, name=f'video-infer-{i}', daemon=True)
+                    for i in range(self.consumers)]
+        for t in threads:
+            t.start()
+
+        pending = {}        # out-of-order batches waiting for their turn
+        next_seq = 0
+        finished = 0
+        try:
+            while finished < self.consumers:
+                item = self.results.get()
+                if item is _DONE:
+                    finished += 1
+                    continue
+                seq, batch, results = item
+                pending[seq] = (batch, results)
+                while next_seq in pending:
+                    batch, results = pending.pop(next_seq)
+                    for (index, frame), potholes in zip(batch, results):
+                        on_frame(index, frame, potholes)
+                    self.frames_inferred += len(batch)
+                    next_seq += 1
+                    self.in_flight.release()
+        finally:
+            self.stop.set()
+            for t in threads:
+                t.join(timeout=5)
+
+        if self.error is not None and self.frames_decoded == 0:
+            raise self.error
+
+        return {
+            'frames_decoded': self.frames_decoded,
+            'frames_inferred': self.frames_inferred,
+            'total_video_frames': self.total_frames
+        }